@@ -0,0 +1,101 @@
+"""费用统计与预算
+
+按标签汇总 token 用量和费用，并在运行时执行 ``--budget``：每个任务派发前按
+历史费用预估，预估费用超出剩余预算的任务推迟 (让更便宜的任务先执行)，
+预算用尽后停止派发新任务。
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from .models import Task, TaskResult
+from .scheduler import UNTAGGED, DurationModel
+
+
+@dataclass
+class UsageTotals:
+    """一组执行结果的用量汇总"""
+    runs: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+    cost_usd: float = 0.0
+    num_turns: int = 0
+
+    def add(self, result: TaskResult) -> None:
+        self.runs += 1
+        self.input_tokens += result.input_tokens or 0
+        self.output_tokens += result.output_tokens or 0
+        self.cache_read_tokens += result.cache_read_tokens or 0
+        self.cache_creation_tokens += result.cache_creation_tokens or 0
+        self.cost_usd += result.cost_usd or 0.0
+        self.num_turns += result.num_turns or 0
+
+
+def aggregate_usage(tasks: Iterable[Task], results: Iterable[TaskResult]) -> dict[str, UsageTotals]:
+    """按标签汇总用量，多标签任务计入每个标签；没有用量数据时返回空字典"""
+    tags = {task.id: task.tags for task in tasks}
+    totals: dict[str, UsageTotals] = {}
+    for result in results:
+        if result.cost_usd is None and result.input_tokens is None:
+            continue
+        for tag in tags.get(result.task_id) or [UNTAGGED]:
+            totals.setdefault(tag, UsageTotals()).add(result)
+    return totals
+
+
+class CostModel(DurationModel):
+    """基于历史费用的任务费用估计，没有历史数据时估计为 0 (不限制)"""
+
+    def __init__(self):
+        super().__init__(default=0.0)
+
+    @classmethod
+    def from_results(cls, results: Iterable[TaskResult], tasks: Iterable[Task]) -> "CostModel":
+        """从历史执行结果构建"""
+        model = cls()
+        tags = {task.id: task.tags for task in tasks}
+        for result in results:
+            if result.cost_usd is not None:
+                model.observe(result.task_id, tags.get(result.task_id, []), result.cost_usd)
+        return model
+
+
+class Budget:
+    """运行费用预算
+
+    派发时为任务预留预估费用，执行结束后按实际费用结算。已花费加预留
+    超过上限的任务不允许派发。
+    """
+
+    def __init__(self, limit: float, model: Optional[CostModel] = None):
+        self.limit = limit
+        self.model = model or CostModel()
+        self.spent = 0.0
+        self._reserved: dict[str, float] = {}
+
+    @property
+    def remaining(self) -> float:
+        return self.limit - self.spent - sum(self._reserved.values())
+
+    @property
+    def exhausted(self) -> bool:
+        return self.spent >= self.limit
+
+    def admit(self, task: Task) -> bool:
+        """预算足够时为任务预留费用并返回 True"""
+        if self.exhausted:
+            return False
+        estimate = self.model.estimate(task)
+        if estimate > self.remaining:
+            return False
+        self._reserved[task.id] = estimate
+        return True
+
+    def settle(self, task: Task, cost: Optional[float]) -> None:
+        """任务结束，释放预留并计入实际费用"""
+        self._reserved.pop(task.id, None)
+        if cost is not None:
+            self.spent += cost
+            self.model.observe(task.id, task.tags, cost)
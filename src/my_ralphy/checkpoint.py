@@ -0,0 +1,182 @@
+"""工作区检查点与回滚
+
+失败的尝试会在工作区留下修改了一半的文件，重试从这个状态开始往往再次失败。
+``GitCheckpointer`` 在每次尝试前把工作目录的完整状态 (含未跟踪文件，不含
+被 .gitignore 忽略的文件) 记录为一个 git tree，失败时只把这次尝试改动过的
+路径恢复到检查点：
+
+- 检查点使用独立的 index 文件 (``.git/ralphy/checkpoint.index``)，不影响用户的
+  暂存区、分支和 stash；``git add -A`` 依靠 index 中的 stat 缓存只重新哈希
+  mtime/size 变化的文件，大仓库上的开销与改动量成正比
+- 回滚时再记录一次当前状态，用 ``git diff-tree`` 找出改动的路径，修改和删除的
+  文件用 ``git restore --source`` 恢复，新建的文件删除
+- 回滚前的状态同样是一个 tree (记录在结果的 ``attempt_tree`` 中)，失败尝试的
+  改动可以用 ``git diff <检查点> <attempt_tree>`` 查看或恢复
+
+ralphy 自身写入的文件 (任务文件、结果、日志、``.ralphy/``) 不纳入检查点，
+回滚不会撤销任务状态的更新。工作目录不是 git 仓库时不创建检查点。
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .logger import get_logger
+
+
+class CheckpointError(Exception):
+    """创建检查点或回滚失败"""
+
+
+@dataclass
+class Checkpoint:
+    """一次尝试前的工作区状态"""
+    tree: str
+    duration: float = 0.0
+
+
+@dataclass
+class Rollback:
+    """一次回滚的结果"""
+    tree: str
+    restored: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def paths(self) -> int:
+        return len(self.restored) + len(self.removed)
+
+
+class GitCheckpointer:
+    """基于独立 git index 的工作目录检查点"""
+
+    def __init__(self, working_dir: Path, ignore: Iterable[str] = ()):
+        self.working_dir = Path(working_dir).resolve()
+        # 相对工作目录的排除路径，转换为 git pathspec
+        self.excludes = [f":(exclude){name}" for name in [".ralphy", *ignore] if name]
+        self.logger = get_logger()
+        self._lock = threading.Lock()
+        self._probed = False
+        self._toplevel: Optional[Path] = None
+        self._prefix = ""
+        self._index: Optional[Path] = None
+
+    def _git(self, *args: str, cwd: Optional[Path] = None, input: Optional[str] = None,
+             index: bool = True) -> str:
+        env = dict(os.environ)
+        if index and self._index is not None:
+            env["GIT_INDEX_FILE"] = str(self._index)
+        try:
+            result = subprocess.run(
+                ["git", *args],
+                cwd=cwd or self.working_dir,
+                input=input,
+                capture_output=True,
+                text=True,
+                env=env,
+                timeout=120,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise CheckpointError(f"git {args[0]} 失败: {e}")
+        if result.returncode != 0:
+            raise CheckpointError(f"git {args[0]} 失败: {result.stderr.strip()}")
+        return result.stdout
+
+    @property
+    def available(self) -> bool:
+        """工作目录是否在 git 仓库中"""
+        if not self._probed:
+            self._probed = True
+            try:
+                out = self._git("rev-parse", "--show-toplevel", "--absolute-git-dir", "--show-prefix", index=False)
+            except CheckpointError:
+                return False
+            lines = out.splitlines()
+            self._toplevel = Path(lines[0])
+            git_dir = Path(lines[1])
+            self._prefix = lines[2] if len(lines) > 2 else ""
+            index = git_dir / "ralphy" / "checkpoint.index"
+            if not index.exists():
+                # 从用户的 index 复制，已跟踪文件的 stat 缓存可直接复用
+                index.parent.mkdir(parents=True, exist_ok=True)
+                if (git_dir / "index").exists():
+                    shutil.copyfile(git_dir / "index", index)
+            self._index = index
+        return self._index is not None
+
+    def _snapshot(self) -> str:
+        """把工作目录当前状态写入检查点 index 并返回 tree"""
+        self._git("add", "-A", "--", ".", *self.excludes)
+        return self._git("write-tree").strip()
+
+    def create(self) -> Checkpoint:
+        """记录当前工作区状态"""
+        if not self.available:
+            raise CheckpointError("工作目录不是 git 仓库")
+        start = time.perf_counter()
+        with self._lock:
+            tree = self._snapshot()
+        return Checkpoint(tree=tree, duration=time.perf_counter() - start)
+
+    def rollback(self, checkpoint: Checkpoint) -> Rollback:
+        """把自检查点以来改动的路径恢复原状"""
+        start = time.perf_counter()
+        with self._lock:
+            tree = self._snapshot()
+            rollback = Rollback(tree=tree)
+            if tree == checkpoint.tree:
+                rollback.duration = time.perf_counter() - start
+                return rollback
+
+            out = self._git(
+                "diff-tree", "-r", "-z", "--no-renames", "--name-status",
+                checkpoint.tree, tree, "--", self._prefix or ".",
+                cwd=self._toplevel,
+            )
+            entries = out.split("\0")
+            for status, path in zip(entries[0::2], entries[1::2]):
+                if status == "A":
+                    rollback.removed.append(path)
+                elif status:
+                    rollback.restored.append(path)
+
+            if rollback.restored:
+                # 只恢复工作区，不改动用户的暂存区
+                self._git(
+                    "restore", f"--source={checkpoint.tree}", "--worktree",
+                    "--pathspec-from-file=-", "--pathspec-file-nul",
+                    cwd=self._toplevel, input="\0".join(rollback.restored), index=False,
+                )
+            for path in rollback.removed:
+                self._remove(self._toplevel / path)
+
+            # 检查点 index 中只更新恢复过的路径
+            changed = rollback.restored + rollback.removed
+            self._git("add", "-A", "--pathspec-from-file=-", "--pathspec-file-nul",
+                      cwd=self._toplevel, input="\0".join(changed))
+
+        rollback.duration = time.perf_counter() - start
+        return rollback
+
+    def _remove(self, path: Path) -> None:
+        """删除新建的文件及因此变空的目录 (不超出工作目录)"""
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning(f"删除 {path} 失败: {e}")
+            return
+        parent = path.parent
+        while parent != self.working_dir and self.working_dir in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
@@ -0,0 +1,96 @@
+"""claude 结构化输出解析
+
+``claude --print --output-format json`` 在结束时输出一个包含最终文本、
+token 用量、费用和轮次的 JSON 对象。解析器按行增量消费 stdout：能独立解析的
+JSON 行只保留结果对象，其余行暂存，结束时再尝试整体解析或作为纯文本输出，
+原始输出不会被完整保留两份。
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class Usage:
+    """一次会话的 token 用量与费用"""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+    cost_usd: Optional[float] = None
+    num_turns: Optional[int] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens + self.cache_read_tokens + self.cache_creation_tokens
+
+    @classmethod
+    def from_result(cls, data: dict) -> "Usage":
+        """从结果对象中提取用量 (兼容 cost_usd / total_cost_usd 两种字段)"""
+        usage = data.get("usage") or {}
+        cost = data.get("total_cost_usd", data.get("cost_usd"))
+        return cls(
+            input_tokens=int(usage.get("input_tokens") or 0),
+            output_tokens=int(usage.get("output_tokens") or 0),
+            cache_read_tokens=int(usage.get("cache_read_input_tokens") or 0),
+            cache_creation_tokens=int(usage.get("cache_creation_input_tokens") or 0),
+            cost_usd=float(cost) if cost is not None else None,
+            num_turns=data.get("num_turns"),
+        )
+
+
+class OutputParser:
+    """按行增量解析 claude 输出"""
+
+    def __init__(self):
+        self.result: Optional[dict] = None
+        self._pending: list[str] = []
+
+    def feed(self, line: str) -> None:
+        """消费一行 stdout (供 ChildProcess 的 on_stdout 回调使用)"""
+        # 暂存内容以 "{" 开头时视为跨行的 JSON 对象，后续行一并暂存
+        in_object = bool(self._pending) and self._pending[0].lstrip().startswith("{")
+        if not in_object and line.lstrip().startswith("{"):
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                self._handle(data)
+                return
+        self._pending.append(line)
+
+    def _handle(self, data: dict) -> None:
+        if data.get("type") == "result" or "result" in data:
+            self.result = data
+
+    def finish(self) -> None:
+        """输出结束：尝试把暂存的多行内容作为一个 JSON 对象解析"""
+        if self.result is not None or not self._pending:
+            return
+        text = "".join(self._pending)
+        if not text.lstrip().startswith("{"):
+            return
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return
+        if isinstance(data, dict):
+            self._pending = []
+            self._handle(data)
+
+    @property
+    def text(self) -> str:
+        """会话的最终文本；未识别到结构化结果时返回原始输出"""
+        if self.result is not None:
+            return str(self.result.get("result") or "")
+        return "".join(self._pending)
+
+    @property
+    def is_error(self) -> bool:
+        return bool(self.result and self.result.get("is_error"))
+
+    @property
+    def usage(self) -> Optional[Usage]:
+        return Usage.from_result(self.result) if self.result is not None else None
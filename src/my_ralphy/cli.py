@@ -1,5 +1,6 @@
 """CLI 入口"""
 
+import logging
 from pathlib import Path
 from typing import Optional
 
@@ -7,11 +8,13 @@ import typer
 from rich.console import Console
 from rich.table import Table
 
+from .client import DaemonClient, DaemonError, format_added, format_status, socket_path_for
 from .logger import init_logger
-from .models import ErrorHandling, RunConfig, TaskStatus
+from .models import ErrorHandling, RunConfig, Task, TaskStatus
 from .modes.task_file import TaskFileMode
 from .modes.interactive import InteractiveMode
 from .modes.continuous import ContinuousMode
+from .scheduler import SCHEDULERS
 from .task_manager import TaskManager
 
 app = typer.Typer(
@@ -26,6 +29,30 @@ app.add_typer(task_app, name="task")
 console = Console()
 
 
+def _parse_pairs(items: Optional[list[str]], option: str, fmt: str) -> list[tuple[str, str]]:
+    """解析 ``key=value`` 形式的可重复选项"""
+    pairs = []
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip() or not value.strip():
+            console.print(f"[red]错误:[/red] 无效的 {option}: {item} (格式: {fmt})")
+            raise typer.Exit(1)
+        pairs.append((key.strip(), value.strip()))
+    return pairs
+
+
+def _parse_list(value: str, cast, option: str) -> list:
+    """解析逗号分隔的参数网格"""
+    try:
+        items = [cast(v.strip()) for v in value.split(",") if v.strip()]
+    except ValueError:
+        items = []
+    if not items:
+        console.print(f"[red]错误:[/red] 无效的 {option}: {value}")
+        raise typer.Exit(1)
+    return items
+
+
 @app.command()
 def run(
     file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
@@ -35,10 +62,65 @@ def run(
     timeout: int = typer.Option(300, "--timeout", help="单任务超时秒数"),
     on_error: ErrorHandling = typer.Option(ErrorHandling.SKIP, "--on-error", help="错误处理策略"),
     max_retries: int = typer.Option(3, "--max-retries", help="最大重试次数 (仅 retry 模式)"),
+    stall_timeout: Optional[float] = typer.Option(None, "--stall-timeout", help="会话无输出、文件修改和 CPU 活动超过该秒数时提前终止"),
+    stall_retries: Optional[int] = typer.Option(None, "--stall-retries", help="停滞会话的最大重试次数 (默认按 --on-error 处理)"),
+    warm_pool: int = typer.Option(0, "--warm-pool", help="预先启动并保持空闲的 claude 会话数，隐藏启动延迟"),
+    warm_ttl: float = typer.Option(300.0, "--warm-ttl", help="预热会话的最长空闲秒数"),
     skip_permissions: bool = typer.Option(False, "--dangerously-skip-permissions", help="跳过 Claude 权限确认"),
+    cpu_limit: Optional[int] = typer.Option(None, "--cpu-limit", help="子进程 CPU 时间上限(秒)"),
+    memory_limit: Optional[int] = typer.Option(None, "--memory-limit", help="子进程内存上限 (MB)"),
+    max_open_files: Optional[int] = typer.Option(None, "--max-open-files", help="子进程最大打开文件数"),
+    cgroup: bool = typer.Option(False, "--cgroup", help="优先使用 cgroup v2 限制并统计进程树"),
+    verify_tag: Optional[list[str]] = typer.Option(None, "--verify-tag", help="按标签配置验收命令 (tag=命令，可重复)"),
+    verify_workers: int = typer.Option(2, "--verify-workers", help="并行验收命令数"),
+    verify_timeout: int = typer.Option(600, "--verify-timeout", help="单条验收命令超时秒数"),
+    verify_pipeline: bool = typer.Option(True, "--verify-pipeline/--no-verify-pipeline", help="验收与下一个任务并行执行"),
+    checkpoint: bool = typer.Option(False, "--checkpoint/--no-checkpoint", help="每次尝试前记录工作区 (git)，失败后回滚"),
+    dedup: str = typer.Option("exact", "--dedup", help="重复任务: exact 跳过完全重复 / near 同时跳过近似重复 / off"),
+    dedup_threshold: float = typer.Option(0.7, "--dedup-threshold", help="近似重复的相似度阈值 (0-1)"),
+    context: bool = typer.Option(False, "--context/--no-context", help="在提示中附加仓库索引选出的相关文件"),
+    context_files: int = typer.Option(8, "--context-files", help="附加的相关文件数"),
+    workers: int = typer.Option(1, "-w", "--workers", help="并行执行的任务数"),
+    repo_concurrency: int = typer.Option(1, "--repo-concurrency", help="多仓库任务中每个仓库的最大并发数"),
+    schedule: str = typer.Option("priority", "--schedule", help="调度策略: priority / aging / fair / sjf"),
+    tag_weight: Optional[list[str]] = typer.Option(None, "--tag-weight", help="fair 策略的标签权重 (tag=权重，可重复)"),
+    tag_cap: Optional[list[str]] = typer.Option(None, "--tag-cap", help="标签最大并发数 (tag=数量，可重复)"),
+    aging_rate: float = typer.Option(1.0, "--aging-rate", help="aging 策略下每等待一分钟增加的优先级"),
+    budget: Optional[float] = typer.Option(None, "--budget", help="本次运行的费用预算 (美元)，超出时推迟或停止任务"),
+    trace: bool = typer.Option(False, "--trace", help="记录工具调用时间线到 ralph_traces.jsonl"),
+    watch: bool = typer.Option(False, "--watch", help="监听任务文件，增量合并新增/修改的任务并持续等待新任务"),
+    poll_interval: float = typer.Option(1.0, "--poll-interval", help="监听任务文件的轮询间隔秒数"),
+    log_json: bool = typer.Option(False, "--log-json", help="日志文件使用结构化 JSON 格式"),
+    log_max_size: int = typer.Option(10, "--log-max-size", help="日志文件轮转大小 (MB)，0 不轮转"),
+    log_backups: int = typer.Option(5, "--log-backups", help="保留的压缩日志份数"),
+    log_when: Optional[str] = typer.Option(None, "--log-when", help="按时间轮转 (如 midnight、H)，设置后忽略 --log-max-size"),
 ):
     """从任务文件运行任务"""
-    init_logger()
+    init_logger(
+        json_format=log_json,
+        max_bytes=log_max_size * 1024 * 1024,
+        backup_count=log_backups,
+        rotate_when=log_when,
+    )
+
+    verify_tags: dict[str, list[str]] = {}
+    for tag, command in _parse_pairs(verify_tag, "--verify-tag", "tag=命令"):
+        verify_tags.setdefault(tag, []).append(command)
+
+    if dedup not in ("exact", "near", "off"):
+        console.print(f"[red]错误:[/red] 未知的重复处理方式: {dedup} (可选: exact, near, off)")
+        raise typer.Exit(1)
+
+    if schedule not in SCHEDULERS:
+        console.print(f"[red]错误:[/red] 未知的调度策略: {schedule} (可选: {', '.join(SCHEDULERS)})")
+        raise typer.Exit(1)
+
+    try:
+        tag_weights = {tag: float(v) for tag, v in _parse_pairs(tag_weight, "--tag-weight", "tag=权重")}
+        tag_caps = {tag: int(v) for tag, v in _parse_pairs(tag_cap, "--tag-cap", "tag=数量")}
+    except ValueError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
 
     config = RunConfig(
         task_file=file,
@@ -48,7 +130,34 @@ def run(
         timeout=timeout,
         on_error=on_error,
         max_retries=max_retries,
+        stall_timeout=stall_timeout,
+        stall_retries=stall_retries,
+        warm_pool=warm_pool,
+        warm_ttl=warm_ttl,
         skip_permissions=skip_permissions,
+        cpu_limit=cpu_limit,
+        memory_limit_mb=memory_limit,
+        max_open_files=max_open_files,
+        use_cgroup=cgroup,
+        verify_tags=verify_tags,
+        verify_workers=verify_workers,
+        verify_timeout=verify_timeout,
+        verify_pipeline=verify_pipeline,
+        checkpoint=checkpoint,
+        dedup=dedup,
+        dedup_threshold=dedup_threshold,
+        context=context,
+        context_files=context_files,
+        watch=watch,
+        poll_interval=poll_interval,
+        workers=workers,
+        repo_concurrency=repo_concurrency,
+        schedule=schedule,
+        tag_weights=tag_weights,
+        tag_caps=tag_caps,
+        aging_rate=aging_rate / 60,
+        budget=budget,
+        trace=trace,
     )
 
     mode = TaskFileMode(config)
@@ -65,18 +174,27 @@ def interactive(
     max_iterations: int = typer.Option(100, "-n", "--max-iterations", help="最大迭代次数"),
     timeout: int = typer.Option(300, "--timeout", help="单任务超时秒数"),
     skip_permissions: bool = typer.Option(False, "--dangerously-skip-permissions", help="跳过 Claude 权限确认"),
+    context: bool = typer.Option(False, "--context/--no-context", help="在提示中附加仓库索引选出的相关文件"),
+    workers: int = typer.Option(1, "-w", "--workers", help="并行执行的任务数"),
+    warm_pool: int = typer.Option(0, "--warm-pool", help="预先启动并保持空闲的 claude 会话数，隐藏启动延迟"),
+    warm_ttl: float = typer.Option(300.0, "--warm-ttl", help="预热会话的最长空闲秒数"),
 ):
     """进入交互模式"""
-    init_logger()
-
     config = RunConfig(
         working_dir=dir,
         max_iterations=max_iterations,
         timeout=timeout,
         skip_permissions=skip_permissions,
+        context=context,
+        workers=workers,
+        warm_pool=warm_pool,
+        warm_ttl=warm_ttl,
     )
 
     mode = InteractiveMode(config)
+    # 执行结果由交互界面显示，控制台只输出错误日志 (完整日志仍写入 ralph.log)；
+    # 错误日志经由交互界面的输出锁显示，不会打断输入行
+    init_logger(console_level=logging.ERROR, console_handler=mode.log_handler())
     mode.run()
 
 
@@ -88,6 +206,8 @@ def continuous(
     delay: float = typer.Option(1.0, "--delay", help="任务间延迟秒数"),
     timeout: int = typer.Option(300, "--timeout", help="单任务超时秒数"),
     skip_permissions: bool = typer.Option(False, "--dangerously-skip-permissions", help="跳过 Claude 权限确认"),
+    context: bool = typer.Option(False, "--context/--no-context", help="在提示中附加仓库索引选出的相关文件"),
+    context_budget: int = typer.Option(1500, "--context-budget", help="携带之前迭代摘要的 token 预算 (0 不携带)"),
 ):
     """进入持续模式"""
     init_logger()
@@ -98,23 +218,215 @@ def continuous(
         delay=delay,
         timeout=timeout,
         skip_permissions=skip_permissions,
+        context=context,
+        context_budget=context_budget,
     )
 
     mode = ContinuousMode(config, initial_task=initial_task or "")
     mode.run()
 
 
+@app.command()
+def serve(
+    file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    dir: str = typer.Option(".", "-d", "--dir", help="工作目录"),
+    workers: int = typer.Option(1, "-w", "--workers", help="并行执行的任务数"),
+    auto_run: bool = typer.Option(False, "--auto-run", help="启动时及新任务提交后自动执行"),
+    timeout: int = typer.Option(300, "--timeout", help="单任务超时秒数"),
+    on_error: ErrorHandling = typer.Option(ErrorHandling.SKIP, "--on-error", help="错误处理策略 (pause 按 skip 处理)"),
+    max_retries: int = typer.Option(3, "--max-retries", help="最大重试次数 (仅 retry 模式)"),
+    skip_permissions: bool = typer.Option(False, "--dangerously-skip-permissions", help="跳过 Claude 权限确认"),
+    stop: bool = typer.Option(False, "--stop", help="停止正在运行的守护进程"),
+):
+    """启动守护进程，通过 Unix socket 提供任务 API"""
+    client = DaemonClient.connect(file)
+
+    if stop:
+        if client is None:
+            console.print("[dim]守护进程未运行[/dim]")
+        else:
+            client.shutdown()
+            console.print("[green]✅[/green] 已停止守护进程")
+        return
+
+    if client is not None:
+        console.print(f"[red]错误:[/red] 守护进程已在运行: {client.socket_path}")
+        raise typer.Exit(1)
+
+    from .daemon import DaemonRunningError, TaskDaemon
+
+    init_logger()
+
+    config = RunConfig(
+        task_file=file,
+        working_dir=dir,
+        timeout=timeout,
+        on_error=on_error,
+        max_retries=max_retries,
+        skip_permissions=skip_permissions,
+    )
+
+    daemon = TaskDaemon(config, socket_path_for(file), workers=workers, auto_run=auto_run)
+    try:
+        daemon.serve_forever()
+    except DaemonRunningError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+    except KeyboardInterrupt:
+        console.print("\n[dim]👋 已停止[/dim]")
+
+
+@app.command()
+def coordinator(
+    file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    listen: str = typer.Option("127.0.0.1:7654", "--listen", help="监听地址 host:port (端口 0 表示自动分配)"),
+    heartbeat: float = typer.Option(5.0, "--heartbeat", help="心跳间隔秒数，3 个间隔无响应的 worker 视为丢失"),
+    on_error: ErrorHandling = typer.Option(ErrorHandling.SKIP, "--on-error", help="错误处理策略 (pause 按 skip 处理)"),
+    max_retries: int = typer.Option(3, "--max-retries", help="最大重试次数 (仅 retry 模式)"),
+    schedule: str = typer.Option("priority", "--schedule", help="调度策略: priority / aging / fair / sjf"),
+    tag_cap: Optional[list[str]] = typer.Option(None, "--tag-cap", help="标签最大并发数 (tag=数量，可重复)"),
+    token: Optional[str] = typer.Option(None, "--token", envvar="RALPHY_TOKEN", help="worker 认证用的共享令牌 (监听非回环地址时必须设置)"),
+):
+    """启动协调器，向远程 worker 分发任务文件中的待办任务"""
+    from .display import show_banner, show_statistics, show_summary_table
+    from .distributed import Coordinator, parse_address
+
+    init_logger()
+
+    if schedule not in SCHEDULERS:
+        console.print(f"[red]错误:[/red] 未知的调度策略: {schedule} (可选: {', '.join(SCHEDULERS)})")
+        raise typer.Exit(1)
+
+    try:
+        host, port = parse_address(listen)
+        tag_caps = {tag: int(v) for tag, v in _parse_pairs(tag_cap, "--tag-cap", "tag=数量")}
+    except ValueError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+
+    config = RunConfig(
+        task_file=file,
+        on_error=on_error,
+        max_retries=max_retries,
+        schedule=schedule,
+        tag_caps=tag_caps,
+    )
+    try:
+        coord = Coordinator(config, host=host, port=port, heartbeat=heartbeat, token=token)
+    except ValueError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+
+    show_banner()
+    try:
+        pending = coord.start()
+    except FileNotFoundError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+    except OSError as e:
+        console.print(f"[red]错误:[/red] 无法监听 {listen}: {e}")
+        raise typer.Exit(1)
+
+    host, port = coord.address
+    console.print(f"📡 协调器监听 [bold]{host}:{port}[/bold]，{pending} 个待办任务 (Ctrl+C 退出)")
+    try:
+        coord.wait()
+    except KeyboardInterrupt:
+        console.print("\n[dim]👋 已中断[/dim]")
+    finally:
+        coord.stop()
+
+    show_summary_table(coord.task_manager.tasks, coord.run_results)
+    show_statistics(coord.task_manager.tasks, coord.run_results)
+    coord.record_stats()
+
+
+@app.command()
+def worker(
+    connect: str = typer.Option(..., "--connect", help="协调器地址 host:port"),
+    dir: str = typer.Option(".", "-d", "--dir", help="工作目录"),
+    slots: int = typer.Option(1, "-w", "--workers", help="本 worker 并行执行的任务数"),
+    name: Optional[str] = typer.Option(None, "--name", help="worker 名称 (默认 主机名-进程号)"),
+    timeout: int = typer.Option(300, "--timeout", help="单任务超时秒数"),
+    stall_timeout: Optional[float] = typer.Option(None, "--stall-timeout", help="会话无输出、文件修改和 CPU 活动超过该秒数时提前终止"),
+    skip_permissions: bool = typer.Option(False, "--dangerously-skip-permissions", help="跳过 Claude 权限确认"),
+    context: bool = typer.Option(False, "--context/--no-context", help="在提示中附加仓库索引选出的相关文件"),
+    reconnect: float = typer.Option(60.0, "--reconnect", help="连接断开后重试的最长秒数"),
+    token: Optional[str] = typer.Option(None, "--token", envvar="RALPHY_TOKEN", help="与协调器相同的共享令牌"),
+):
+    """连接协调器，拉取任务并在本地执行"""
+    from .distributed import RemoteWorker, parse_address
+    from .executor import ClaudeExecutor
+
+    init_logger()
+
+    try:
+        address = parse_address(connect)
+    except ValueError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+
+    config = RunConfig(
+        working_dir=dir,
+        timeout=timeout,
+        stall_timeout=stall_timeout,
+        skip_permissions=skip_permissions,
+        context=context,
+    )
+    remote = RemoteWorker(
+        address, ClaudeExecutor.from_config(config), slots=slots, name=name, reconnect=reconnect, token=token
+    )
+    try:
+        remote.run()
+    except ConnectionError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+    except KeyboardInterrupt:
+        console.print("\n[dim]👋 已停止[/dim]")
+
+
+@app.command()
+def submit(
+    file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    follow: bool = typer.Option(False, "--follow", help="持续输出执行结果"),
+):
+    """让守护进程执行所有待办任务"""
+    client = DaemonClient.connect(file)
+    if client is None:
+        console.print("[red]错误:[/red] 守护进程未运行，请先执行 ralphy serve")
+        raise typer.Exit(1)
+
+    submitted = client.run()["submitted"]
+    console.print(f"[green]✅[/green] 已提交 {submitted} 个任务")
+
+    if follow:
+        try:
+            for result in client.stream("/results/stream"):
+                mark = "[green]✅[/green]" if result["success"] else "[red]❌[/red]"
+                console.print(f"{mark} [{result['task_id']}] 耗时 {result['duration']:.1f}s")
+        except KeyboardInterrupt:
+            pass
+
+
 @app.command()
 def status(
     file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    usage: bool = typer.Option(False, "--usage", help="按标签显示历史 token 用量与费用"),
 ):
     """查看执行状态"""
+    client = DaemonClient.connect(file) if not usage else None
+    if client is not None:
+        console.print(format_status(client.status()))
+        return
+
     try:
         manager = TaskManager(task_file=file)
-        manager.load_tasks()
-        stats = manager.get_statistics()
+        # 不加载任务，分片模式下未修改的分片使用清单中的计数
+        stats = manager.summarize()
 
         console.print("\n[bold]📊 任务状态[/bold]")
+        if manager.sharded:
+            console.print(f"  分片: {stats['shards']}")
         console.print(f"  总任务: {stats['total']}")
         console.print(f"  待办: {stats['todo']}")
         console.print(f"  进行中: {stats['in_progress']}")
@@ -122,10 +434,282 @@ def status(
         console.print(f"  [red]失败: {stats['failed']}[/red]")
         console.print(f"  [dim]跳过: {stats['skipped']}[/dim]")
 
+        if stats["fanout"] or usage:
+            manager.load_tasks()
+
+        if stats["fanout"]:
+            from .display import show_repo_summary
+            from .fanout import summarize_repos
+
+            show_repo_summary(summarize_repos(manager.tasks, manager.load_results()))
+
+        if usage:
+            from .budget import aggregate_usage
+            from .display import show_usage_summary
+
+            totals = aggregate_usage(manager.tasks, manager.load_results())
+            if totals:
+                show_usage_summary(totals)
+            else:
+                console.print("[dim]没有用量记录[/dim]")
+
     except FileNotFoundError:
         console.print(f"[red]错误:[/red] 任务文件不存在: {file}")
 
 
+@app.command()
+def index(
+    dir: str = typer.Option(".", "-d", "--dir", help="工作目录"),
+    query: Optional[str] = typer.Option(None, "--query", "-q", help="查询与该文本相关的文件"),
+    limit: int = typer.Option(8, "--limit", help="查询返回的文件数"),
+    bench: bool = typer.Option(False, "--bench", help="对比冷启动与增量刷新耗时"),
+):
+    """构建/刷新仓库上下文索引"""
+    import tempfile
+
+    from rich.markup import escape
+
+    from .context_index import RepoIndex
+
+    if bench:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = Path(tmp) / "index.json"
+            cold = RepoIndex(Path(dir), cache_file=cache).refresh()
+            warm = RepoIndex(Path(dir), cache_file=cache).refresh()
+        console.print(f"冷启动: {cold.files} 个文件，提取 {cold.extracted}，耗时 {cold.duration * 1000:.0f}ms")
+        console.print(f"增量刷新: 重新哈希 {warm.rehashed}，提取 {warm.extracted}，耗时 {warm.duration * 1000:.0f}ms")
+        return
+
+    repo_index = RepoIndex(Path(dir))
+    stats = repo_index.refresh()
+    console.print(
+        f"[green]✅[/green] 索引 {stats.files} 个文件 "
+        f"(重新哈希 {stats.rehashed}，提取 {stats.extracted}，移除 {stats.removed})，"
+        f"耗时 {stats.duration * 1000:.0f}ms"
+    )
+
+    if query:
+        for entry, score in repo_index.query(query, limit=limit):
+            console.print(f"  [bold]{entry.path}[/bold] [dim]({score:.1f})[/dim] {escape(entry.summary)}")
+
+
+@app.command()
+def simulate(
+    file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径 (提供任务与历史结果)"),
+    synthetic: Optional[int] = typer.Option(None, "--synthetic", help="改为模拟 N 个合成任务"),
+    tags: str = typer.Option("", "--tags", help="合成任务轮流使用的标签，逗号分隔"),
+    workers: str = typer.Option("1,2,4,8", "-w", "--workers", help="worker 数网格，逗号分隔"),
+    timeout: str = typer.Option("300", "--timeout", help="单任务超时秒数网格"),
+    max_retries: str = typer.Option("3", "--max-retries", help="最大重试次数网格"),
+    delay: str = typer.Option("1.0", "--delay", help="任务间延迟秒数网格"),
+    schedule: str = typer.Option("priority", "--schedule", help="调度策略网格: priority / aging / fair / sjf"),
+    on_error: ErrorHandling = typer.Option(ErrorHandling.RETRY, "--on-error", help="错误处理策略 (pause 按 skip 处理)"),
+    median: Optional[float] = typer.Option(None, "--median", help="使用合成耗时分布：中位数秒数"),
+    sigma: float = typer.Option(0.8, "--sigma", help="合成耗时分布的对数标准差"),
+    fail_rate: float = typer.Option(0.0, "--fail-rate", help="合成分布的失败率 (0-1)"),
+    tag_weight: Optional[list[str]] = typer.Option(None, "--tag-weight", help="fair 策略的标签权重 (tag=权重，可重复)"),
+    tag_cap: Optional[list[str]] = typer.Option(None, "--tag-cap", help="标签最大并发数 (tag=数量，可重复)"),
+    aging_rate: float = typer.Option(1.0, "--aging-rate", help="aging 策略下每等待一分钟增加的优先级"),
+    arrival_rate: float = typer.Option(0.0, "--arrival-rate", help="任务每分钟平均到达数 (泊松过程)，0 表示开始时全部到达"),
+    by: Optional[str] = typer.Option(None, "--by", help="按 tag 或 priority 分组显示延迟"),
+    seed: int = typer.Option(0, "--seed", help="随机种子"),
+):
+    """离线模拟调度，评估 worker 数、超时、重试和延迟配置"""
+    from .scheduler import DurationModel
+    from .simulator import Simulator, Workload, expand_grid, synthetic_tasks
+
+    schedules = _parse_list(schedule, str, "--schedule")
+    for name in schedules:
+        if name not in SCHEDULERS:
+            console.print(f"[red]错误:[/red] 未知的调度策略: {name} (可选: {', '.join(SCHEDULERS)})")
+            raise typer.Exit(1)
+    if by not in (None, "tag", "priority"):
+        console.print(f"[red]错误:[/red] 不支持的分组: {by} (可选: tag、priority)")
+        raise typer.Exit(1)
+
+    configs = expand_grid(
+        workers=_parse_list(workers, int, "--workers"),
+        timeouts=_parse_list(timeout, float, "--timeout"),
+        retries=_parse_list(max_retries, int, "--max-retries"),
+        delays=_parse_list(delay, float, "--delay"),
+        schedules=schedules,
+        on_error=on_error,
+    )
+
+    try:
+        tag_weights = {tag: float(v) for tag, v in _parse_pairs(tag_weight, "--tag-weight", "tag=权重")}
+        tag_caps = {tag: int(v) for tag, v in _parse_pairs(tag_cap, "--tag-cap", "tag=数量")}
+    except ValueError as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+
+    manager = TaskManager(task_file=file)
+    try:
+        plan = manager.load_tasks()
+    except FileNotFoundError:
+        plan = []
+    results = manager.load_results()
+
+    if synthetic is not None:
+        tasks = synthetic_tasks(synthetic, [t.strip() for t in tags.split(",") if t.strip()], seed=seed)
+    else:
+        tasks = manager.get_pending_tasks() or plan
+        if not tasks:
+            console.print(f"[red]错误:[/red] 任务文件中没有任务: {file} (可使用 --synthetic)")
+            raise typer.Exit(1)
+
+    workload = None if median is not None else Workload.from_results(results, plan)
+    if workload is None:
+        workload = Workload(median=median or 60.0, sigma=sigma, fail_rate=fail_rate)
+
+    simulator = Simulator(
+        tasks,
+        workload,
+        model=DurationModel.from_results(results, plan),
+        tag_weights=tag_weights,
+        tag_caps=tag_caps,
+        aging_rate=aging_rate / 60,
+        seed=seed,
+        arrival_rate=arrival_rate / 60,
+    )
+    arrivals = f"每分钟到达 {arrival_rate:g} 个" if arrival_rate > 0 else "全部在开始时到达"
+    console.print(f"模拟 {len(tasks)} 个任务 ({arrivals})，{len(configs)} 组配置；耗时分布: {workload.describe()}")
+
+    table = Table(show_header=True, header_style="bold")
+    for column in ("策略", "workers", "超时", "重试", "延迟", "完工时间", "利用率", "p50", "p95", "p99", "完成/失败", "尝试"):
+        table.add_column(column, justify="right")
+
+    elapsed = 0.0
+    results = simulator.grid(configs)
+    for result in results:
+        config = result.config
+        elapsed += result.wall_time
+        table.add_row(
+            config.schedule,
+            str(config.workers),
+            f"{config.timeout:g}s",
+            str(config.max_retries),
+            f"{config.delay:g}s",
+            _format_duration(result.makespan),
+            f"{result.utilization:.0%}",
+            _format_duration(result.percentile(50)),
+            _format_duration(result.percentile(95)),
+            _format_duration(result.percentile(99)),
+            f"{result.completed}/{result.failed}",
+            str(result.attempts),
+        )
+
+    console.print(table)
+
+    if by is not None:
+        from .simulator import percentile
+
+        groups = Table(show_header=True, header_style="bold", title=f"按{'标签' if by == 'tag' else '优先级'}分组的延迟")
+        for column in ("策略", "workers", "超时", "重试", "延迟", "分组", "任务", "p50", "p95", "最大"):
+            groups.add_column(column, justify="right")
+        for result in results:
+            config = result.config
+            for group, latencies in result.groups(by).items():
+                groups.add_row(
+                    config.schedule,
+                    str(config.workers),
+                    f"{config.timeout:g}s",
+                    str(config.max_retries),
+                    f"{config.delay:g}s",
+                    group,
+                    str(len(latencies)),
+                    _format_duration(percentile(latencies, 50)),
+                    _format_duration(percentile(latencies, 95)),
+                    _format_duration(max(latencies)),
+                )
+            groups.add_section()
+        console.print(groups)
+
+    console.print(f"[dim]模拟耗时 {elapsed:.2f}s[/dim]")
+
+
+@app.command("trace")
+def trace_report(
+    file: str = typer.Option("ralph_traces.jsonl", "-f", "--file", help="追踪文件路径"),
+    run_id: Optional[str] = typer.Option(None, "--run", help="只统计指定运行 ID (默认最近一次运行)"),
+    all_runs: bool = typer.Option(False, "--all", help="统计所有运行"),
+    top: int = typer.Option(10, "--top", help="显示最慢的 N 次工具调用"),
+):
+    """分析会话时间分布 (需使用 ralphy run --trace 记录)"""
+    from .display import show_trace_report
+    from .tracing import build_report, load_traces
+
+    records = load_traces(Path(file), run_id=None if all_runs else (run_id or "last"))
+    if not records:
+        console.print(f"[dim]没有追踪记录: {file} (使用 ralphy run --trace 记录)[/dim]")
+        return
+
+    if not all_runs:
+        console.print(f"运行 {records[0].run_id}")
+    show_trace_report(build_report(records, top=top), top=top)
+
+
+@app.command()
+def stats(
+    file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    by: str = typer.Option("tag", "--by", help="分组: tag / task / failure / repo / day / week / all"),
+    since: Optional[str] = typer.Option(None, "--since", help="起始时间 (7d、12h 或 2026-10-01)"),
+    until: Optional[str] = typer.Option(None, "--until", help="截止时间 (格式同 --since)"),
+    sort: str = typer.Option("runs", "--sort", help="排序: runs / failures / fail-rate / p95 / cost"),
+    top: int = typer.Option(20, "--top", help="最多显示 N 组 (0 全部显示)"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="从 ralph_results.json 重建统计存储"),
+):
+    """历史执行结果统计 (成功率、耗时分位数、重试效率)"""
+    import time
+
+    from .display import show_stats_table
+    from .stats import ResultStore, parse_time, query, sort_groups, window_label
+
+    store = ResultStore.for_task_file(file)
+    try:
+        window = (parse_time(since) if since else None, parse_time(until) if until else None)
+        if rebuild or not store.exists():
+            # 首次使用或重建时导入已有的结果文件
+            manager = TaskManager(task_file=file)
+            try:
+                manager.load_tasks()
+            except FileNotFoundError:
+                manager.tasks = []
+            results = manager.load_results()
+            if results:
+                count = store.rebuild(results, manager.tasks)
+                console.print(f"[dim]从 {manager.results_file} 导入 {count} 条结果[/dim]")
+
+        start = time.perf_counter()
+        data = store.load()
+        groups = sort_groups(query(data, by=by, since=window[0], until=window[1]), sort)
+        elapsed = time.perf_counter() - start
+    except (OSError, EOFError, ValueError) as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+
+    if not groups:
+        console.print("[dim]没有执行记录[/dim]")
+        return
+
+    shown = groups[:top] if top > 0 else groups
+    runs = sum(g.runs for g in groups) if by != "tag" else None
+    show_stats_table(shown, by, title=f"执行统计 ({window_label(*window)})")
+    summary = f"{len(groups)} 组" + (f"，{runs} 次执行" if runs is not None else "")
+    if len(shown) < len(groups):
+        summary += f"，显示前 {len(shown)} 组"
+    console.print(f"[dim]{summary}；存储共 {data.rows} 条结果，查询耗时 {elapsed * 1000:.0f}ms[/dim]")
+
+
+def _format_duration(seconds: float) -> str:
+    """以 s / m / h 显示模拟时长"""
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds:.0f}s"
+
+
 @task_app.command("add")
 def task_add(
     title: str = typer.Argument(..., help="任务标题"),
@@ -134,8 +718,28 @@ def task_add(
     priority: int = typer.Option(0, "--priority", "-p", help="优先级"),
     tags: str = typer.Option("", "--tags", help="标签 (逗号分隔)"),
     file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    allow_duplicate: bool = typer.Option(False, "--allow-duplicate", help="与已有任务重复时仍然添加"),
 ):
-    """添加新任务"""
+    """添加新任务 (与已有任务重复时合并优先级和标签)"""
+    tag_list = [t.strip() for t in tags.split(",") if t.strip()] if tags else []
+
+    client = DaemonClient.connect(file)
+    if client is not None:
+        try:
+            data = client.add_task(
+                title=title,
+                description=desc,
+                acceptance=acceptance,
+                priority=priority,
+                tags=tag_list,
+                allow_duplicate=allow_duplicate,
+            )
+        except DaemonError as e:
+            console.print(f"[red]错误:[/red] {e}")
+            raise typer.Exit(1)
+        console.print(format_added(data))
+        return
+
     manager = TaskManager(task_file=file)
 
     # 尝试加载现有任务，如果文件不存在则创建空列表
@@ -144,65 +748,117 @@ def task_add(
     except FileNotFoundError:
         manager.tasks = []
 
-    tag_list = [t.strip() for t in tags.split(",") if t.strip()] if tags else []
-
-    task = manager.add_task(
-        title=title,
-        description=desc,
-        acceptance=acceptance,
-        priority=priority,
-        tags=tag_list,
-    )
-
-    console.print(f"[green]✅[/green] 已添加任务 [{task.id}] {task.title}")
+    match = None
+    if not allow_duplicate:
+        match = manager.find_duplicate(title=title, description=desc, acceptance=acceptance)
+    if match is not None and match.exact:
+        # 完全重复：合并到已有任务
+        task = manager.merge_duplicate(match.task_id, priority=priority, tags=tag_list)
+    else:
+        task = manager.add_task(
+            title=title,
+            description=desc,
+            acceptance=acceptance,
+            priority=priority,
+            tags=tag_list,
+        )
+
+    data = task.model_dump(mode="json")
+    if match is not None:
+        data["duplicate"] = {"task_id": match.task_id, "similarity": match.similarity, "exact": match.exact}
+    console.print(format_added(data))
 
 
 @task_app.command("list")
 def task_list(
     status_filter: Optional[TaskStatus] = typer.Option(None, "--status", "-s", help="按状态筛选"),
     file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    tags: str = typer.Option("", "--tags", help="按标签筛选 (逗号分隔，匹配任一)"),
+    sort: Optional[str] = typer.Option(None, "--sort", help="排序字段: id / title / status / priority / created_at，前缀 - 表示降序"),
+    offset: int = typer.Option(0, "--offset", help="跳过前 N 个任务"),
+    limit: Optional[int] = typer.Option(None, "-n", "--limit", help="最多显示 N 个任务"),
+    output_format: str = typer.Option("table", "--format", help="输出格式: table / jsonl / csv"),
+    pager: bool = typer.Option(False, "--pager", help="通过分页器查看 ($PAGER，默认 less -R)"),
 ):
-    """列出任务"""
-    try:
-        manager = TaskManager(task_file=file)
-        manager.load_tasks()
+    """列出任务 (边读取边输出)"""
+    from contextlib import nullcontext
+    from itertools import islice
 
-        tasks = manager.tasks
-        if status_filter:
-            tasks = [t for t in tasks if t.status == status_filter]
+    from .display import TaskListPrinter, pager_console
+    from .task_query import write_csv, write_jsonl
 
-        if not tasks:
-            console.print("[dim]没有任务[/dim]")
-            return
+    if output_format not in ("table", "jsonl", "csv"):
+        console.print(f"[red]错误:[/red] 未知的输出格式: {output_format} (可选: table, jsonl, csv)")
+        raise typer.Exit(1)
 
-        table = Table(show_header=True, header_style="bold")
-        table.add_column("ID", width=6)
-        table.add_column("标题", width=30)
-        table.add_column("状态", width=10)
-        table.add_column("优先级", width=6)
-        table.add_column("标签", width=15)
-
-        for task in tasks:
-            status_str = {
-                TaskStatus.TODO: "[dim]📋 待办[/dim]",
-                TaskStatus.IN_PROGRESS: "[yellow]⏳ 进行中[/yellow]",
-                TaskStatus.COMPLETED: "[green]✅ 完成[/green]",
-                TaskStatus.FAILED: "[red]❌ 失败[/red]",
-                TaskStatus.SKIPPED: "[dim]⏭️ 跳过[/dim]",
-            }.get(task.status, str(task.status))
-
-            table.add_row(
-                task.id,
-                task.title[:28],
-                status_str,
-                str(task.priority),
-                ", ".join(task.tags)[:13],
-            )
+    tag_list = [t.strip() for t in tags.split(",") if t.strip()] if tags else []
+    status = status_filter.value if status_filter else None
+    # 多取一条，用于判断后面是否还有任务
+    fetch = limit + 1 if limit is not None else None
 
-        console.print(table)
+    try:
+        client = DaemonClient.connect(file)
+        if client is not None:
+            items = iter(client.list_tasks(status, tags=tag_list, sort=sort, offset=offset, limit=fetch))
+        else:
+            items = TaskManager(task_file=file).query(status, tag_list, sort=sort, offset=offset, limit=fetch)
+        shown = islice(items, limit) if limit is not None else items
+
+        with pager_console() if pager else nullcontext(console) as out:
+            if output_format == "jsonl":
+                write_jsonl(shown, out.file)
+                return
+            if output_format == "csv":
+                write_csv(shown, out.file)
+                return
+
+            printer = TaskListPrinter(out)
+            for item in shown:
+                printer.row(item)
+            printer.flush()
+            if not printer.count:
+                out.print("[dim]没有任务[/dim]")
+            elif next(items, None) is not None:
+                out.print(
+                    f"[dim]显示第 {offset + 1}-{offset + printer.count} 个任务，"
+                    f"使用 --offset {offset + printer.count} 查看更多[/dim]"
+                )
 
     except FileNotFoundError:
         console.print(f"[red]错误:[/red] 任务文件不存在: {file}")
+    except (DaemonError, ValueError) as e:
+        console.print(f"[red]错误:[/red] {e}")
+        raise typer.Exit(1)
+
+
+@task_app.command("dedup")
+def task_dedup(
+    file: str = typer.Option("prd.json", "-f", "--file", help="任务文件路径"),
+    threshold: float = typer.Option(0.7, "--threshold", help="近似重复的相似度阈值 (0-1)"),
+    apply: bool = typer.Option(False, "--apply", help="把完全重复的待办任务标记为跳过并合并到保留的任务"),
+    near: bool = typer.Option(False, "--near", help="--apply 时同时跳过近似重复"),
+):
+    """列出重复和近似重复的任务"""
+    from .dedup import find_clusters
+    from .display import show_duplicate_clusters
+
+    manager = TaskManager(task_file=file)
+    try:
+        manager.load_tasks()
+    except FileNotFoundError:
+        console.print(f"[red]错误:[/red] 任务文件不存在: {file}")
+        raise typer.Exit(1)
+
+    clusters = find_clusters(manager.tasks, threshold)
+    if not clusters:
+        console.print("[dim]没有重复任务[/dim]")
+        return
+    show_duplicate_clusters(clusters, {task.id: task for task in manager.tasks})
+
+    if apply:
+        found = manager.flag_duplicates(threshold=threshold, near=near)
+        skipped = sum(1 for task, _ in found if task.duplicate_of)
+        console.print(f"[green]✅[/green] 已跳过 {skipped} 个重复的待办任务")
 
 
 @task_app.command("init")
@@ -0,0 +1,347 @@
+"""守护进程客户端与快速入口
+
+本模块只依赖标准库。``ralphy status`` / ``ralphy task add`` 在守护进程运行时
+直接通过 Unix socket 调用其 API，跳过 typer、rich、pydantic 的导入和任务文件
+解析；守护进程未运行或参数无法识别时回退到完整 CLI。``ralphy task list
+--format jsonl|csv`` 在守护进程未运行时也走快速路径，直接流式读取任务文件。
+"""
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from urllib.parse import urlencode
+
+
+def socket_path_for(task_file: str) -> Path:
+    """任务文件对应的守护进程 socket 路径"""
+    path = Path(task_file).absolute()
+    return path.parent / ".ralphy" / f"{path.name}.sock"
+
+
+class DaemonError(Exception):
+    """守护进程返回错误"""
+
+
+class DaemonUnavailable(ConnectionError):
+    """无法连接守护进程，请求尚未发送"""
+
+
+class _Response:
+    """最小化的 HTTP 响应读取 (避免导入 http.client 带来的启动开销)"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.file = sock.makefile("rb")
+        status_line = self.file.readline().decode("latin-1")
+        parts = status_line.split(" ", 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise DaemonError(f"无效响应: {status_line.strip()}")
+        self.status = int(parts[1])
+        self.headers: dict[str, str] = {}
+        while True:
+            line = self.file.readline().decode("latin-1").strip()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            self.headers[key.strip().lower()] = value.strip()
+
+    def read(self) -> bytes:
+        if self.headers.get("transfer-encoding") == "chunked":
+            return b"".join(self.chunks())
+        length = self.headers.get("content-length")
+        return self.file.read(int(length)) if length is not None else self.file.read()
+
+    def chunks(self) -> Iterator[bytes]:
+        while True:
+            size = int(self.file.readline().strip() or b"0", 16)
+            if size == 0:
+                return
+            data = self.file.read(size)
+            self.file.readline()
+            yield data
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+
+class DaemonClient:
+    """守护进程 API 客户端"""
+
+    def __init__(self, socket_path: Path, timeout: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @classmethod
+    def connect(cls, task_file: str) -> Optional["DaemonClient"]:
+        """守护进程在运行时返回客户端，否则返回 None"""
+        path = socket_path_for(task_file)
+        if not path.exists():
+            return None
+        client = cls(path)
+        try:
+            client.request("GET", "/ping")
+        except (OSError, DaemonError):
+            return None
+        return client
+
+    def _open(self, method: str, url: str, body: Optional[dict], timeout: Optional[float]) -> _Response:
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else b""
+        head = (
+            f"{method} {url} HTTP/1.1\r\n"
+            "Host: localhost\r\n"
+            "Connection: close\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n"
+        )
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(e.errno, e.strerror) from e
+        try:
+            sock.sendall(head.encode("latin-1") + payload)
+            response = _Response(sock)
+        except Exception:
+            sock.close()
+            raise
+
+        if response.status >= 400:
+            data = response.read().decode("utf-8", errors="replace")
+            response.close()
+            try:
+                message = json.loads(data).get("error", data)
+            except ValueError:
+                message = data
+            raise DaemonError(message)
+        return response
+
+    def request(self, method: str, url: str, body: Optional[dict] = None) -> Any:
+        """发送请求并返回解析后的 JSON"""
+        response = self._open(method, url, body, self.timeout)
+        try:
+            return json.loads(response.read() or b"null")
+        finally:
+            response.close()
+
+    def stream(self, url: str) -> Iterator[dict]:
+        """读取 NDJSON 流式响应"""
+        response = self._open("GET", url, None, timeout=None)
+        try:
+            for chunk in response.chunks():
+                for line in chunk.splitlines():
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+        finally:
+            response.close()
+
+    # 便捷方法
+
+    def status(self) -> dict:
+        return self.request("GET", "/status")
+
+    def list_tasks(
+        self,
+        status: Optional[str] = None,
+        tags: Optional[list[str]] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
+        params: list[tuple[str, Any]] = [("tag", tag) for tag in tags or ()]
+        for name, value in (("status", status), ("sort", sort), ("offset", offset or None), ("limit", limit)):
+            if value is not None:
+                params.append((name, value))
+        return self.request("GET", f"/tasks?{urlencode(params)}" if params else "/tasks")
+
+    def add_task(self, **fields) -> dict:
+        return self.request("POST", "/tasks", fields)
+
+    def run(self) -> dict:
+        return self.request("POST", "/run")
+
+    def shutdown(self) -> dict:
+        return self.request("POST", "/shutdown")
+
+
+# ----------------------------------------------------------------------
+# 快速入口
+# ----------------------------------------------------------------------
+
+def format_added(task: dict) -> str:
+    """添加任务的结果 (发现重复时带 ``duplicate`` 字段)"""
+    duplicate = task.get("duplicate")
+    if duplicate and duplicate["exact"]:
+        return f"⚠️  与任务 [{task['id']}] {task['title']} 完全重复，已合并 (--allow-duplicate 强制添加)"
+    message = f"✅ 已添加任务 [{task['id']}] {task['title']}"
+    if duplicate:
+        message += f"\n⚠️  可能与任务 [{duplicate['task_id']}] 重复 (相似度 {duplicate['similarity']:.2f})"
+    return message
+
+
+def format_status(stats: dict) -> str:
+    """纯文本状态输出"""
+    return "\n".join([
+        "",
+        "📊 任务状态",
+        f"  总任务: {stats['total']}",
+        f"  待办: {stats['todo']}",
+        f"  进行中: {stats['in_progress']}",
+        f"  已完成: {stats['completed']}",
+        f"  失败: {stats['failed']}",
+        f"  跳过: {stats['skipped']}",
+    ])
+
+
+def _parse_options(args: list[str], spec: dict[str, str], positional: int) -> Optional[tuple[list[str], dict[str, str]]]:
+    """解析简单的 ``--opt value`` 参数，遇到无法识别的参数返回 None"""
+    values: dict[str, str] = {}
+    rest: list[str] = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("-"):
+            name, eq, inline = arg.partition("=")
+            key = spec.get(name)
+            if key is None:
+                return None
+            if eq:
+                values[key] = inline
+                i += 1
+            elif i + 1 < len(args):
+                values[key] = args[i + 1]
+                i += 2
+            else:
+                return None
+        else:
+            rest.append(arg)
+            i += 1
+    if len(rest) != positional:
+        return None
+    return rest, values
+
+
+def _fast_path(argv: list[str]) -> bool:
+    """尝试通过守护进程处理命令，成功返回 True"""
+    if argv[:1] == ["status"]:
+        parsed = _parse_options(argv[1:], {"-f": "file", "--file": "file"}, 0)
+        if parsed is None:
+            return False
+        client = DaemonClient.connect(parsed[1].get("file", "prd.json"))
+        if client is None:
+            return False
+        print(format_status(client.status()))
+        return True
+
+    if argv[:2] == ["task", "add"]:
+        spec = {
+            "--desc": "description",
+            "--acceptance": "acceptance",
+            "--priority": "priority",
+            "-p": "priority",
+            "--tags": "tags",
+            "-f": "file",
+            "--file": "file",
+        }
+        parsed = _parse_options(argv[2:], spec, 1)
+        if parsed is None:
+            return False
+        (title,), values = parsed
+        try:
+            priority = int(values.get("priority", "0"))
+        except ValueError:
+            return False
+        client = DaemonClient.connect(values.pop("file", "prd.json"))
+        if client is None:
+            return False
+        tags = [t.strip() for t in values.get("tags", "").split(",") if t.strip()]
+        task = client.add_task(
+            title=title,
+            description=values.get("description", ""),
+            acceptance=values.get("acceptance", ""),
+            priority=priority,
+            tags=tags,
+        )
+        print(format_added(task))
+        return True
+
+    if argv[:2] == ["task", "list"]:
+        # 机器可读格式不需要 rich 和 pydantic，守护进程未运行时直接流式读取任务文件
+        spec = {
+            "-s": "status",
+            "--status": "status",
+            "-f": "file",
+            "--file": "file",
+            "--tags": "tags",
+            "--sort": "sort",
+            "--offset": "offset",
+            "-n": "limit",
+            "--limit": "limit",
+            "--format": "format",
+        }
+        parsed = _parse_options(argv[2:], spec, 0)
+        if parsed is None:
+            return False
+        values = parsed[1]
+        if values.get("format") not in ("jsonl", "csv"):
+            return False
+        from .task_query import iter_json_array, query_items, write_csv, write_jsonl
+
+        file = values.get("file", "prd.json")
+        tags = [t.strip() for t in values.get("tags", "").split(",") if t.strip()]
+        try:
+            query = {
+                "status": values.get("status"),
+                "tags": tags,
+                "sort": values.get("sort"),
+                "offset": int(values.get("offset", "0")),
+                "limit": int(values["limit"]) if "limit" in values else None,
+            }
+        except ValueError:
+            return False
+        client = DaemonClient.connect(file)
+        if client is not None:
+            items = client.list_tasks(**query)
+        elif Path(file).is_file():
+            items = query_items(iter_json_array(Path(file)), **query)
+        else:
+            return False
+        write = write_jsonl if values["format"] == "jsonl" else write_csv
+        try:
+            write(items, sys.stdout)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # 管道另一端提前关闭 (例如 head)
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        except ValueError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+        return True
+
+    return False
+
+
+def main() -> None:
+    """命令行入口：守护进程可用时走快速路径，否则加载完整 CLI"""
+    argv = sys.argv[1:]
+    if not os.environ.get("RALPHY_NO_DAEMON"):
+        try:
+            if _fast_path(argv):
+                return
+        except DaemonUnavailable:
+            # 请求尚未发送 (守护进程刚退出)，可以安全地回退到完整 CLI
+            pass
+        except (DaemonError, OSError, ValueError) as e:
+            # 请求已发送或已开始输出，回退会重复执行 (如重复添加任务)
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    from .cli import app
+    app()
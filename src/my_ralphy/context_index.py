@@ -0,0 +1,344 @@
+"""仓库上下文索引
+
+为工作目录维护文件树、符号/关键词倒排索引以及按内容哈希缓存的文件摘要，
+构建提示时附加与任务最相关的文件，减少 Claude 会话探索仓库的时间。
+
+索引按 mtime/size 增量更新：未变化的文件不读取；mtime 变化但内容哈希
+不变的文件复用已有摘要。索引缓存在 ``<工作目录>/.ralphy/index.json``。
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .logger import get_logger
+
+INDEX_VERSION = 1
+
+# 参与索引的文本文件扩展名
+TEXT_EXTENSIONS = {
+    ".py", ".pyi", ".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".vue", ".svelte",
+    ".go", ".rs", ".java", ".kt", ".scala", ".c", ".h", ".cc", ".cpp", ".hpp",
+    ".cs", ".rb", ".php", ".swift", ".m", ".sh", ".bash", ".sql", ".lua",
+    ".html", ".css", ".scss", ".md", ".rst", ".txt", ".toml", ".yaml", ".yml",
+    ".json", ".ini", ".cfg",
+}
+
+# 非 git 仓库遍历时跳过的目录
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache", ".ralphy", "dist", "build"}
+
+MAX_FILE_SIZE = 256 * 1024
+MAX_KEYWORDS = 60
+MAX_SYMBOLS = 40
+
+SYMBOL_PATTERNS = [
+    re.compile(r"^\s*(?:async\s+)?def\s+(\w+)", re.M),
+    re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?(?:public\s+|private\s+)?(?:class|interface|trait|struct|enum|type)\s+(\w+)", re.M),
+    re.compile(r"^\s*(?:export\s+)?(?:async\s+)?function\s*\*?\s*(\w+)", re.M),
+    re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?(?:\(|function)", re.M),
+    re.compile(r"^func\s+(?:\([^)]*\)\s*)?(\w+)", re.M),
+    re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\s+(\w+)", re.M),
+]
+
+IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+CJK_RE = re.compile(r"[一-鿿]+")
+CONTENT_RE = re.compile(r"[A-Za-z0-9一-鿿]")
+
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "this", "that", "are", "not", "you", "use",
+    "self", "none", "true", "false", "return", "import", "def", "class", "const",
+    "let", "var", "function", "int", "str", "string", "list", "dict", "new", "get",
+    "set", "if", "else", "elif", "try", "except", "raise", "pass", "null", "void",
+    "public", "private", "static", "async", "await", "export", "default", "type",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """分词：英文标识符按驼峰/下划线拆分，中文按双字切分"""
+    tokens = []
+    for ident in IDENT_RE.findall(text):
+        lower = ident.lower()
+        if len(lower) >= 3 and lower not in STOPWORDS:
+            tokens.append(lower)
+        parts = [p.lower() for part in ident.split("_") for p in CAMEL_RE.findall(part)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) >= 3 and p not in STOPWORDS)
+    for run in CJK_RE.findall(text):
+        if len(run) == 1:
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+@dataclass
+class FileEntry:
+    """单个文件的索引条目"""
+    path: str
+    mtime: float
+    size: int
+    hash: str
+    symbols: list[str] = field(default_factory=list)
+    keywords: list[str] = field(default_factory=list)
+    summary: str = ""
+
+
+@dataclass
+class IndexStats:
+    """一次索引刷新的统计"""
+    files: int = 0
+    scanned: int = 0
+    rehashed: int = 0
+    extracted: int = 0
+    removed: int = 0
+    duration: float = 0.0
+
+
+def _summarize(path: str, text: str, symbols: list[str]) -> str:
+    """提取文件首行文档/注释作为摘要"""
+    doc = ""
+    for line in text.splitlines()[:30]:
+        stripped = line.strip().strip('"\'').strip()
+        for prefix in ("#!", "#", "//", "/*", "*", "--", "<!--"):
+            if stripped.startswith(prefix):
+                stripped = stripped[len(prefix):].strip()
+                break
+        if CONTENT_RE.search(stripped) and not stripped.startswith(("-*-", "coding", "eslint", "type:", "import", "from ", "package ")):
+            doc = stripped[:120]
+            break
+
+    if symbols:
+        shown = ", ".join(symbols[:8])
+        return f"{doc} [{shown}]" if doc else f"[{shown}]"
+    return doc
+
+
+def _extract(path: str, text: str) -> tuple[list[str], list[str], str]:
+    """提取符号、关键词和摘要"""
+    symbols: list[str] = []
+    seen = set()
+    for pattern in SYMBOL_PATTERNS:
+        for name in pattern.findall(text):
+            if name not in seen and not name.startswith("__"):
+                seen.add(name)
+                symbols.append(name)
+                if len(symbols) >= MAX_SYMBOLS:
+                    break
+
+    counts = Counter(tokenize(text))
+    keywords = [word for word, _ in counts.most_common(MAX_KEYWORDS)]
+    return symbols, keywords, _summarize(path, text, symbols)
+
+
+class RepoIndex:
+    """仓库上下文索引"""
+
+    def __init__(self, root: Path, cache_file: Optional[Path] = None):
+        self.root = Path(root).resolve()
+        self.cache_file = cache_file or self.root / ".ralphy" / "index.json"
+        self.logger = get_logger()
+        self.entries: dict[str, FileEntry] = {}
+        # 内容哈希 -> (符号, 关键词, 摘要)，重命名或回滚的文件可直接复用
+        self._by_hash: dict[str, tuple[list[str], list[str], str]] = {}
+        self._inverted: dict[str, set[str]] = {}
+        self._path_tokens: dict[str, set[str]] = {}
+        self._symbol_tokens: dict[str, set[str]] = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        self._loaded = True
+        if not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.logger.warning(f"索引缓存损坏，将重建: {self.cache_file}")
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        for item in data.get("files", []):
+            entry = FileEntry(**item)
+            self._add(entry)
+
+    def save(self) -> None:
+        """写回索引缓存 (无变化时跳过)"""
+        if not self._dirty:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": INDEX_VERSION, "files": [asdict(e) for e in self.entries.values()]},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp, self.cache_file)
+        self._dirty = False
+
+    # ------------------------------------------------------------------
+    # 倒排索引维护
+    # ------------------------------------------------------------------
+
+    def _add(self, entry: FileEntry) -> None:
+        self.entries[entry.path] = entry
+        self._by_hash[entry.hash] = (entry.symbols, entry.keywords, entry.summary)
+        path_tokens = set(tokenize(entry.path.replace("/", " ").replace(".", " ")))
+        symbol_tokens = set(t for s in entry.symbols for t in tokenize(s))
+        self._path_tokens[entry.path] = path_tokens
+        self._symbol_tokens[entry.path] = symbol_tokens
+        for token in path_tokens | symbol_tokens | set(entry.keywords):
+            self._inverted.setdefault(token, set()).add(entry.path)
+
+    def _remove(self, path: str) -> None:
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return
+        tokens = self._path_tokens.pop(path, set()) | self._symbol_tokens.pop(path, set()) | set(entry.keywords)
+        for token in tokens:
+            paths = self._inverted.get(token)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self._inverted[token]
+
+    # ------------------------------------------------------------------
+    # 增量刷新
+    # ------------------------------------------------------------------
+
+    def _list_files(self) -> list[str]:
+        """列出候选文件，git 仓库中遵循 .gitignore"""
+        try:
+            result = subprocess.run(
+                ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+                cwd=self.root,
+                capture_output=True,
+                text=True,
+                timeout=30,
+            )
+            if result.returncode == 0:
+                return [p for p in result.stdout.split("\0") if p]
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+        files = []
+        for dirpath, dirs, names in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            rel = os.path.relpath(dirpath, self.root)
+            for name in names:
+                files.append(name if rel == "." else f"{rel}/{name}")
+        return files
+
+    def refresh(self) -> IndexStats:
+        """增量刷新索引"""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> IndexStats:
+        start_time = time.time()
+        if not self._loaded:
+            self._load()
+
+        stats = IndexStats()
+        seen = set()
+
+        for path in self._list_files():
+            if os.path.splitext(path)[1].lower() not in TEXT_EXTENSIONS or path.startswith(".ralphy/"):
+                continue
+            full = self.root / path
+            try:
+                st = full.stat()
+            except OSError:
+                continue
+            if st.st_size > MAX_FILE_SIZE:
+                continue
+
+            seen.add(path)
+            stats.scanned += 1
+            entry = self.entries.get(path)
+            if entry is not None and entry.mtime == st.st_mtime and entry.size == st.st_size:
+                continue
+
+            try:
+                data = full.read_bytes()
+            except OSError:
+                continue
+            digest = hashlib.sha1(data).hexdigest()
+            stats.rehashed += 1
+
+            if entry is not None and entry.hash == digest:
+                entry.mtime, entry.size = st.st_mtime, st.st_size
+                self._dirty = True
+                continue
+
+            cached = self._by_hash.get(digest)
+            if cached is None:
+                symbols, keywords, summary = _extract(path, data.decode("utf-8", errors="ignore"))
+                stats.extracted += 1
+            else:
+                symbols, keywords, summary = cached
+
+            self._remove(path)
+            self._add(FileEntry(path, st.st_mtime, st.st_size, digest, symbols, keywords, summary))
+            self._dirty = True
+
+        for path in [p for p in self.entries if p not in seen]:
+            self._remove(path)
+            stats.removed += 1
+            self._dirty = True
+
+        self.save()
+        stats.files = len(self.entries)
+        stats.duration = time.time() - start_time
+        self.logger.debug(
+            f"索引刷新: {stats.files} 个文件，重新哈希 {stats.rehashed}，"
+            f"提取 {stats.extracted}，耗时 {stats.duration:.3f}s"
+        )
+        return stats
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def query(self, text: str, limit: int = 8) -> list[tuple[FileEntry, float]]:
+        """按 TF-IDF 近似打分返回最相关的文件
+
+        路径命中权重最高，其次是符号名，最后是正文关键词。
+        """
+        with self._lock:
+            total = len(self.entries)
+            if total == 0:
+                return []
+
+            scores: Counter = Counter()
+            for token in set(tokenize(text)):
+                paths = self._inverted.get(token)
+                if not paths:
+                    continue
+                idf = math.log(1 + total / len(paths))
+                for path in paths:
+                    if token in self._path_tokens[path]:
+                        weight = 3.0
+                    elif token in self._symbol_tokens[path]:
+                        weight = 2.0
+                    else:
+                        weight = 1.0
+                    scores[path] += idf * weight
+
+            return [(self.entries[path], score) for path, score in scores.most_common(limit)]
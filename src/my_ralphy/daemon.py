@@ -0,0 +1,355 @@
+"""守护进程模式
+
+``ralphy serve`` 常驻内存，持有任务存储与执行器线程池，通过 Unix socket
+提供 HTTP API：
+
+- ``GET  /ping``            存活检查
+- ``GET  /status``          任务统计与运行中的任务
+- ``GET  /tasks``           任务列表 (``?status=todo`` 筛选)
+- ``POST /tasks``           添加任务 (完全重复时合并到已有任务，``allow_duplicate`` 强制添加)
+- ``POST /run``             执行所有待办任务
+- ``GET  /results/stream``  以 NDJSON 流式返回执行结果 (``?since=N`` 从第 N 条开始)
+- ``POST /shutdown``        停止守护进程
+"""
+
+import errno
+import json
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from .client import DaemonClient, DaemonError
+from .dedup import DuplicateMatch
+from .executor import ClaudeExecutor
+from .logger import get_logger, log_context
+from .models import ErrorHandling, RunConfig, Task, TaskStatus
+from .task_manager import TaskManager
+from .task_query import query_items
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """基于 Unix socket 的多线程 HTTP 服务"""
+    daemon_threads = True
+
+    def __init__(self, path: str, handler, daemon: "TaskDaemon"):
+        self.task_daemon = daemon
+        super().__init__(path, handler)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """API 请求处理"""
+
+    server: _UnixHTTPServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        get_logger().debug(f"daemon: {format % args}")
+
+    def address_string(self) -> str:
+        return "unix"
+
+    def _send_json(self, data, status: int = 200) -> None:
+        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def do_GET(self) -> None:
+        daemon = self.server.task_daemon
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/ping":
+            self._send_json({"ok": True, "pid": os.getpid()})
+        elif url.path == "/status":
+            self._send_json(daemon.status())
+        elif url.path == "/tasks":
+            limit = query.get("limit", [None])[0]
+            try:
+                tasks = daemon.list_tasks(
+                    status=query.get("status", [None])[0],
+                    tags=query.get("tag") or None,
+                    sort=query.get("sort", [None])[0],
+                    offset=int(query.get("offset", ["0"])[0]),
+                    limit=int(limit) if limit is not None else None,
+                )
+            except ValueError as e:
+                self._send_json({"error": str(e)}, status=400)
+                return
+            self._send_json(tasks)
+        elif url.path == "/results/stream":
+            self._stream_results(int(query.get("since", ["0"])[0]))
+        else:
+            self._send_json({"error": f"未知路径: {url.path}"}, status=404)
+
+    def do_POST(self) -> None:
+        daemon = self.server.task_daemon
+        url = urlparse(self.path)
+
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send_json({"error": "请求体不是合法 JSON"}, status=400)
+            return
+
+        if url.path == "/tasks":
+            if not body.get("title"):
+                self._send_json({"error": "缺少任务标题"}, status=400)
+                return
+            try:
+                task, match = daemon.add_task(body)
+            except ValueError as e:
+                self._send_json({"error": str(e)}, status=400)
+                return
+            data = task.model_dump(mode="json")
+            if match is not None:
+                data["duplicate"] = {"task_id": match.task_id, "similarity": match.similarity, "exact": match.exact}
+            # 完全重复时返回被合并的已有任务
+            self._send_json(data, status=200 if match is not None and match.exact else 201)
+        elif url.path == "/run":
+            self._send_json({"submitted": daemon.run_pending()})
+        elif url.path == "/shutdown":
+            self._send_json({"ok": True})
+            threading.Thread(target=daemon.stop, daemon=True).start()
+        else:
+            self._send_json({"error": f"未知路径: {url.path}"}, status=404)
+
+    def _stream_results(self, since: int) -> None:
+        """分块传输执行结果，直到客户端断开或守护进程停止"""
+        daemon = self.server.task_daemon
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        index = since
+        try:
+            while not daemon.stopped:
+                results = daemon.wait_results(index, timeout=15.0)
+                # 空块以外的心跳：一个换行，便于客户端发现断开
+                chunk = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in results) or "\n"
+                index += len(results)
+                data = chunk.encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class DaemonRunningError(RuntimeError):
+    """socket 上已有守护进程在监听"""
+
+
+class TaskDaemon:
+    """常驻任务服务：任务存储与执行器线程池保留在内存中"""
+
+    def __init__(self, config: RunConfig, socket_path: Path, workers: int = 1, auto_run: bool = False):
+        self.config = config
+        self.socket_path = socket_path
+        self.auto_run = auto_run
+        self.logger = get_logger()
+        self.task_manager = TaskManager(task_file=config.task_file, results_file="ralph_results.json")
+        self.executor = ClaudeExecutor.from_config(config)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ralphy-daemon")
+        self.lock = threading.Lock()
+        self.results_changed = threading.Condition(self.lock)
+        self.stream: list[dict] = []
+        self.running: set[str] = set()
+        self.submitted: set[str] = set()
+        self.stopped = False
+        self.server: Optional[_UnixHTTPServer] = None
+
+    # ------------------------------------------------------------------
+    # 任务操作
+    # ------------------------------------------------------------------
+
+    def status(self) -> dict:
+        with self.lock:
+            stats = self.task_manager.get_statistics()
+            stats["running"] = sorted(self.running)
+            stats["queued"] = len(self.submitted - self.running)
+            return stats
+
+    def list_tasks(
+        self,
+        status: Optional[str] = None,
+        tags: Optional[list[str]] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
+        with self.lock:
+            tasks = self.task_manager.tasks
+            if status:
+                tasks = [t for t in tasks if t.status == status]
+            if tags:
+                tasks = [t for t in tasks if not set(tags).isdisjoint(t.tags)]
+            items = (t.model_dump(mode="json") for t in tasks)
+            return list(query_items(items, sort=sort, offset=offset, limit=limit))
+
+    def add_task(self, body: dict) -> tuple[Task, Optional[DuplicateMatch]]:
+        """添加任务，同时返回发现的重复关系；完全重复时合并到已有任务，不添加新任务"""
+        match = None
+        with self.lock:
+            if not body.get("allow_duplicate"):
+                match = self.task_manager.find_duplicate(
+                    title=body["title"],
+                    description=body.get("description", ""),
+                    acceptance=body.get("acceptance", ""),
+                )
+            if match is not None and match.exact:
+                task = self.task_manager.merge_duplicate(
+                    match.task_id, priority=int(body.get("priority", 0)), tags=body.get("tags") or []
+                )
+                return task, match
+            task = self.task_manager.add_task(
+                title=body["title"],
+                description=body.get("description", ""),
+                acceptance=body.get("acceptance", ""),
+                priority=int(body.get("priority", 0)),
+                tags=body.get("tags") or [],
+            )
+        if self.auto_run:
+            self._submit(task)
+        return task, match
+
+    def run_pending(self) -> int:
+        """提交所有待办任务到执行器线程池"""
+        with self.lock:
+            pending = self.task_manager.get_pending_tasks()
+        return sum(1 for task in pending if self._submit(task))
+
+    def _submit(self, task: Task) -> bool:
+        with self.lock:
+            if task.id in self.submitted:
+                return False
+            self.submitted.add(task.id)
+        self.pool.submit(self._run_task, task)
+        return True
+
+    def _run_task(self, task: Task) -> None:
+        """在线程池中执行任务 (守护进程中 pause 策略按 skip 处理)"""
+        with self.lock:
+            if self.stopped:
+                self.submitted.discard(task.id)
+                return
+            self.running.add(task.id)
+            self.task_manager.update_task_status(task.id, TaskStatus.IN_PROGRESS)
+
+        max_retries = self.config.max_retries if self.config.on_error == ErrorHandling.RETRY else 0
+        retry_count = 0
+        try:
+            with log_context(task_id=task.id):
+                while True:
+                    result = self.executor.run_task(task)
+                    result.retry_count = retry_count
+                    if result.success or retry_count >= max_retries or self.stopped:
+                        break
+                    retry_count += 1
+                    time.sleep(1)
+        except Exception as e:
+            self.logger.error(f"任务 {task.id} 执行异常: {e}")
+            with self.lock:
+                self.task_manager.update_task_status(task.id, TaskStatus.FAILED)
+                self.running.discard(task.id)
+                self.submitted.discard(task.id)
+            return
+
+        with self.lock:
+            if self.stopped and not result.success:
+                # 守护进程停止时被终止的会话，下次启动时重新执行
+                self.task_manager.update_task_status(task.id, TaskStatus.TODO)
+                self.running.discard(task.id)
+                self.submitted.discard(task.id)
+                return
+            status = TaskStatus.COMPLETED if result.success else TaskStatus.FAILED
+            self.task_manager.update_task_status(task.id, status)
+            self.task_manager.add_result(result)
+            self.running.discard(task.id)
+            self.submitted.discard(task.id)
+            self.stream.append(result.model_dump(mode="json", exclude={"output"}))
+            self.results_changed.notify_all()
+
+    def wait_results(self, since: int, timeout: float) -> list[dict]:
+        """阻塞等待第 since 条之后的新结果"""
+        with self.results_changed:
+            if len(self.stream) <= since and not self.stopped:
+                self.results_changed.wait(timeout)
+            return self.stream[since:]
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def serve_forever(self) -> None:
+        """加载任务并开始监听 socket"""
+        try:
+            self.task_manager.load_tasks()
+        except FileNotFoundError:
+            self.task_manager.tasks = []
+        self.task_manager.load_results()
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self._remove_stale_socket()
+
+        self.server = _UnixHTTPServer(str(self.socket_path), _Handler, self)
+        self.logger.info(f"守护进程已启动: {self.socket_path}")
+
+        if self.auto_run:
+            self.run_pending()
+
+        try:
+            self.server.serve_forever()
+        finally:
+            self.stop()
+
+    def _remove_stale_socket(self) -> None:
+        """删除上次异常退出残留的 socket 文件；已有守护进程在监听时拒绝启动"""
+        try:
+            DaemonClient(self.socket_path).request("GET", "/ping")
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return
+            if e.errno == errno.ECONNREFUSED:
+                self.socket_path.unlink()
+                return
+            raise
+        except DaemonError:
+            # 有进程在监听但响应异常，同样不能接管
+            pass
+        raise DaemonRunningError(f"守护进程已在运行: {self.socket_path}")
+
+    def stop(self) -> None:
+        if self.stopped:
+            return
+        with self.results_changed:
+            self.stopped = True
+            self.results_changed.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        # 线程池只能取消排队的任务，运行中的会话在独立进程组中，需要显式终止；
+        # 之后等待工作线程把被终止的任务写回待办状态
+        self.executor.cancel_all()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.executor.close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+        self.logger.info("守护进程已停止")
@@ -0,0 +1,184 @@
+"""重复任务检测
+
+生成的计划和批量 ``ralphy task add`` 脚本常常多次加入相同或几乎相同的任务
+(同一标题，描述略有改写)，每一份都要花掉一次完整的 Claude 会话。
+
+- 完全重复：标题、描述、验收标准归一化 (NFKC、小写、去标点、合并空白) 后
+  哈希相同
+- 近似重复：归一化文本的字符 n-gram 集合 (中文为主时 2-gram，否则 3-gram) 的
+  Jaccard 相似度不低于阈值。每个任务计算一次 64 维 MinHash 签名 (单次哈希分桶，
+  空桶向后借值)，按 16 个 band 建立 LSH 索引，只与同桶的候选精确比较，插入和
+  查询与任务总数无关
+- 目标仓库 (``repos``) 不同的任务不视为重复
+
+字面相似无法区分改写和只差一个关键词的不同任务 ("user service" / "order
+service")，近似重复默认只提示，由调用方决定是否跳过。
+"""
+
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from .models import Task
+
+DEFAULT_THRESHOLD = 0.7
+
+SHINGLE_SIZE = 3
+CJK_SHINGLE_SIZE = 2
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+_EMPTY = (1 << 64) - 1
+
+
+def normalize(text: str) -> str:
+    """归一化文本：NFKC、小写、标点替换为空格、合并空白"""
+    return _NON_WORD.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def _text(task: Task) -> str:
+    return " ".join(part for part in (normalize(task.title), normalize(task.description), normalize(task.acceptance)) if part)
+
+
+def _scope(task: Task) -> tuple[str, ...]:
+    return tuple(sorted(task.repos))
+
+
+def exact_key(task: Task) -> str:
+    """完全重复判定用的内容哈希"""
+    parts = [normalize(task.title), normalize(task.description), normalize(task.acceptance), "\n".join(_scope(task))]
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def shingles(text: str) -> frozenset[int]:
+    """字符 n-gram 的 64 位哈希集合"""
+    # 中文词平均不到两个字，3-gram 对改写过于敏感
+    size = CJK_SHINGLE_SIZE if len(_CJK.findall(text)) * 3 > len(text) else SHINGLE_SIZE
+    if len(text) <= size:
+        grams: Iterable[str] = [text] if text else []
+    else:
+        grams = (text[i:i + size] for i in range(len(text) - size + 1))
+    return frozenset(
+        int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big") for g in grams
+    )
+
+
+def minhash(hashes: frozenset[int]) -> tuple[int, ...]:
+    """单次哈希 MinHash：按低位分桶取各桶最小值，空桶取后面第一个非空桶的值"""
+    signature = [_EMPTY] * NUM_HASHES
+    for h in hashes:
+        bucket = h % NUM_HASHES
+        value = h // NUM_HASHES
+        if value < signature[bucket]:
+            signature[bucket] = value
+    if not hashes:
+        return tuple(signature)
+    for i in range(NUM_HASHES):
+        j = i
+        while signature[j % NUM_HASHES] == _EMPTY:
+            j += 1
+        if j != i:
+            # 借用的值加上偏移，避免不同桶的借值彼此相同
+            signature[i] = signature[j % NUM_HASHES] + ((j - i) << 64)
+    return tuple(signature)
+
+
+def jaccard(a: frozenset[int], b: frozenset[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class DuplicateMatch:
+    """与已有任务的重复关系"""
+    task_id: str
+    similarity: float
+    exact: bool
+
+
+@dataclass
+class Cluster:
+    """一组重复任务，第一个为保留的任务"""
+    task_id: str
+    duplicates: list[DuplicateMatch] = field(default_factory=list)
+
+
+class DedupIndex:
+    """重复任务索引：精确哈希 + MinHash LSH"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._exact: dict[str, str] = {}
+        self._buckets: dict[tuple, list[str]] = {}
+        self._shingles: dict[str, frozenset[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._shingles)
+
+    @staticmethod
+    def _bands(scope: tuple[str, ...], signature: tuple[int, ...]) -> list[tuple]:
+        return [(scope, b, signature[b * ROWS:(b + 1) * ROWS]) for b in range(BANDS)]
+
+    def _prepare(self, task: Task) -> tuple[str, frozenset[int], list[tuple]]:
+        hashes = shingles(_text(task))
+        return exact_key(task), hashes, self._bands(_scope(task), minhash(hashes))
+
+    def find(self, task: Task) -> Optional[DuplicateMatch]:
+        """查找与任务重复的已索引任务 (相似度最高者)"""
+        key, hashes, bands = self._prepare(task)
+        return self._find(task.id, key, hashes, bands)
+
+    def _find(self, task_id: str, key: str, hashes: frozenset[int], bands: list[tuple]) -> Optional[DuplicateMatch]:
+        existing = self._exact.get(key)
+        if existing is not None and existing != task_id:
+            return DuplicateMatch(task_id=existing, similarity=1.0, exact=True)
+
+        best: Optional[DuplicateMatch] = None
+        seen = {task_id}
+        for band in bands:
+            for candidate in self._buckets.get(band, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = jaccard(hashes, self._shingles[candidate])
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best = DuplicateMatch(task_id=candidate, similarity=similarity, exact=False)
+        return best
+
+    def add(self, task: Task) -> None:
+        """加入索引"""
+        key, hashes, bands = self._prepare(task)
+        self._insert(task.id, key, hashes, bands)
+
+    def _insert(self, task_id: str, key: str, hashes: frozenset[int], bands: list[tuple]) -> None:
+        self._exact.setdefault(key, task_id)
+        self._shingles[task_id] = hashes
+        for band in bands:
+            self._buckets.setdefault(band, []).append(task_id)
+
+    def add_or_match(self, task: Task) -> Optional[DuplicateMatch]:
+        """查找重复；不重复时加入索引 (只计算一次签名)"""
+        key, hashes, bands = self._prepare(task)
+        match = self._find(task.id, key, hashes, bands)
+        if match is None:
+            self._insert(task.id, key, hashes, bands)
+        return match
+
+
+def find_clusters(tasks: list[Task], threshold: float = DEFAULT_THRESHOLD) -> list[Cluster]:
+    """按任务顺序聚类重复任务，每组保留最早的任务"""
+    index = DedupIndex(threshold)
+    clusters: dict[str, Cluster] = {}
+    for task in tasks:
+        match = index.add_or_match(task)
+        if match is None:
+            continue
+        cluster = clusters.setdefault(match.task_id, Cluster(task_id=match.task_id))
+        cluster.duplicates.append(DuplicateMatch(task_id=task.id, similarity=match.similarity, exact=match.exact))
+    return list(clusters.values())
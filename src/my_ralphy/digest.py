@@ -0,0 +1,227 @@
+"""持续模式的滚动上下文摘要
+
+持续模式每次迭代都是独立的会话，只发送提示本身时，下一步不知道上一步做了
+什么，只能重新摸索；直接附上完整输出又会让提示越来越长。``RollingDigest`` 为
+每次迭代提取一条紧凑的记录：
+
+- 修改的文件 (由调用方通过工作区快照得到)
+- 关键决定：输出中描述做了什么、为什么的句子 (抽取式，按句截断)
+- 错误：失败原因和输出中的错误行
+
+同一句话在不同迭代中只保留第一次，提示中已有的内容 (会话复述提示时) 不抽取。摘要按 token 预算增量维护：新记录加入后
+超出预算时，先把最旧的详细记录压缩成一行，再丢弃最旧的记录，不需要每次从
+全部结果重建。
+"""
+
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .dedup import normalize
+from .models import TaskResult
+
+DEFAULT_BUDGET = 1500
+
+# 每次迭代最多保留的决定和错误条数，以及单条的最大字符数
+MAX_DECISIONS = 5
+MAX_ERRORS = 3
+MAX_LINE_CHARS = 160
+MAX_PROMPT_CHARS = 80
+# 最近修改的文件列表长度，以及文件列表最多占用的预算比例
+MAX_FILES = 20
+FILES_BUDGET_RATIO = 0.25
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+_SENTENCE = re.compile(r"(?<=[。！？!?；;])|(?<=\.)\s+|\n")
+_BULLET = re.compile(r"^\s*(?:[-*+•>#]+|\d+[.)])\s*")
+# 摘要自身的行首标记 (输出复述提示时不再重复抽取)
+_LABEL = re.compile(r"^(?:\d+\s*[✅❌]\s*|(?:决定|错误|文件|任务|描述)[:：]\s*)+")
+_DECISION = re.compile(
+    r"决定|选择|改为|改用|采用|新增|添加|实现|修复|重构|删除|重命名|因为|由于|注意|"
+    r"\b(?:decided|chose|instead|because|added|created|implemented|fixed|refactored|"
+    r"removed|renamed|switched|replaced|moved|note)\b",
+    re.IGNORECASE,
+)
+_ERROR = re.compile(r"错误|失败|异常|\b(?:error|exception|traceback|failed|failure)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数：中日韩字符各算一个，其余每 4 个字符算一个"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate(text: str, limit: int) -> str:
+    """截断到 limit 个字符以内，尽量在词边界处截断"""
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,，;；") + "…"
+
+
+def _sentences(text: str) -> list[str]:
+    result = []
+    for part in _SENTENCE.split(text):
+        part = _LABEL.sub("", _BULLET.sub("", part)).strip()
+        if len(part) >= 8:
+            result.append(part)
+    return result
+
+
+@dataclass
+class IterationDigest:
+    """一次迭代的摘要记录"""
+    iteration: int
+    prompt: str
+    success: bool
+    files: list[str] = field(default_factory=list)
+    decisions: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    detailed: bool = True
+    # 当前渲染结果的 token 数
+    cost: int = 0
+
+    def brief(self) -> str:
+        status = "✅" if self.success else "❌"
+        files = f" (修改 {len(self.files)} 个文件)" if self.files else ""
+        return f"- #{self.iteration} {status} {self.prompt}{files}"
+
+    def full(self) -> str:
+        lines = [self.brief()]
+        if self.files:
+            lines.append(f"  文件: {', '.join(self.files[:MAX_FILES])}")
+        lines.extend(f"  决定: {line}" for line in self.decisions)
+        lines.extend(f"  错误: {line}" for line in self.errors)
+        return "\n".join(lines)
+
+
+class RollingDigest:
+    """按 token 预算增量维护的迭代摘要"""
+
+    def __init__(self, budget: int = DEFAULT_BUDGET):
+        self.budget = budget
+        self._entries: deque[IterationDigest] = deque()
+        self._entry_tokens = 0
+        # 文件 -> 最近修改的迭代，按最近修改排序
+        self._files: OrderedDict[str, int] = OrderedDict()
+        self._seen: set[str] = set()
+        self._last_prompt: Optional[str] = None
+        self.dropped = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def _extract(self, text: str, pattern: re.Pattern, limit: int) -> list[str]:
+        """抽取匹配 pattern 的句子，跳过之前迭代已出现的句子"""
+        lines: list[str] = []
+        for sentence in _sentences(text):
+            if len(lines) >= limit:
+                break
+            if not pattern.search(sentence):
+                continue
+            key = normalize(sentence)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            lines.append(truncate(sentence, MAX_LINE_CHARS))
+        return lines
+
+    def add(
+        self,
+        iteration: int,
+        prompt: str,
+        result: TaskResult,
+        files: Optional[list[str]] = None,
+        sent: str = "",
+    ) -> IterationDigest:
+        """加入一次迭代的结果，超出预算时压缩或丢弃最旧的记录
+
+        Args:
+            iteration: 迭代序号
+            prompt: 用户输入的任务
+            result: 执行结果
+            files: 本次迭代修改的文件
+            sent: 本次发送的完整提示，其中的句子不会被抽取
+        """
+        self._seen.update(normalize(sentence) for sentence in _sentences(sent or prompt))
+        same = prompt == self._last_prompt
+        self._last_prompt = prompt
+        entry = IterationDigest(
+            iteration=iteration,
+            prompt="(继续上一任务)" if same else truncate(prompt, MAX_PROMPT_CHARS),
+            success=result.success,
+            files=list(files or []),
+        )
+
+        output = result.output or ""
+        if not result.success and result.error:
+            # 失败原因总是保留 (取前两行)
+            entry.errors = [truncate(line, MAX_LINE_CHARS) for line in result.error.splitlines() if line.strip()][:2]
+        entry.errors += self._extract(output, _ERROR, MAX_ERRORS - len(entry.errors))
+        entry.decisions = self._extract(output, _DECISION, MAX_DECISIONS)
+
+        for path in entry.files:
+            self._files[path] = iteration
+            self._files.move_to_end(path)
+        while len(self._files) > MAX_FILES:
+            self._files.popitem(last=False)
+
+        self._entries.append(entry)
+        entry.cost = estimate_tokens(entry.full())
+        self._entry_tokens += entry.cost
+        self._shrink()
+        return entry
+
+    def _files_text(self) -> str:
+        if not self._files:
+            return ""
+        paths = list(reversed(self._files))
+        text = f"最近修改的文件: {', '.join(paths)}"
+        limit = int(self.budget * FILES_BUDGET_RATIO)
+        while len(paths) > 1 and estimate_tokens(text) > limit:
+            paths.pop()
+            text = f"最近修改的文件: {', '.join(paths)}"
+        return text
+
+    def _shrink(self) -> None:
+        """从最旧的记录开始压缩为一行，仍超出预算时丢弃"""
+        available = self.budget - estimate_tokens(self._files_text())
+        for entry in self._entries:
+            if self._entry_tokens <= available:
+                return
+            if entry.detailed and entry is not self._entries[-1]:
+                self._set_cost(entry, False)
+        while self._entry_tokens > available and len(self._entries) > 1:
+            oldest = self._entries.popleft()
+            self._entry_tokens -= oldest.cost
+            self.dropped += 1
+        if self._entry_tokens > available and self._entries[-1].detailed:
+            # 只剩最新一条仍超出预算
+            self._set_cost(self._entries[-1], False)
+
+    def _set_cost(self, entry: IterationDigest, detailed: bool) -> None:
+        entry.detailed = detailed
+        cost = estimate_tokens(entry.full() if detailed else entry.brief())
+        self._entry_tokens += cost - entry.cost
+        entry.cost = cost
+
+    def render(self) -> str:
+        """渲染摘要文本，没有记录时返回空字符串"""
+        if not self._entries or self.budget <= 0:
+            return ""
+        lines = [entry.full() if entry.detailed else entry.brief() for entry in self._entries]
+        if self.dropped:
+            lines.insert(0, f"(更早的 {self.dropped} 次迭代已省略)")
+        files = self._files_text()
+        if files:
+            lines.append(files)
+        return "\n".join(lines)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.render())
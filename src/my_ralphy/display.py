@@ -1,14 +1,27 @@
 """Rich 显示模块"""
 
-from typing import Optional
-
+import os
+import shlex
+import subprocess
+from contextlib import contextmanager
+from statistics import median
+from typing import Iterator, Optional
+
+from rich.cells import cell_len, set_cell_size
 from rich.console import Console
+from rich.markup import escape
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn, TimeElapsedColumn
 from rich.table import Table
 from rich.text import Text
 
-from .models import Task, TaskResult, TaskStatus
+from .budget import UsageTotals
+from .dedup import Cluster
+from .fanout import RepoSummary
+from .stats import GroupStats
+from .models import FailureKind, Task, TaskResult, TaskStatus
+from .tracing import TraceReport
+from .verifier import VerifyResult
 
 console = Console()
 
@@ -50,6 +63,27 @@ def show_task_retry(task: Task, attempt: int, max_retries: int) -> None:
     console.print(f"[yellow]🔄[/yellow] [{task.id}] 重试 {attempt}/{max_retries}...")
 
 
+def show_task_verifying(task: Task, changed_count: int) -> None:
+    """显示任务进入验收"""
+    console.print(f"[cyan]🔍[/cyan] [{task.id}] 验收中 (修改 {changed_count} 个文件)...")
+
+
+def show_verify_result(task: Task, result: VerifyResult) -> None:
+    """显示验收结果"""
+    for check in result.checks:
+        if check.skipped:
+            console.print(f"[dim]   ⏭️ {check.command} (无相关文件，跳过)[/dim]")
+        elif check.success:
+            console.print(f"[green]   ✔[/green] {check.command} ({check.duration:.1f}s)")
+        else:
+            console.print(f"[red]   ✘[/red] {check.command} ({check.duration:.1f}s)")
+
+    if result.success:
+        console.print(f"[bold green]✅[/bold green] [{task.id}] 验收通过")
+    else:
+        console.print(f"[bold red]❌[/bold red] [{task.id}] 验收失败")
+
+
 def show_task_skipped(task: Task) -> None:
     """显示任务跳过"""
     console.print(f"[dim]⏭️ [{task.id}] 已跳过[/dim]")
@@ -108,15 +142,303 @@ def show_statistics(tasks: list[Task], results: list[TaskResult]) -> None:
     failed = sum(1 for t in tasks if t.status == TaskStatus.FAILED)
     skipped = sum(1 for t in tasks if t.status == TaskStatus.SKIPPED)
     total_time = sum(r.duration for r in results)
+    costs = [r.cost_usd for r in results if r.cost_usd is not None]
+    cost = f" | 费用 ${sum(costs):.4f}" if costs else ""
+    stalled = sum(1 for r in results if r.failure == FailureKind.STALLED)
+    stall = f" (其中停滞 {stalled})" if stalled else ""
 
     console.print()
     console.print(
         f"📊 总计: [green]完成 {completed}[/green] | "
-        f"[red]失败 {failed}[/red] | "
+        f"[red]失败 {failed}{stall}[/red] | "
         f"[dim]跳过 {skipped}[/dim] | "
-        f"耗时 {total_time:.1f}s"
+        f"耗时 {total_time:.1f}s{cost}"
+    )
+
+
+def show_startup_latency(results: list[TaskResult]) -> None:
+    """对比预热会话与冷启动会话的首个输出时间"""
+    warm = [r.first_output_time for r in results if r.warm_start and r.first_output_time is not None]
+    cold = [r.first_output_time for r in results if not r.warm_start and r.first_output_time is not None]
+    if not warm and not cold:
+        return
+
+    parts = []
+    for label, values in (("预热", warm), ("冷启动", cold)):
+        if values:
+            parts.append(f"{label} {len(values)} 次，中位 {median(values):.2f}s")
+    console.print(f"⚡ 首个输出: {' | '.join(parts)}")
+
+
+def show_usage_summary(totals: dict[str, UsageTotals]) -> None:
+    """按标签显示 token 用量与费用"""
+    if not totals:
+        return
+
+    table = Table(title="用量统计", show_header=True, header_style="bold")
+    table.add_column("标签", width=15)
+    table.add_column("执行次数", justify="right")
+    table.add_column("输入 tokens", justify="right")
+    table.add_column("输出 tokens", justify="right")
+    table.add_column("缓存读取", justify="right")
+    table.add_column("轮次", justify="right")
+    table.add_column("费用", justify="right")
+
+    for tag, item in sorted(totals.items(), key=lambda kv: kv[1].cost_usd, reverse=True):
+        table.add_row(
+            tag,
+            str(item.runs),
+            f"{item.input_tokens:,}",
+            f"{item.output_tokens:,}",
+            f"{item.cache_read_tokens:,}",
+            str(item.num_turns),
+            f"${item.cost_usd:.4f}",
+        )
+
+    console.print()
+    console.print(table)
+
+
+def show_duplicate_clusters(clusters: list[Cluster], tasks: dict[str, Task]) -> None:
+    """显示重复任务分组，每组第一行为保留的任务"""
+    table = Table(title="重复任务", show_header=True, header_style="bold")
+    table.add_column("组", justify="right")
+    table.add_column("ID", width=6)
+    table.add_column("标题", width=36)
+    table.add_column("状态", width=12)
+    table.add_column("相似度", justify="right")
+
+    for number, cluster in enumerate(clusters, 1):
+        canonical = tasks[cluster.task_id]
+        table.add_row(str(number), canonical.id, escape(canonical.title[:34]), str(canonical.status), "[bold]保留[/bold]")
+        for match in cluster.duplicates:
+            task = tasks[match.task_id]
+            similarity = "完全重复" if match.exact else f"{match.similarity:.2f}"
+            table.add_row("", task.id, escape(task.title[:34]), str(task.status), similarity, style="dim")
+
+    console.print(table)
+    duplicates = sum(len(c.duplicates) for c in clusters)
+    console.print(f"[dim]{len(clusters)} 组，{duplicates} 个重复任务[/dim]")
+
+
+_STATUS_LABELS = {
+    TaskStatus.TODO.value: "[dim]📋 待办[/dim]",
+    TaskStatus.IN_PROGRESS.value: "[yellow]⏳ 进行中[/yellow]",
+    TaskStatus.COMPLETED.value: "[green]✅ 完成[/green]",
+    TaskStatus.FAILED.value: "[red]❌ 失败[/red]",
+    TaskStatus.SKIPPED.value: "[dim]⏭️ 跳过[/dim]",
+}
+
+
+class TaskListPrinter:
+    """逐行输出任务列表
+
+    列宽固定，不需要先收集全部行再计算布局；每凑够 ``batch`` 行输出一次，
+    第一批在读完整个任务文件之前就能显示。
+    """
+
+    COLUMNS = (("ID", 6), ("标题", 30), ("状态", 10), ("优先级", 6), ("标签", 15))
+
+    def __init__(self, out: Optional[Console] = None, batch: int = 200):
+        self.out = out or console
+        self.batch = batch
+        self.count = 0
+        self._pending: list[Text] = []
+        self._labels: dict[str, Text] = {}
+
+    @staticmethod
+    def _cell(text: str, width: int) -> str:
+        """截断并填充到固定显示宽度 (中文按两列计算)"""
+        if cell_len(text) > width:
+            return set_cell_size(text, width - 1) + "…"
+        return set_cell_size(text, width)
+
+    def _label(self, status: str) -> Text:
+        label = self._labels.get(status)
+        if label is None:
+            markup = _STATUS_LABELS.get(status)
+            label = Text.from_markup(markup) if markup else Text(status)
+            label.truncate(self.COLUMNS[2][1], overflow="ellipsis", pad=True)
+            self._labels[status] = label
+        return label
+
+    def header(self) -> None:
+        names = "  ".join(self._cell(name, width) for name, width in self.COLUMNS)
+        width = sum(w for _, w in self.COLUMNS) + 2 * (len(self.COLUMNS) - 1)
+        self.out.print(Text(names.rstrip(), style="bold"), soft_wrap=True)
+        self.out.print(Text("─" * width, style="dim"), soft_wrap=True)
+
+    def row(self, item: dict) -> None:
+        """加入一个任务 (任务文件中的原始条目)"""
+        if not self.count:
+            self.header()
+        (_, id_width), (_, title_width), _, (_, priority_width), (_, tags_width) = self.COLUMNS
+        line = Text.assemble(
+            self._cell(str(item.get("id", "")), id_width), "  ",
+            self._cell(str(item.get("title", "")), title_width), "  ",
+            self._label(item.get("status") or TaskStatus.TODO.value), "  ",
+            self._cell(str(item.get("priority") or 0), priority_width), "  ",
+            self._cell(", ".join(item.get("tags") or ()), tags_width).rstrip(),
+        )
+        self._pending.append(line)
+        self.count += 1
+        if len(self._pending) >= self.batch:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self.out.print(Text("\n").join(self._pending), soft_wrap=True)
+            self._pending = []
+
+
+@contextmanager
+def pager_console() -> Iterator[Console]:
+    """边生成边写入分页器 ($PAGER，默认 less -R)；stdout 不是终端时直接输出"""
+    if not console.is_terminal:
+        yield console
+        return
+    try:
+        proc = subprocess.Popen(shlex.split(os.environ.get("PAGER") or "less -R"), stdin=subprocess.PIPE, text=True, encoding="utf-8")
+    except OSError:
+        yield console
+        return
+    try:
+        yield Console(file=proc.stdin, force_terminal=True, width=console.width)
+    except BrokenPipeError:
+        # 分页器提前退出
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.wait()
+
+
+def show_stats_table(groups: list[GroupStats], by: str, title: str) -> None:
+    """显示分组统计"""
+    labels = {"tag": "标签", "task": "任务", "failure": "失败类型", "repo": "仓库", "day": "日期", "week": "周", "all": ""}
+    table = Table(title=title, show_header=True, header_style="bold")
+    table.add_column(labels.get(by, by) or "分组", no_wrap=True, min_width=10)
+    for name in ("次数", "成功率", "失败", "p50", "p95", "重试成功", "费用"):
+        table.add_column(name, justify="right", no_wrap=True)
+
+    for group in groups:
+        rate = 1 - group.failure_rate
+        color = "green" if rate >= 0.9 else "yellow" if rate >= 0.5 else "red"
+        retry_rate = group.retry_success_rate
+        table.add_row(
+            escape(group.key),
+            str(group.runs),
+            f"[{color}]{rate:.0%}[/{color}]",
+            str(group.failures) if group.failures else "[dim]0[/dim]",
+            f"{group.percentile(50):.1f}s",
+            f"{group.percentile(95):.1f}s",
+            f"{retry_rate:.0%}" if retry_rate is not None else "[dim]-[/dim]",
+            (f"${group.cost:.2f}" if group.cost < 1000 else f"${group.cost:,.0f}") if group.cost else "[dim]-[/dim]",
+        )
+
+    console.print(table)
+
+
+def show_repo_summary(summary: dict[str, RepoSummary]) -> None:
+    """按仓库显示多仓库任务的状态、耗时与费用"""
+    if not summary:
+        return
+
+    table = Table(title="按仓库", show_header=True, header_style="bold")
+    table.add_column("仓库")
+    table.add_column("完成", justify="right", style="green")
+    table.add_column("失败", justify="right", style="red")
+    table.add_column("跳过", justify="right", style="dim")
+    table.add_column("待办", justify="right")
+    table.add_column("执行次数", justify="right")
+    table.add_column("耗时", justify="right")
+    table.add_column("费用", justify="right")
+
+    for repo, item in sorted(summary.items()):
+        table.add_row(
+            escape(repo),
+            str(item.completed),
+            str(item.failed),
+            str(item.skipped),
+            str(item.todo),
+            str(item.runs),
+            f"{item.duration:.1f}s",
+            f"${item.cost_usd:.4f}" if item.cost_usd is not None else "-",
+        )
+
+    console.print()
+    console.print(table)
+
+
+def show_trace_report(report: TraceReport, top: int = 10) -> None:
+    """显示会话时间分布：按工具、按标签以及最慢的工具调用"""
+    total = report.duration or 1.0
+    other = max(0.0, report.duration - report.model_time - report.tool_time)
+    console.print(
+        f"\n⏱️ {report.sessions} 次会话，总耗时 {report.duration:.1f}s | "
+        f"模型 {report.model_time:.1f}s ({report.model_time / total:.0%}) | "
+        f"工具 {report.tool_time:.1f}s ({report.tool_time / total:.0%}) | "
+        f"其他 {other:.1f}s"
     )
 
+    table = Table(title="按工具", show_header=True, header_style="bold")
+    table.add_column("工具", width=16)
+    table.add_column("调用", justify="right")
+    table.add_column("总耗时", justify="right")
+    table.add_column("占比", justify="right")
+    table.add_column("平均", justify="right")
+    table.add_column("最长", justify="right")
+    table.add_column("失败", justify="right")
+    table.add_column("输出", justify="right")
+    for name, stats in sorted(report.tools.items(), key=lambda kv: kv[1].total, reverse=True):
+        table.add_row(
+            name,
+            str(stats.count),
+            f"{stats.total:.1f}s",
+            f"{stats.total / total:.0%}",
+            f"{stats.total / stats.count:.1f}s",
+            f"{stats.max:.1f}s",
+            str(stats.errors),
+            f"{stats.out_bytes / 1024:.0f}KB",
+        )
+    console.print()
+    console.print(table)
+
+    if report.by_tag:
+        # 每个标签显示耗时最多的几项 (模型时间记为 model)
+        table = Table(title="按标签", show_header=True, header_style="bold")
+        table.add_column("标签", width=15)
+        table.add_column("总耗时", justify="right")
+        table.add_column("主要耗时")
+        for tag, times in sorted(report.by_tag.items(), key=lambda kv: sum(kv[1].values()), reverse=True):
+            tag_total = sum(times.values()) or 1.0
+            parts = sorted(times.items(), key=lambda kv: kv[1], reverse=True)[:4]
+            table.add_row(
+                tag,
+                f"{sum(times.values()):.1f}s",
+                ", ".join(f"{name} {seconds / tag_total:.0%}" for name, seconds in parts),
+            )
+        console.print()
+        console.print(table)
+
+    if report.slowest:
+        table = Table(title=f"最慢的 {len(report.slowest)} 次工具调用", show_header=True, header_style="bold")
+        table.add_column("任务", width=8)
+        table.add_column("工具", width=12)
+        table.add_column("耗时", justify="right")
+        table.add_column("参数")
+        for record, span in report.slowest[:top]:
+            table.add_row(
+                record.task_id,
+                span.name,
+                f"{span.duration:.1f}s",
+                escape(span.detail) + (" [red](失败)[/red]" if span.error else ""),
+            )
+        console.print()
+        console.print(table)
+
 
 def show_error(message: str) -> None:
     """显示错误信息"""
@@ -0,0 +1,573 @@
+"""分布式执行：协调器与远程 worker
+
+单机能同时运行的 claude 会话有限。``ralphy coordinator`` 持有任务存储并
+通过 TCP 分发任务，``ralphy worker --connect host:port`` 在其他机器 (或同一
+机器的其他进程) 上拉取任务、用 ``ClaudeExecutor`` 执行并把结果传回。
+
+协议为双向的 JSON 行，每个 worker 一条长连接：
+
+- worker → 协调器: ``hello`` (名称、并发槽位数)、``auth``、``heartbeat``、``result``
+- 协调器 → worker: ``challenge``、``welcome`` (心跳间隔)、``task``、``ping``、``shutdown``、``error``
+
+协调器设置了共享令牌 (``--token`` 或 ``RALPHY_TOKEN``) 时，收到 ``hello`` 后发送
+随机 ``challenge``，worker 回复以令牌为密钥的 HMAC-SHA256，校验通过才发送
+``welcome``；令牌本身不在网络上传输。监听非回环地址时必须设置令牌。
+连接本身不加密，跨不可信网络时应通过 SSH 隧道或 VPN。
+
+每次分配带有租约编号。协调器为每个 worker 最多保留与其槽位数相同的租约
+(基于额度的背压，任务不会在 worker 端排队)；超过 3 个心跳间隔没有消息或
+连接断开的 worker 视为丢失，其租约上的任务立即重新分配，之后到达的旧租约
+结果被忽略。worker 在连接断开时终止正在运行的会话并尝试重连。
+
+pause 策略按 skip 处理；任务验收和多仓库展开只在 ``ralphy run`` 中支持。
+"""
+
+import hashlib
+import hmac
+import ipaddress
+import itertools
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .executor import ClaudeExecutor
+from .logger import get_logger, log_context
+from .models import ErrorHandling, RunConfig, Task, TaskResult, TaskStatus
+from .scheduler import DurationModel, Scheduler, make_scheduler
+from .stats import record_run
+from .task_manager import TaskManager
+
+DEFAULT_PORT = 7654
+HEARTBEAT_INTERVAL = 5.0
+# 连续多少个心跳间隔没有消息视为连接丢失
+HEARTBEAT_MISSES = 3
+# 共享令牌的环境变量
+TOKEN_ENV = "RALPHY_TOKEN"
+
+
+class AuthError(ConnectionError):
+    """worker 与协调器的令牌认证失败"""
+
+
+def is_loopback(host: str) -> bool:
+    """地址是否只在本机可达 (主机名按解析结果判断)"""
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    if not host:
+        return False
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except OSError:
+        return False
+    return bool(infos) and all(ipaddress.ip_address(info[4][0]).is_loopback for info in infos)
+
+
+def _sign(token: str, nonce: str) -> str:
+    return hmac.new(token.encode("utf-8"), nonce.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def parse_address(address: str, default_port: int = DEFAULT_PORT) -> tuple[str, int]:
+    """解析 host:port (省略端口时使用默认端口)"""
+    host, sep, port = address.rpartition(":")
+    if not sep:
+        return address, default_port
+    if not port.isdigit():
+        raise ValueError(f"无效的端口: {address}")
+    return host or "127.0.0.1", int(port)
+
+
+class Connection:
+    """JSON 行消息连接，发送端加锁以便多个线程共用"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.rfile = sock.makefile("rb")
+        self._send_lock = threading.Lock()
+
+    def send(self, message: dict) -> None:
+        data = (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def receive(self) -> Optional[dict]:
+        """读取一条消息，连接关闭时返回 None"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.rfile.close()
+        self.sock.close()
+
+
+# ----------------------------------------------------------------------
+# 协调器
+# ----------------------------------------------------------------------
+
+@dataclass
+class WorkerInfo:
+    """已连接的 worker"""
+    id: str
+    name: str
+    slots: int
+    conn: Connection
+    last_seen: float = field(default_factory=time.monotonic)
+    leases: set[int] = field(default_factory=set)
+    completed: int = 0
+
+
+@dataclass
+class Lease:
+    """一次任务分配"""
+    id: int
+    task: Task
+    worker: str
+    started: float = field(default_factory=time.time)
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """每个 worker 连接一个线程"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], handler, coordinator: "Coordinator"):
+        self.coordinator = coordinator
+        super().__init__(address, handler)
+
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    """处理一个 worker 连接"""
+
+    server: _TCPServer
+
+    def handle(self) -> None:
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = Connection(self.request)
+        self.server.coordinator.serve_worker(conn, self.client_address)
+
+
+class Coordinator:
+    """持有任务存储，按调度策略把任务分配给远程 worker"""
+
+    def __init__(self, config: RunConfig, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 heartbeat: float = HEARTBEAT_INTERVAL, token: Optional[str] = None):
+        if not token and not is_loopback(host):
+            raise ValueError(f"监听非回环地址 {host} 时必须设置共享令牌 (--token 或 {TOKEN_ENV})")
+        self.config = config
+        self.host = host
+        self.port = port
+        self.heartbeat = heartbeat
+        self.token = token
+        self.logger = get_logger()
+        self.task_manager = TaskManager(task_file=config.task_file, results_file="ralph_results.json")
+        self.scheduler: Optional[Scheduler] = None
+        self.retry_queue: deque[Task] = deque()
+        self.workers: dict[str, WorkerInfo] = {}
+        self.leases: dict[int, Lease] = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.server: Optional[_TCPServer] = None
+        self._retry_counts: dict[str, int] = {}
+        self._lease_ids = itertools.count(1)
+        self._worker_ids = itertools.count(1)
+        self._run_results_start = 0
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """实际监听的地址 (端口为 0 时由系统分配)"""
+        return self.server.server_address[:2] if self.server else (self.host, self.port)
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self) -> int:
+        """加载任务、开始监听，返回待执行任务数"""
+        tasks = self.task_manager.load_tasks()
+        pending = self.task_manager.get_pending_tasks()
+        history = self.task_manager.load_results()
+        self._run_results_start = len(history)
+
+        self.scheduler = make_scheduler(
+            self.config.schedule,
+            model=DurationModel.from_results(history, tasks),
+            tag_weights=self.config.tag_weights,
+            tag_caps=self.config.tag_caps,
+            aging_rate=self.config.aging_rate,
+        )
+        now = time.time()
+        for task in pending:
+            self.scheduler.push(task, now)
+        if not pending:
+            self.done.set()
+
+        self.server = _TCPServer((self.host, self.port), _WorkerHandler, self)
+        threading.Thread(target=self.server.serve_forever, name="ralphy-coordinator", daemon=True).start()
+        threading.Thread(target=self._monitor, name="ralphy-heartbeat", daemon=True).start()
+        return len(pending)
+
+    def wait(self) -> None:
+        """阻塞直到所有任务结束"""
+        while not self.done.wait(0.5):
+            pass
+
+    def stop(self) -> None:
+        """通知 worker 退出并停止监听；未完成的任务恢复为待办"""
+        self.done.set()
+        with self.lock:
+            workers = list(self.workers.values())
+            leased = [lease.task for lease in self.leases.values()]
+            self.leases.clear()
+            for task in leased:
+                self.task_manager.update_task_status(task.id, TaskStatus.TODO)
+        for worker in workers:
+            try:
+                worker.conn.send({"type": "shutdown"})
+                # 只关闭写端：直接关闭连接时未读的心跳会触发 RST，worker 可能收不到 shutdown
+                worker.conn.sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                worker.conn.close()
+
+        # 等待 worker 读取 shutdown 后断开
+        deadline = time.monotonic() + self.heartbeat
+        while time.monotonic() < deadline:
+            with self.lock:
+                if not self.workers:
+                    break
+            time.sleep(0.05)
+        for worker in workers:
+            worker.conn.close()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def run_results(self) -> list[TaskResult]:
+        return self.task_manager.results[self._run_results_start:]
+
+    def record_stats(self) -> None:
+        """把本次运行的结果追加到统计存储"""
+        try:
+            record_run(self.config.task_file, self.task_manager.results, self._run_results_start, self.task_manager.tasks)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"写入统计存储失败: {e}")
+
+    # ------------------------------------------------------------------
+    # worker 连接
+    # ------------------------------------------------------------------
+
+    def serve_worker(self, conn: Connection, client_address) -> None:
+        """处理一个 worker 连接直到断开"""
+        conn.sock.settimeout(self.heartbeat * HEARTBEAT_MISSES)
+        try:
+            hello = conn.receive()
+        except (OSError, ValueError):
+            conn.close()
+            return
+        if not hello or hello.get("type") != "hello":
+            conn.close()
+            return
+        if self.token and not self._authenticate(conn):
+            self.logger.warning(f"来自 {client_address[0]}:{client_address[1]} 的 worker 认证失败")
+            try:
+                conn.send({"type": "error", "error": "认证失败"})
+            except OSError:
+                pass
+            conn.close()
+            return
+
+        worker = WorkerInfo(
+            id=f"w{next(self._worker_ids)}",
+            name=str(hello.get("worker") or f"{client_address[0]}:{client_address[1]}"),
+            slots=max(1, int(hello.get("slots") or 1)),
+            conn=conn,
+        )
+        try:
+            conn.send({"type": "welcome", "worker_id": worker.id, "heartbeat": self.heartbeat})
+        except OSError:
+            conn.close()
+            return
+
+        with self.lock:
+            self.workers[worker.id] = worker
+        self.logger.info(f"worker {worker.id} ({worker.name}) 已连接，槽位 {worker.slots}")
+        self._dispatch()
+
+        try:
+            while True:
+                message = conn.receive()
+                if message is None:
+                    break
+                worker.last_seen = time.monotonic()
+                if message.get("type") == "result":
+                    self._on_result(worker, int(message["lease"]), TaskResult(**message["result"]))
+        except (OSError, ValueError) as e:
+            if not self.done.is_set():
+                self.logger.warning(f"worker {worker.id} 连接异常: {e}")
+        finally:
+            self._drop_worker(worker)
+
+    def _authenticate(self, conn: Connection) -> bool:
+        """挑战-应答认证：worker 需用共享令牌对随机数签名"""
+        nonce = secrets.token_hex(16)
+        try:
+            conn.send({"type": "challenge", "nonce": nonce})
+            reply = conn.receive()
+        except (OSError, ValueError):
+            return False
+        if not reply or reply.get("type") != "auth":
+            return False
+        return hmac.compare_digest(str(reply.get("mac") or ""), _sign(self.token, nonce))
+
+    def _drop_worker(self, worker: WorkerInfo) -> None:
+        """移除 worker，其租约上的任务重新分配"""
+        with self.lock:
+            if self.workers.pop(worker.id, None) is None:
+                return
+            lost = [self.leases.pop(lease_id) for lease_id in list(worker.leases) if lease_id in self.leases]
+            now = time.time()
+            for lease in lost:
+                self.scheduler.on_finish(lease.task, now - lease.started)
+                # 不计入重试次数，优先于新任务重新分配
+                self.retry_queue.appendleft(lease.task)
+        worker.conn.close()
+
+        if not self.done.is_set():
+            requeued = f"，{len(lost)} 个任务重新分配" if lost else ""
+            self.logger.warning(f"worker {worker.id} ({worker.name}) 已断开{requeued}")
+            self._dispatch()
+
+    def _monitor(self) -> None:
+        """定期向 worker 发送心跳，并清理超时未响应的 worker"""
+        while not self.done.wait(self.heartbeat):
+            deadline = time.monotonic() - self.heartbeat * HEARTBEAT_MISSES
+            with self.lock:
+                workers = list(self.workers.values())
+            for worker in workers:
+                if worker.last_seen < deadline:
+                    self.logger.warning(f"worker {worker.id} 心跳超时")
+                    # 关闭连接使读取线程退出并清理租约
+                    worker.conn.close()
+                    continue
+                try:
+                    worker.conn.send({"type": "ping"})
+                except OSError:
+                    worker.conn.close()
+
+    # ------------------------------------------------------------------
+    # 分配与结果
+    # ------------------------------------------------------------------
+
+    def _next_task(self) -> Optional[Task]:
+        if self.retry_queue:
+            return self.retry_queue.popleft()
+        return self.scheduler.pop(time.time())
+
+    def _dispatch(self) -> None:
+        """为有空闲槽位的 worker 分配任务 (发送在锁外进行)"""
+        assignments: list[tuple[WorkerInfo, Lease]] = []
+        with self.lock:
+            while True:
+                # 每次分配给空闲槽位最多的 worker，任务在 worker 间均匀分布
+                free = [w for w in self.workers.values() if len(w.leases) < w.slots]
+                if not free:
+                    break
+                task = self._next_task()
+                if task is None:
+                    break
+                worker = max(free, key=lambda w: w.slots - len(w.leases))
+                lease = Lease(id=next(self._lease_ids), task=task, worker=worker.id)
+                self.leases[lease.id] = lease
+                worker.leases.add(lease.id)
+                self.scheduler.on_start(task)
+                self.task_manager.update_task_status(task.id, TaskStatus.IN_PROGRESS)
+                assignments.append((worker, lease))
+
+        for worker, lease in assignments:
+            self.logger.info(f"任务 {lease.task.id} 分配给 worker {worker.id}")
+            try:
+                worker.conn.send({
+                    "type": "task",
+                    "lease": lease.id,
+                    "task": lease.task.model_dump(mode="json"),
+                })
+            except OSError:
+                # 读取线程会发现断开并重新分配
+                worker.conn.close()
+
+    def _on_result(self, worker: WorkerInfo, lease_id: int, result: TaskResult) -> None:
+        """记录执行结果，失败时按错误处理策略重试"""
+        with self.lock:
+            lease = self.leases.get(lease_id)
+            if lease is None or lease.worker != worker.id:
+                self.logger.debug(f"忽略过期租约 {lease_id} 的结果")
+                return
+            del self.leases[lease_id]
+            worker.leases.discard(lease_id)
+            worker.completed += 1
+            task = lease.task
+            self.scheduler.on_finish(task, result.duration)
+
+            retry_count = self._retry_counts.get(task.id, 0)
+            result.retry_count = retry_count
+            max_retries = self.config.max_retries if self.config.on_error == ErrorHandling.RETRY else 0
+            if not result.success and retry_count < max_retries:
+                self._retry_counts[task.id] = retry_count + 1
+                self.retry_queue.append(task)
+                status = None
+            else:
+                status = TaskStatus.COMPLETED if result.success else TaskStatus.FAILED
+                self.task_manager.update_task_status(task.id, status)
+                self.task_manager.add_result(result)
+
+            finished = not self.leases and not self.retry_queue and not self.scheduler
+
+        if status is None:
+            self.logger.warning(f"任务 {task.id} 在 worker {worker.id} 上失败，重试 {retry_count + 1}/{max_retries}")
+        elif result.success:
+            self.logger.info(f"任务 {task.id} 完成 (worker {worker.id}，{result.duration:.1f}s)")
+        else:
+            self.logger.warning(f"任务 {task.id} 失败 (worker {worker.id}): {result.error or '未知错误'}")
+
+        if finished:
+            self.done.set()
+        else:
+            self._dispatch()
+
+    def status(self) -> dict:
+        """worker 与租约概况"""
+        with self.lock:
+            return {
+                "workers": [
+                    {"id": w.id, "name": w.name, "slots": w.slots, "running": len(w.leases), "completed": w.completed}
+                    for w in self.workers.values()
+                ],
+                "queued": len(self.scheduler) + len(self.retry_queue),
+                "running": len(self.leases),
+            }
+
+
+# ----------------------------------------------------------------------
+# worker
+# ----------------------------------------------------------------------
+
+class RemoteWorker:
+    """连接协调器，拉取任务并在本地执行"""
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        executor: ClaudeExecutor,
+        slots: int = 1,
+        name: Optional[str] = None,
+        reconnect: float = 60.0,
+        token: Optional[str] = None,
+    ):
+        self.address = address
+        self.token = token
+        self.executor = executor
+        self.slots = max(1, slots)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.reconnect = reconnect
+        self.logger = get_logger()
+        self.pool = ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix="ralphy-remote")
+        self.completed = 0
+
+    def run(self) -> None:
+        """运行直到协调器通知退出；连接断开后在 reconnect 秒内重试"""
+        lost_at: Optional[float] = None
+        try:
+            while True:
+                try:
+                    sock = socket.create_connection(self.address, timeout=10)
+                except OSError as e:
+                    if lost_at is None:
+                        lost_at = time.monotonic()
+                    if time.monotonic() - lost_at > self.reconnect:
+                        raise ConnectionError(f"无法连接协调器 {self.address[0]}:{self.address[1]}: {e}")
+                    time.sleep(1.0)
+                    continue
+
+                lost_at = None
+                if self._session(Connection(sock)):
+                    return
+                lost_at = time.monotonic()
+                self.logger.warning("与协调器的连接已断开，正在重连")
+        finally:
+            self.executor.cancel_all()
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _session(self, conn: Connection) -> bool:
+        """一次连接的生命周期，收到 shutdown 时返回 True"""
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        stop = threading.Event()
+        try:
+            conn.send({"type": "hello", "worker": self.name, "slots": self.slots})
+            welcome = conn.receive()
+            if welcome and welcome.get("type") == "challenge":
+                if not self.token:
+                    raise AuthError(f"协调器要求认证，请设置共享令牌 (--token 或 {TOKEN_ENV})")
+                conn.send({"type": "auth", "mac": _sign(self.token, str(welcome.get("nonce") or ""))})
+                welcome = conn.receive()
+            if welcome and welcome.get("type") == "error":
+                raise AuthError(f"协调器拒绝连接: {welcome.get('error')}")
+            if not welcome or welcome.get("type") != "welcome":
+                return False
+            interval = float(welcome.get("heartbeat") or HEARTBEAT_INTERVAL)
+            conn.sock.settimeout(interval * HEARTBEAT_MISSES)
+            self.logger.info(f"已连接协调器，worker ID {welcome.get('worker_id')}，槽位 {self.slots}")
+
+            threading.Thread(target=self._heartbeat, args=(conn, interval, stop), daemon=True).start()
+
+            while True:
+                message = conn.receive()
+                if message is None:
+                    return False
+                kind = message.get("type")
+                if kind == "task":
+                    self.pool.submit(self._run, conn, int(message["lease"]), Task(**message["task"]))
+                elif kind == "shutdown":
+                    self.logger.info(f"协调器已结束，本 worker 完成 {self.completed} 个任务")
+                    return True
+        except AuthError:
+            # 令牌错误时重连没有意义
+            raise
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"连接异常: {e}")
+            return False
+        finally:
+            stop.set()
+            conn.close()
+            # 协调器会重新分配这些任务，不再等待其结果
+            self.executor.cancel_all()
+
+    def _heartbeat(self, conn: Connection, interval: float, stop: threading.Event) -> None:
+        while not stop.wait(interval):
+            try:
+                conn.send({"type": "heartbeat"})
+            except OSError:
+                return
+
+    def _run(self, conn: Connection, lease: int, task: Task) -> None:
+        with log_context(task_id=task.id, worker=self.name):
+            result = self.executor.run_task(task)
+        self.completed += 1
+        try:
+            conn.send({"type": "result", "lease": lease, "result": result.model_dump(mode="json")})
+        except OSError:
+            self.logger.warning(f"任务 {task.id} 的结果未能送达，协调器将重新分配")
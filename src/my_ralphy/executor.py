@@ -1,14 +1,20 @@
 """Claude Code 执行器"""
 
-import subprocess
+import threading
 import time
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-from .logger import get_logger
-from .models import Task, TaskResult
+from .claude_output import OutputParser, Usage
+from .context_index import RepoIndex
+from .logger import get_logger, get_run_id
+from .models import FailureKind, RunConfig, Task, TaskResult
+from .process import ChildProcess, ResourceLimits
+from .progress import ProgressMonitor
+from .tracing import Trace, TraceStore, TracingParser
+from .warm_pool import WarmPool
 
 
 @dataclass
@@ -18,6 +24,13 @@ class ExecuteResult:
     output: str
     error: Optional[str] = None
     duration: float = 0.0
+    peak_rss_mb: Optional[float] = None
+    cpu_time: Optional[float] = None
+    usage: Optional[Usage] = None
+    trace: Optional[Trace] = None
+    failure: Optional[FailureKind] = None
+    first_output: Optional[float] = None
+    warm: Optional[bool] = None
 
 
 class ClaudeExecutor:
@@ -28,14 +41,123 @@ class ClaudeExecutor:
         working_dir: Optional[Path] = None,
         timeout: int = 300,
         skip_permissions: bool = False,
+        limits: Optional[ResourceLimits] = None,
+        context_index: Optional[RepoIndex] = None,
+        context_files: int = 8,
+        trace_store: Optional[TraceStore] = None,
+        stall_timeout: Optional[float] = None,
+        stall_ignore: Optional[list[str]] = None,
+        warm_pool: Optional[WarmPool] = None,
     ):
         self.working_dir = working_dir or Path.cwd()
         self.timeout = timeout
         self.skip_permissions = skip_permissions
+        self.limits = limits or ResourceLimits()
+        self.context_index = context_index
+        self.context_files = context_files
+        self.trace_store = trace_store
+        # 无进展超过 stall_timeout 秒的会话提前终止；stall_ignore 为 ralphy 自身写入的文件
+        self.stall_timeout = stall_timeout
+        self.stall_ignore = stall_ignore or []
+        # 预热池：提示改为通过 stdin 传入，会话可以提前启动
+        self.warm_pool = warm_pool
         self.logger = get_logger()
+        # 多仓库任务按工作目录分别建立仓库索引
+        self._indexes: dict[Path, RepoIndex] = {}
+        self._indexes_lock = threading.Lock()
+        # 正在运行的子进程，供中断时统一终止
+        self._active: set[ChildProcess] = set()
+        self._active_lock = threading.Lock()
 
-    def build_prompt(self, task: Task) -> str:
-        """构建任务提示"""
+    @classmethod
+    def from_config(cls, config: RunConfig) -> "ClaudeExecutor":
+        """根据运行配置创建执行器"""
+        limits = ResourceLimits(
+            cpu_seconds=config.cpu_limit,
+            memory_mb=config.memory_limit_mb,
+            max_open_files=config.max_open_files,
+            use_cgroup=config.use_cgroup,
+        )
+        return cls(
+            working_dir=Path(config.working_dir),
+            timeout=config.timeout,
+            skip_permissions=config.skip_permissions,
+            limits=limits,
+            context_index=RepoIndex(Path(config.working_dir)) if config.context else None,
+            context_files=config.context_files,
+            trace_store=TraceStore(Path(config.trace_file)) if config.trace else None,
+            stall_timeout=config.stall_timeout,
+            stall_ignore=[config.task_file, "ralph_results.json", "ralph.log", config.trace_file],
+            warm_pool=WarmPool(config.warm_pool, ttl=config.warm_ttl, limits=limits) if config.warm_pool > 0 else None,
+        )
+
+    def clone(self) -> "ClaudeExecutor":
+        """创建共享配置、仓库索引和追踪文件的副本，cancel_all 只影响副本自身的会话"""
+        clone = ClaudeExecutor(
+            working_dir=self.working_dir,
+            timeout=self.timeout,
+            skip_permissions=self.skip_permissions,
+            limits=self.limits,
+            context_index=self.context_index,
+            context_files=self.context_files,
+            trace_store=self.trace_store,
+            stall_timeout=self.stall_timeout,
+            stall_ignore=self.stall_ignore,
+            warm_pool=self.warm_pool,
+        )
+        clone._indexes = self._indexes
+        clone._indexes_lock = self._indexes_lock
+        return clone
+
+    def _command(self) -> list[str]:
+        """不含提示的 claude 命令行"""
+        # 追踪、检测停滞或使用预热池时逐事件输出 (stream-json 需要同时指定 --verbose)：
+        # json 格式在会话结束前没有任何输出，无法作为进展信号，也无法测量首个输出时间
+        streaming = self.trace_store is not None or self.stall_timeout is not None or self.warm_pool is not None
+        cmd = ["claude", "--print", "--output-format", "stream-json" if streaming else "json"]
+        if streaming:
+            cmd.append("--verbose")
+        if self.skip_permissions:
+            cmd.append("--dangerously-skip-permissions")
+        return cmd
+
+    def prewarm(self, working_dir: Optional[Path] = None) -> None:
+        """在预热池中提前启动会话 (未开启预热池时不做任何事)"""
+        if self.warm_pool is not None:
+            self.warm_pool.prewarm(self._command(), working_dir or self.working_dir)
+
+    def close(self) -> None:
+        """释放预热池中的空闲会话 (副本共享预热池，由创建者调用)"""
+        if self.warm_pool is not None:
+            self.warm_pool.close()
+
+    def _index_for(self, working_dir: Optional[Path]) -> Optional[RepoIndex]:
+        """工作目录对应的仓库索引，未开启上下文时返回 None"""
+        if self.context_index is None or working_dir is None:
+            return self.context_index
+        root = Path(working_dir).resolve()
+        if root == self.context_index.root:
+            return self.context_index
+        with self._indexes_lock:
+            if root not in self._indexes:
+                self._indexes[root] = RepoIndex(root)
+            return self._indexes[root]
+
+    def build_prompt(
+        self,
+        task: Task,
+        feedback: Optional[str] = None,
+        working_dir: Optional[Path] = None,
+        history: Optional[str] = None,
+    ) -> str:
+        """构建任务提示
+
+        Args:
+            task: 任务
+            feedback: 上一次尝试的验收失败输出，附加到提示末尾
+            working_dir: 本次执行的工作目录 (默认为执行器的工作目录)
+            history: 之前迭代的摘要 (持续模式)
+        """
         parts = [f"任务: {task.title}"]
 
         if task.description:
@@ -44,63 +166,222 @@ class ClaudeExecutor:
         if task.acceptance:
             parts.append(f"\n验收标准: {task.acceptance}")
 
+        context = self._build_context(task, working_dir)
+        if context:
+            parts.append(f"\n相关文件 (根据仓库索引预选，仅供参考):\n{context}")
+
+        if history:
+            parts.append(f"\n之前的迭代 (摘要，避免重复已完成的工作):\n{history}")
+
+        if feedback:
+            parts.append(f"\n上一次尝试未通过验收，请修复以下问题:\n{feedback}")
+
         return "\n".join(parts)
 
-    def execute(self, prompt: str) -> ExecuteResult:
-        """执行 Claude Code 命令"""
-        cmd = ["claude", "--print"]
+    def _build_context(self, task: Task, working_dir: Optional[Path] = None) -> str:
+        """从仓库索引中选出与任务相关的文件指引"""
+        index = self._index_for(working_dir)
+        if index is None:
+            return ""
 
-        if self.skip_permissions:
-            cmd.append("--dangerously-skip-permissions")
+        try:
+            index.refresh()
+            matches = index.query(
+                " ".join([task.title, task.description, task.acceptance, " ".join(task.tags)]),
+                limit=self.context_files,
+            )
+        except Exception as e:
+            self.logger.warning(f"仓库索引不可用: {e}")
+            return ""
+
+        lines = []
+        for entry, _ in matches:
+            lines.append(f"- {entry.path}: {entry.summary}" if entry.summary else f"- {entry.path}")
+        return "\n".join(lines)
 
-        cmd.append(prompt)
+    def execute(self, prompt: str, working_dir: Optional[Path] = None) -> ExecuteResult:
+        """执行 Claude Code 命令
 
-        self.logger.info(f"执行命令: claude --print ...")
+        Args:
+            prompt: 提示
+            working_dir: 本次执行的工作目录 (默认为执行器的工作目录)
+        """
+        tracing = self.trace_store is not None
+        pooled = self.warm_pool is not None
+        cmd = self._command()
+        output_format = cmd[3]
+        streaming = output_format == "stream-json"
+        if not pooled:
+            cmd.append(prompt)
+
+        self.logger.info(f"执行命令: claude --print --output-format {output_format} ...")
         start_time = time.time()
+        parser = TracingParser() if tracing else OutputParser()
+        cwd = working_dir or self.working_dir
+        monitor: Optional[ProgressMonitor] = None
+        on_stdout = parser.feed
+        if self.stall_timeout is not None:
+            monitor = ProgressMonitor(cwd, self.stall_timeout, ignore=self.stall_ignore)
+
+            def on_stdout(line: str) -> None:
+                monitor.touch()
+                parser.feed(line)
 
+        on_stderr = monitor.touch if monitor else None
+        child = self.warm_pool.acquire(cmd, cwd) if pooled else None
+        warm = child is not None if pooled else None
         try:
-            result = subprocess.run(
-                cmd,
-                cwd=self.working_dir,
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
+            if child is not None:
+                child.attach(on_stdout=on_stdout, on_stderr=on_stderr, capture_stdout=False)
+            else:
+                # stdout 由解析器逐行消费，不再保留原始 JSON
+                child = ChildProcess(
+                    cmd,
+                    cwd=cwd,
+                    limits=self.limits,
+                    on_stdout=on_stdout,
+                    capture_stdout=False,
+                    on_stderr=on_stderr,
+                    stdin_pipe=pooled,
+                )
+            if pooled:
+                child.send_input(prompt)
+        except FileNotFoundError:
+            if pooled:
+                self.warm_pool.release(cmd, cwd)
+            self.logger.error("未找到 claude 命令，请确保 Claude Code 已安装")
+            return ExecuteResult(
+                success=False,
+                output="",
+                error="未找到 claude 命令，请确保 Claude Code 已安装",
+                duration=0.0,
+                failure=FailureKind.ERROR,
             )
+        except Exception as e:
+            if pooled:
+                self.warm_pool.release(cmd, cwd)
+            self.logger.error(f"执行错误: {str(e)}")
+            return ExecuteResult(
+                success=False,
+                output="",
+                error=str(e),
+                duration=time.time() - start_time,
+                failure=FailureKind.ERROR,
+            )
+
+        with self._active_lock:
+            self._active.add(child)
+
+        try:
+            stalled = False
+            if monitor is None:
+                finished = child.wait(self.timeout)
+            else:
+                monitor.cpu_reader = child.cpu_time_live
+                deadline = start_time + self.timeout
+                while True:
+                    remaining = deadline - time.time()
+                    finished = child.wait(max(0.0, min(remaining, monitor.interval)))
+                    if finished or remaining <= monitor.interval:
+                        break
+                    if monitor.check():
+                        stalled = True
+                        break
+            if not finished:
+                # 超时或停滞：终止整个进程组
+                child.kill_tree()
 
             duration = time.time() - start_time
-            output = result.stdout + result.stderr
-            success = result.returncode == 0
+            usage = child.usage()
+            parser.finish()
+            trace = parser.trace if tracing else None
+            # json 格式只在结束时输出，首个输出时间没有意义
+            first_output = child.time_to_first_output if streaming else None
+
+            if stalled:
+                error = f"会话停滞 ({monitor.idle:.0f}s 无输出、文件修改或 CPU 活动)"
+                self.logger.error(f"{error}，已提前终止")
+                return ExecuteResult(
+                    success=False,
+                    output=parser.text,
+                    error=error,
+                    duration=duration,
+                    peak_rss_mb=usage.peak_rss_mb,
+                    cpu_time=usage.cpu_time,
+                    trace=trace,
+                    first_output=first_output,
+                    warm=warm,
+                    failure=FailureKind.STALLED,
+                )
+
+            if not finished:
+                self.logger.error(f"执行超时 ({self.timeout}s)")
+                return ExecuteResult(
+                    success=False,
+                    output=parser.text,
+                    error=f"执行超时 ({self.timeout}s)",
+                    duration=duration,
+                    peak_rss_mb=usage.peak_rss_mb,
+                    cpu_time=usage.cpu_time,
+                    trace=trace,
+                    first_output=first_output,
+                    warm=warm,
+                    failure=FailureKind.TIMEOUT,
+                )
+
+            output = parser.text + child.stderr
+
+            if child.killed:
+                # 被 cancel_all 终止
+                self.logger.warning("执行已取消")
+                return ExecuteResult(
+                    success=False,
+                    output=output,
+                    error="执行已取消",
+                    duration=duration,
+                    peak_rss_mb=usage.peak_rss_mb,
+                    cpu_time=usage.cpu_time,
+                    usage=parser.usage,
+                    trace=trace,
+                    first_output=first_output,
+                    warm=warm,
+                    failure=FailureKind.CANCELLED,
+                )
+
+            success = child.returncode == 0 and not parser.is_error
+            tokens = parser.usage
 
             if success:
-                self.logger.info(f"执行成功，耗时 {duration:.1f}s")
+                cost = f"，费用 ${tokens.cost_usd:.4f}" if tokens and tokens.cost_usd is not None else ""
+                self.logger.info(f"执行成功，耗时 {duration:.1f}s{cost}")
+            elif parser.is_error:
+                self.logger.warning(f"执行失败: {parser.result.get('subtype', 'error')}")
             else:
-                self.logger.warning(f"执行失败，返回码 {result.returncode}")
+                self.logger.warning(f"执行失败，返回码 {child.returncode}")
+
+            error = None
+            if not success:
+                # 进程失败时使用 stderr，会话返回错误时使用结果文本
+                error = (child.stderr if child.returncode != 0 else "") or parser.text or "会话返回错误"
 
             return ExecuteResult(
                 success=success,
                 output=output,
-                error=result.stderr if not success else None,
+                error=error,
                 duration=duration,
+                peak_rss_mb=usage.peak_rss_mb,
+                cpu_time=usage.cpu_time,
+                usage=tokens,
+                trace=trace,
+                first_output=first_output,
+                warm=warm,
+                failure=None if success else FailureKind.ERROR,
             )
 
-        except subprocess.TimeoutExpired:
-            duration = time.time() - start_time
-            self.logger.error(f"执行超时 ({self.timeout}s)")
-            return ExecuteResult(
-                success=False,
-                output="",
-                error=f"执行超时 ({self.timeout}s)",
-                duration=duration,
-            )
-
-        except FileNotFoundError:
-            self.logger.error("未找到 claude 命令，请确保 Claude Code 已安装")
-            return ExecuteResult(
-                success=False,
-                output="",
-                error="未找到 claude 命令，请确保 Claude Code 已安装",
-                duration=0.0,
-            )
+        except KeyboardInterrupt:
+            # Ctrl+C：先清理进程组再向上传递
+            child.kill_tree()
+            raise
 
         except Exception as e:
             duration = time.time() - start_time
@@ -110,18 +391,65 @@ class ClaudeExecutor:
                 output="",
                 error=str(e),
                 duration=duration,
+                failure=FailureKind.ERROR,
             )
 
-    def run_task(self, task: Task) -> TaskResult:
+        finally:
+            with self._active_lock:
+                self._active.discard(child)
+            child.close()
+            if pooled:
+                self.warm_pool.release(cmd, cwd)
+
+    def active_children(self) -> list[ChildProcess]:
+        """正在运行的会话"""
+        with self._active_lock:
+            return list(self._active)
+
+    def cancel_all(self) -> None:
+        """终止所有正在运行的会话 (用于多线程执行时的 Ctrl+C)"""
+        for child in self.active_children():
+            child.kill_tree()
+
+    def run_task(
+        self,
+        task: Task,
+        feedback: Optional[str] = None,
+        working_dir: Optional[Path] = None,
+        history: Optional[str] = None,
+    ) -> TaskResult:
         """执行单个任务并返回结果"""
-        prompt = self.build_prompt(task)
-        result = self.execute(prompt)
+        prompt = self.build_prompt(task, feedback=feedback, working_dir=working_dir, history=history)
+        result = self.execute(prompt, working_dir=working_dir)
+        usage = result.usage
+        trace = result.trace
+        executed_at = datetime.now()
+
+        if trace is not None and self.trace_store is not None:
+            try:
+                self.trace_store.append(task.id, task.tags, executed_at.isoformat(), get_run_id(), trace)
+            except OSError as e:
+                self.logger.warning(f"写入追踪失败: {e}")
 
         return TaskResult(
             task_id=task.id,
             success=result.success,
             output=result.output,
             error=result.error,
+            failure=result.failure,
             duration=result.duration,
-            executed_at=datetime.now(),
+            peak_rss_mb=result.peak_rss_mb,
+            cpu_time=result.cpu_time,
+            input_tokens=usage.input_tokens if usage else None,
+            output_tokens=usage.output_tokens if usage else None,
+            cache_read_tokens=usage.cache_read_tokens if usage else None,
+            cache_creation_tokens=usage.cache_creation_tokens if usage else None,
+            cost_usd=usage.cost_usd if usage else None,
+            num_turns=usage.num_turns if usage else None,
+            model_time=trace.model_time if trace else None,
+            tool_time=trace.tool_time if trace else None,
+            first_output_time=result.first_output,
+            prompt_chars=len(prompt),
+            warm_start=result.warm,
+            executed_at=executed_at,
         )
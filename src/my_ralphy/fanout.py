@@ -0,0 +1,138 @@
+"""多仓库扇出
+
+任务可以通过 ``repos`` 指定一组工作目录 (相对任务工作目录的路径或 glob)，
+``TaskFileMode`` 把每个 (任务, 仓库) 组合展开为一个执行单元：
+
+- 单元 ID 为 ``<任务 ID>@<仓库>``，标签末尾追加 ``repo:<仓库>``，按仓库的
+  并发上限复用调度器的按标签并发上限实现
+- 状态按仓库记录在 ``repo_status`` 中，任务的整体状态由各仓库状态汇总得出
+- 执行结果记录原任务 ID 和仓库，便于按仓库汇总
+"""
+
+import glob
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .models import Task, TaskResult, TaskStatus
+
+REPO_TAG_PREFIX = "repo:"
+UNIT_SEPARATOR = "@"
+
+# 视为已结束、再次运行时不需要重新执行的仓库状态
+_DONE = (TaskStatus.COMPLETED, TaskStatus.SKIPPED)
+
+
+def repo_tag(repo: str) -> str:
+    """仓库对应的并发控制标签"""
+    return f"{REPO_TAG_PREFIX}{repo}"
+
+
+def resolve_repos(patterns: Iterable[str], base: Path) -> list[str]:
+    """把路径和 glob 展开为存在的目录 (相对 base 的路径保持相对形式)，按出现顺序去重"""
+    repos: list[str] = []
+    seen: set[str] = set()
+    for pattern in patterns:
+        root = Path(pattern) if os.path.isabs(pattern) else base / pattern
+        if glob.has_magic(pattern):
+            matches = sorted(Path(p) for p in glob.glob(str(root)))
+        else:
+            matches = [root]
+        for path in matches:
+            if not path.is_dir():
+                continue
+            try:
+                name = path.relative_to(base).as_posix()
+            except ValueError:
+                name = str(path)
+            if name not in seen:
+                seen.add(name)
+                repos.append(name)
+    return repos
+
+
+def overall_status(statuses: Iterable[str]) -> TaskStatus:
+    """由各仓库状态汇总任务状态
+
+    有仓库进行中即为进行中，其次有待办即为待办，全部完成或跳过为完成，
+    其余 (存在失败) 为失败。
+    """
+    statuses = [TaskStatus(s) for s in statuses]
+    if not statuses:
+        return TaskStatus.TODO
+    if TaskStatus.IN_PROGRESS in statuses:
+        return TaskStatus.IN_PROGRESS
+    if TaskStatus.TODO in statuses:
+        return TaskStatus.TODO
+    if all(s in _DONE for s in statuses):
+        return TaskStatus.COMPLETED
+    return TaskStatus.FAILED
+
+
+@dataclass(frozen=True)
+class Unit:
+    """一个 (任务, 仓库) 执行单元的来源"""
+    task_id: str
+    repo: str
+
+
+def expand_units(task: Task, repos: list[str]) -> list[tuple[str, Task]]:
+    """为任务待执行的仓库生成 (仓库, 执行单元)
+
+    待办任务展开所有未完成的仓库 (包括失败和中断的仓库)，所有仓库都已完成时
+    视为整体重跑，展开全部仓库；进行中的任务 (监听模式下被修改) 只展开仍
+    为待办的仓库。
+    """
+    statuses = {r: TaskStatus(task.repo_status.get(r, TaskStatus.TODO)) for r in repos}
+    if task.status == TaskStatus.TODO:
+        pending = [r for r in repos if statuses[r] not in _DONE] or repos
+    else:
+        pending = [r for r in repos if statuses[r] == TaskStatus.TODO]
+    return [
+        (repo, task.model_copy(update={
+            "id": f"{task.id}{UNIT_SEPARATOR}{repo}",
+            "tags": task.tags + [repo_tag(repo)],
+            "status": TaskStatus.TODO,
+        }))
+        for repo in pending
+    ]
+
+
+@dataclass
+class RepoSummary:
+    """单个仓库的执行汇总"""
+    todo: int = 0
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    runs: int = 0
+    duration: float = 0.0
+    cost_usd: Optional[float] = None
+
+
+def summarize_repos(tasks: Iterable[Task], results: Iterable[TaskResult]) -> dict[str, RepoSummary]:
+    """按仓库汇总任务状态 (来自 repo_status) 与执行耗时、费用 (来自结果)"""
+    summary: dict[str, RepoSummary] = {}
+    for task in tasks:
+        for repo, status in task.repo_status.items():
+            item = summary.setdefault(repo, RepoSummary())
+            status = TaskStatus(status)
+            if status == TaskStatus.COMPLETED:
+                item.completed += 1
+            elif status == TaskStatus.FAILED:
+                item.failed += 1
+            elif status == TaskStatus.SKIPPED:
+                item.skipped += 1
+            else:
+                item.todo += 1
+
+    for result in results:
+        if result.repo is None:
+            continue
+        item = summary.setdefault(result.repo, RepoSummary())
+        item.runs += 1
+        item.duration += result.duration
+        if result.cost_usd is not None:
+            item.cost_usd = (item.cost_usd or 0.0) + result.cost_usd
+    return summary
@@ -1,16 +1,172 @@
-"""日志管理模块"""
+"""日志管理模块
 
+日志调用只在调用线程中把记录放入有界队列，Rich 格式化和文件写入由
+后台 QueueListener 线程完成。队列满时丢弃记录并计数，保证热路径开销有界。
+"""
+
+import atexit
+import contextvars
+import copy
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 from rich.logging import RichHandler
 
+# 当前运行 ID，写入结构化日志以区分多次运行
+_run_id = uuid.uuid4().hex[:12]
+
+# 当前线程/上下文的附加字段 (如 task_id)
+_log_context: contextvars.ContextVar[dict] = contextvars.ContextVar("ralph_log_context", default={})
+
+
+@dataclass
+class LogStats:
+    """日志开销统计"""
+    enqueued: int = 0
+    dropped: int = 0
+    enqueue_seconds: float = 0.0
+
+    @property
+    def mean_enqueue_us(self) -> float:
+        """每条日志在调用线程上的平均耗时 (微秒)"""
+        total = self.enqueued + self.dropped
+        return self.enqueue_seconds / total * 1_000_000 if total else 0.0
+
+
+class _ContextFilter(logging.Filter):
+    """在调用线程上为记录附加 run_id 和上下文字段"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = _run_id
+        for key, value in _log_context.get().items():
+            setattr(record, key, value)
+        return True
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """非阻塞队列处理器：队列满时丢弃记录"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.stats = LogStats()
+        self._stats_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数，保留 exc_info 供 Rich 渲染异常
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        start = time.perf_counter()
+        try:
+            self.enqueue(self.prepare(record))
+            dropped = False
+        except queue.Full:
+            dropped = True
+        except Exception:
+            self.handleError(record)
+            return
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            if dropped:
+                self.stats.dropped += 1
+            else:
+                self.stats.enqueued += 1
+            self.stats.enqueue_seconds += elapsed
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化 JSON 日志格式，每行一条记录"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "run_id": getattr(record, "run_id", _run_id),
+            "msg": record.getMessage(),
+        }
+        for key in ("task_id", "repo", "worker"):
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    """轮转时压缩旧日志"""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _make_file_handler(
+    log_path: Path,
+    max_bytes: int,
+    backup_count: int,
+    rotate_when: Optional[str],
+) -> logging.Handler:
+    """创建带压缩轮转的文件处理器"""
+    if rotate_when:
+        handler: logging.handlers.BaseRotatingHandler = logging.handlers.TimedRotatingFileHandler(
+            log_path, when=rotate_when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+# 当前运行中的监听线程与队列处理器
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_BoundedQueueHandler] = None
+
+
+def _stop_listener() -> None:
+    """停止监听线程并刷出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
 
 def setup_logger(
     name: str = "ralph",
     log_file: Optional[str] = "ralph.log",
     level: int = logging.INFO,
+    json_format: bool = False,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    rotate_when: Optional[str] = None,
+    queue_size: int = 10000,
+    console_level: Optional[int] = None,
+    console_handler: Optional[logging.Handler] = None,
 ) -> logging.Logger:
     """设置日志记录器
 
@@ -18,15 +174,25 @@ def setup_logger(
         name: 日志记录器名称
         log_file: 日志文件路径，None 则不写文件
         level: 日志级别
+        json_format: 文件日志使用结构化 JSON 格式
+        max_bytes: 按大小轮转的阈值，0 表示不轮转
+        backup_count: 保留的轮转文件数 (gzip 压缩)
+        rotate_when: 按时间轮转 (如 "midnight"、"H")，设置后忽略 max_bytes
+        queue_size: 日志队列容量，队列满时丢弃新日志
+        console_level: 控制台日志级别，默认与 level 相同
+        console_handler: 控制台处理器，默认使用 RichHandler
 
     Returns:
         配置好的日志记录器
     """
+    global _listener, _queue_handler
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
     # 清除已有的处理器
     logger.handlers.clear()
+    _stop_listener()
 
     # 日志格式
     file_format = logging.Formatter(
@@ -34,26 +200,58 @@ def setup_logger(
         datefmt="%Y-%m-%d %H:%M:%S"
     )
 
+    handlers: list[logging.Handler] = []
+
     # Rich 控制台处理器
-    console_handler = RichHandler(
-        rich_tracebacks=True,
-        show_time=False,
-        show_path=False,
-    )
-    console_handler.setLevel(level)
-    logger.addHandler(console_handler)
+    if console_handler is None:
+        console_handler = RichHandler(
+            rich_tracebacks=True,
+            show_time=False,
+            show_path=False,
+        )
+    console_handler.setLevel(console_level if console_level is not None else level)
+    handlers.append(console_handler)
 
     # 文件处理器
     if log_file:
-        log_path = Path(log_file)
-        file_handler = logging.FileHandler(log_path, encoding="utf-8")
+        file_handler = _make_file_handler(Path(log_file), max_bytes, backup_count, rotate_when)
         file_handler.setLevel(level)
-        file_handler.setFormatter(file_format)
-        logger.addHandler(file_handler)
+        file_handler.setFormatter(JsonFormatter() if json_format else file_format)
+        handlers.append(file_handler)
+
+    # 调用线程只负责入队，格式化与写入在监听线程中完成
+    _queue_handler = _BoundedQueueHandler(queue.Queue(maxsize=queue_size))
+    _queue_handler.addFilter(_ContextFilter())
+    logger.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
 
     return logger
 
 
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """在当前上下文中为日志附加字段，如 ``log_context(task_id="001")``"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def get_run_id() -> str:
+    """获取当前运行 ID"""
+    return _run_id
+
+
+def get_log_stats() -> LogStats:
+    """获取日志开销统计"""
+    if _queue_handler is None:
+        return LogStats()
+    return copy.copy(_queue_handler.stats)
+
+
 # 全局日志实例
 _logger: Optional[logging.Logger] = None
 
@@ -66,8 +264,26 @@ def get_logger() -> logging.Logger:
     return _logger
 
 
-def init_logger(log_file: Optional[str] = "ralph.log", level: int = logging.INFO) -> logging.Logger:
+def init_logger(
+    log_file: Optional[str] = "ralph.log",
+    level: int = logging.INFO,
+    json_format: bool = False,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    rotate_when: Optional[str] = None,
+    console_level: Optional[int] = None,
+    console_handler: Optional[logging.Handler] = None,
+) -> logging.Logger:
     """初始化全局日志实例"""
     global _logger
-    _logger = setup_logger(log_file=log_file, level=level)
+    _logger = setup_logger(
+        log_file=log_file,
+        level=level,
+        json_format=json_format,
+        max_bytes=max_bytes,
+        backup_count=backup_count,
+        rotate_when=rotate_when,
+        console_level=console_level,
+        console_handler=console_handler,
+    )
     return _logger
@@ -23,6 +23,15 @@ class ErrorHandling(str, Enum):
     PAUSE = "pause"     # 暂停询问
 
 
+class FailureKind(str, Enum):
+    """执行失败的类型"""
+    ERROR = "error"         # 进程或会话返回错误
+    TIMEOUT = "timeout"     # 超过单任务超时
+    STALLED = "stalled"     # 一段时间内没有任何进展，被提前终止
+    CANCELLED = "cancelled" # 被中断取消
+    VERIFY = "verify"       # 验收未通过
+
+
 class Task(BaseModel):
     """任务模型"""
     id: str = Field(..., description="任务唯一标识")
@@ -32,6 +41,10 @@ class Task(BaseModel):
     acceptance: str = Field(default="", description="验收标准")
     priority: int = Field(default=0, description="优先级 (数字越大越优先)")
     tags: list[str] = Field(default_factory=list, description="标签")
+    verify: list[str] = Field(default_factory=list, description="验收命令")
+    repos: list[str] = Field(default_factory=list, description="目标仓库目录 (路径或 glob，为空时使用工作目录)")
+    repo_status: dict[str, TaskStatus] = Field(default_factory=dict, description="各仓库的执行状态")
+    duplicate_of: Optional[str] = Field(default=None, description="重复的任务 ID (被标记为重复时跳过)")
     created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
     completed_at: Optional[datetime] = Field(default=None, description="完成时间")
 
@@ -42,11 +55,30 @@ class Task(BaseModel):
 class TaskResult(BaseModel):
     """任务执行结果模型"""
     task_id: str = Field(..., description="关联的任务 ID")
+    repo: Optional[str] = Field(default=None, description="执行所在的仓库 (多仓库任务)")
     success: bool = Field(..., description="是否成功")
     output: str = Field(default="", description="Claude 输出内容")
     error: Optional[str] = Field(default=None, description="错误信息")
+    failure: Optional[FailureKind] = Field(default=None, description="失败类型")
     duration: float = Field(..., description="执行耗时(秒)")
     retry_count: int = Field(default=0, description="重试次数")
+    peak_rss_mb: Optional[float] = Field(default=None, description="子进程树峰值内存 (MB)")
+    cpu_time: Optional[float] = Field(default=None, description="子进程树 CPU 时间(秒)")
+    input_tokens: Optional[int] = Field(default=None, description="输入 token 数")
+    output_tokens: Optional[int] = Field(default=None, description="输出 token 数")
+    cache_read_tokens: Optional[int] = Field(default=None, description="缓存读取 token 数")
+    cache_creation_tokens: Optional[int] = Field(default=None, description="缓存写入 token 数")
+    cost_usd: Optional[float] = Field(default=None, description="会话费用 (美元)")
+    num_turns: Optional[int] = Field(default=None, description="会话轮次")
+    model_time: Optional[float] = Field(default=None, description="模型耗时(秒)，仅追踪时记录")
+    tool_time: Optional[float] = Field(default=None, description="工具调用耗时(秒)，仅追踪时记录")
+    prompt_chars: Optional[int] = Field(default=None, description="提示长度 (字符)")
+    first_output_time: Optional[float] = Field(default=None, description="发送提示到首个输出的秒数，仅逐事件输出时记录")
+    warm_start: Optional[bool] = Field(default=None, description="是否使用预热会话 (None 表示未开启预热池)")
+    checkpoint_time: Optional[float] = Field(default=None, description="创建检查点与回滚的耗时(秒)")
+    attempt_tree: Optional[str] = Field(default=None, description="回滚前工作区的 git tree (失败尝试的改动)")
+    verified: Optional[bool] = Field(default=None, description="验收结果 (None 表示未验收)")
+    verify_output: str = Field(default="", description="验收失败输出")
     executed_at: datetime = Field(default_factory=datetime.now, description="执行时间")
 
 
@@ -59,4 +91,33 @@ class RunConfig(BaseModel):
     timeout: int = Field(default=300, description="单任务超时秒数")
     on_error: ErrorHandling = Field(default=ErrorHandling.SKIP, description="错误处理策略")
     max_retries: int = Field(default=3, description="最大重试次数")
+    stall_timeout: Optional[float] = Field(default=None, description="无进展多少秒后提前终止会话 (None 不检测)")
+    stall_retries: Optional[int] = Field(default=None, description="停滞会话的最大重试次数 (None 按错误处理策略)")
+    warm_pool: int = Field(default=0, description="预热的 claude 会话数 (0 不预热)")
+    warm_ttl: float = Field(default=300.0, description="预热会话的最长空闲秒数")
+    context_budget: int = Field(default=1500, description="持续模式携带的迭代摘要 token 预算 (0 不携带)")
+    dedup: str = Field(default="exact", description="重复任务处理 (exact 跳过完全重复/near 同时跳过近似重复/off)")
+    dedup_threshold: float = Field(default=0.7, description="近似重复的相似度阈值 (0-1)")
     skip_permissions: bool = Field(default=False, description="跳过 Claude 权限确认")
+    cpu_limit: Optional[int] = Field(default=None, description="子进程 CPU 时间上限(秒)")
+    memory_limit_mb: Optional[int] = Field(default=None, description="子进程内存上限 (MB)")
+    max_open_files: Optional[int] = Field(default=None, description="子进程最大打开文件数")
+    use_cgroup: bool = Field(default=False, description="优先使用 cgroup v2 限制资源")
+    verify_tags: dict[str, list[str]] = Field(default_factory=dict, description="按标签配置的验收命令")
+    verify_workers: int = Field(default=2, description="并行验收命令数")
+    verify_timeout: int = Field(default=600, description="单条验收命令超时秒数")
+    verify_pipeline: bool = Field(default=True, description="验收与下一个任务并行执行")
+    checkpoint: bool = Field(default=False, description="每次尝试前创建工作区检查点，失败时回滚")
+    context: bool = Field(default=False, description="在提示中附加仓库索引选出的相关文件")
+    context_files: int = Field(default=8, description="附加的相关文件数")
+    watch: bool = Field(default=False, description="监听任务文件变化并持续消费新任务")
+    poll_interval: float = Field(default=1.0, description="监听任务文件的轮询间隔秒数")
+    workers: int = Field(default=1, description="并行执行的任务数")
+    repo_concurrency: int = Field(default=1, description="多仓库任务中每个仓库的最大并发数")
+    schedule: str = Field(default="priority", description="调度策略 (priority/aging/fair/sjf)")
+    tag_weights: dict[str, float] = Field(default_factory=dict, description="fair 策略下各标签的权重")
+    tag_caps: dict[str, int] = Field(default_factory=dict, description="各标签的最大并发数")
+    aging_rate: float = Field(default=1 / 60, description="aging 策略下每秒等待增加的优先级")
+    budget: Optional[float] = Field(default=None, description="本次运行的费用预算 (美元)")
+    trace: bool = Field(default=False, description="记录会话事件追踪")
+    trace_file: str = Field(default="ralph_traces.jsonl", description="追踪文件路径")
@@ -2,32 +2,48 @@
 
 import time
 from pathlib import Path
+from typing import Optional
 
 from rich.console import Console
 from rich.prompt import Prompt
 
+from ..digest import RollingDigest
 from ..display import show_banner, show_output
 from ..executor import ClaudeExecutor
 from ..logger import get_logger
 from ..models import RunConfig, Task
+from ..verifier import Verifier
 
 console = Console()
 
 
 class ContinuousMode:
-    """持续模式 - 任务链式执行"""
+    """持续模式 - 任务链式执行
+
+    每次迭代的提示附带之前迭代的摘要 (修改的文件、关键决定和错误)，
+    摘要大小受 ``context_budget`` 限制。
+    """
 
     def __init__(self, config: RunConfig, initial_task: str = ""):
         self.config = config
         self.initial_task = initial_task
-        self.executor = ClaudeExecutor(
-            working_dir=Path(config.working_dir),
-            timeout=config.timeout,
-            skip_permissions=config.skip_permissions,
-        )
+        self.executor = ClaudeExecutor.from_config(config)
         self.logger = get_logger()
         self.results = []
         self.iteration = 0
+        # 每个任务 (相同提示的连续迭代) 用掉的迭代次数
+        self.chains: list[int] = []
+        self._last_prompt: Optional[str] = None
+
+        self.digest: Optional[RollingDigest] = None
+        self.verifier: Optional[Verifier] = None
+        if config.context_budget > 0:
+            self.digest = RollingDigest(config.context_budget)
+            # 借用验收的工作区快照计算每次迭代修改的文件
+            self.verifier = Verifier(
+                working_dir=Path(config.working_dir),
+                ignore=["ralph_results.json", "ralph.log", config.trace_file],
+            )
 
     def run(self) -> None:
         """运行持续模式"""
@@ -85,10 +101,26 @@ class ContinuousMode:
             description=prompt,
         )
 
-        # 执行
-        result = self.executor.run_task(task)
+        if prompt != self._last_prompt:
+            self.chains.append(0)
+            self._last_prompt = prompt
+        self.chains[-1] += 1
+
+        # 执行，附带之前迭代的摘要
+        history = self.digest.render() if self.digest is not None else ""
+        snapshot = self.verifier.snapshot() if self.verifier is not None else None
+        result = self.executor.run_task(task, history=history or None)
         self.results.append(result)
 
+        if self.digest is not None:
+            files = self.verifier.changed_files(snapshot)
+            sent = self.executor.build_prompt(task, history=history or None)
+            self.digest.add(self.iteration + 1, prompt, result, files, sent=sent)
+            self.logger.info(
+                f"提示 {result.prompt_chars} 字符 (其中摘要约 {len(history)} 字符)，"
+                f"本次修改 {len(files)} 个文件"
+            )
+
         # 显示结果
         if result.success:
             console.print(f"[bold green]✅[/bold green] 完成，耗时 {result.duration:.1f}s")
@@ -113,3 +145,14 @@ class ContinuousMode:
 
         total_time = sum(r.duration for r in self.results)
         console.print(f"  总耗时: {total_time:.1f}s")
+
+        sizes = [r.prompt_chars for r in self.results if r.prompt_chars is not None]
+        if sizes:
+            console.print(f"  提示长度: 平均 {sum(sizes) / len(sizes):.0f} 字符，最大 {max(sizes)} 字符")
+        if self.chains:
+            console.print(
+                f"  每个任务的迭代次数: 平均 {sum(self.chains) / len(self.chains):.1f} "
+                f"({', '.join(str(n) for n in self.chains)})"
+            )
+        if self.digest:
+            console.print(f"  迭代摘要: 约 {self.digest.tokens} tokens (预算 {self.digest.budget})")
@@ -1,116 +1,423 @@
-"""交互模式"""
+"""交互模式
 
-from pathlib import Path
+输入的任务进入优先级队列，由后台 worker 线程执行，输入提示不会被阻塞。
+执行进度在输入行上方显示，并重绘正在输入的内容。
+"""
 
-from rich.console import Console
-from rich.prompt import Prompt
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
 
-from ..display import show_banner, show_output, show_info, show_statistics
+from rich.console import Console, RenderableType
+from rich.markup import escape
+from rich.table import Table
+
+from ..display import show_banner, show_output, show_startup_latency
 from ..executor import ClaudeExecutor
-from ..logger import get_logger
-from ..models import RunConfig, Task, TaskStatus
-from ..task_manager import TaskManager
+from ..logger import get_logger, log_context
+from ..models import RunConfig, Task, TaskResult, TaskStatus
+from ..scheduler import PriorityScheduler
+
+try:
+    import readline
+except ImportError:  # pragma: no cover - Windows 等没有 readline 的平台
+    readline = None
 
 console = Console()
 
+# 输入提示；\001 \002 包裹的控制字符不计入 readline 的光标位置
+PROMPT = "\001\033[1;32m\002📝 输入任务\001\033[0m\002: "
+PROMPT_VISIBLE = PROMPT.replace("\001", "").replace("\002", "")
+
+STATUS_LABELS = {
+    TaskStatus.TODO: "[dim]📋 排队[/dim]",
+    TaskStatus.IN_PROGRESS: "[yellow]⏳ 执行中[/yellow]",
+    TaskStatus.COMPLETED: "[green]✅ 完成[/green]",
+    TaskStatus.FAILED: "[red]❌ 失败[/red]",
+    TaskStatus.SKIPPED: "[dim]⏹️ 已取消[/dim]",
+}
+
+
+@dataclass
+class Job:
+    """一个排队或执行中的任务"""
+    task: Task
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[TaskResult] = None
+    worker: Optional[int] = None
+    cancelled: bool = False
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class _NotifyHandler(logging.Handler):
+    """经由 InteractiveMode._notify 输出控制台日志，避免 worker 线程的日志打乱输入行"""
+
+    def __init__(self, mode: "InteractiveMode"):
+        super().__init__()
+        self.mode = mode
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            color = "red" if record.levelno >= logging.ERROR else "yellow"
+            self.mode._notify(f"[{color}]{record.levelname}[/{color}] {escape(self.format(record))}")
+        except Exception:
+            self.handleError(record)
+
 
 class InteractiveMode:
     """交互模式"""
 
     def __init__(self, config: RunConfig):
         self.config = config
-        self.executor = ClaudeExecutor(
-            working_dir=Path(config.working_dir),
-            timeout=config.timeout,
-            skip_permissions=config.skip_permissions,
-        )
+        self.executor = ClaudeExecutor.from_config(config)
+        # 每个 worker 使用独立的执行器副本，取消时只终止对应的会话
+        self.executors = [self.executor] + [self.executor.clone() for _ in range(max(1, config.workers) - 1)]
         self.logger = get_logger()
-        self.results = []
+        self.results: list[TaskResult] = []
         self.iteration = 0
+        self.jobs: dict[str, Job] = {}
+        self.queue = PriorityScheduler()
+        self.cond = threading.Condition()
+        self.stopping = False
+        self._threads: list[threading.Thread] = []
+        self._output_lock = threading.RLock()
+        self._prompting = False
+
+    def log_handler(self) -> logging.Handler:
+        """控制台日志处理器，与交互输出共用输出锁"""
+        return _NotifyHandler(self)
 
     def run(self) -> None:
         """运行交互模式"""
         show_banner()
-        console.print("\n[bold cyan]交互模式[/bold cyan] (输入 'quit' 退出, 'status' 查看状态, 'help' 获取帮助)\n")
-
-        while self.iteration < self.config.max_iterations:
-            try:
-                # 获取用户输入
-                task_input = Prompt.ask("\n[bold green]📝 输入任务[/bold green]")
-
-                if not task_input.strip():
-                    continue
+        console.print(
+            f"\n[bold cyan]交互模式[/bold cyan] (并行 {len(self.executors)}，"
+            "输入 'help' 查看命令，'quit' 退出)\n"
+        )
 
-                # 处理特殊命令
-                command = task_input.strip().lower()
+        self.executor.prewarm()
+        for index in range(len(self.executors)):
+            thread = threading.Thread(target=self._worker, args=(index,), daemon=True, name=f"ralphy-interactive-{index}")
+            thread.start()
+            self._threads.append(thread)
 
-                if command == "quit" or command == "exit":
-                    console.print("\n[dim]👋 退出交互模式[/dim]")
+        try:
+            while True:
+                try:
+                    line = self._read_line()
+                except KeyboardInterrupt:
+                    self._notify("\n\n[dim]👋 退出交互模式[/dim]")
+                    break
+                except EOFError:
+                    self._notify("\n\n[dim]👋 退出交互模式[/dim]")
                     break
 
-                elif command == "status":
-                    self._show_status()
-                    continue
-
-                elif command == "help":
-                    self._show_help()
+                if not line.strip():
                     continue
 
-                # 执行任务
-                self._execute_task(task_input)
-                self.iteration += 1
+                if line.strip().lower() in ("quit", "exit"):
+                    self._notify("\n[dim]👋 退出交互模式[/dim]")
+                    break
 
-            except KeyboardInterrupt:
-                console.print("\n\n[dim]👋 退出交互模式[/dim]")
-                break
-            except EOFError:
-                console.print("\n\n[dim]👋 退出交互模式[/dim]")
-                break
+                if not self._handle_command(line.strip()):
+                    self._submit(line)
+        finally:
+            self._stop()
 
         # 显示最终统计
         if self.results:
             self._show_status()
 
-    def _execute_task(self, prompt: str) -> None:
-        """执行任务"""
-        console.print(f"\n[bold blue]▶[/bold blue] 执行中...")
+    # ------------------------------------------------------------------
+    # 输入与输出
+    # ------------------------------------------------------------------
+
+    def _read_line(self) -> str:
+        with self._output_lock:
+            self._prompting = True
+        try:
+            return input(PROMPT if readline else PROMPT_VISIBLE)
+        finally:
+            with self._output_lock:
+                self._prompting = False
+
+    def _notify(self, message: RenderableType) -> None:
+        """在输入行上方显示消息，并重绘提示与已输入的内容
 
-        # 创建临时任务
+        所有输出都经由这里，与 worker 线程的通知串行，不会打乱输入行。
+        """
+        with self._output_lock:
+            if not self._prompting or readline is None:
+                console.print(message)
+                return
+            buffer = readline.get_line_buffer()
+            sys.stdout.write("\r\033[2K")
+            sys.stdout.flush()
+            console.print(message)
+            sys.stdout.write(PROMPT_VISIBLE + buffer)
+            sys.stdout.flush()
+
+    # ------------------------------------------------------------------
+    # 队列与执行
+    # ------------------------------------------------------------------
+
+    def _submit(self, prompt: str) -> None:
+        """任务入队"""
+        if self.iteration >= self.config.max_iterations:
+            self._notify(f"[yellow]已达到最大迭代次数 {self.config.max_iterations}[/yellow]")
+            return
+
+        self.iteration += 1
         task = Task(
-            id=f"i{self.iteration + 1:03d}",
+            id=f"i{self.iteration:03d}",
             title=prompt[:50] + ("..." if len(prompt) > 50 else ""),
             description=prompt,
         )
+        with self.cond:
+            self.jobs[task.id] = Job(task=task, submitted_at=time.time())
+            self.queue.push(task)
+            # 在锁内输出，保证显示在 worker 的「开始执行」之前
+            self._notify(f"[dim]📥 \\[{task.id}] 已加入队列 (排队 {len(self.queue)})[/dim]")
+            self.cond.notify()
+
+    def _worker(self, index: int) -> None:
+        """worker 线程：按优先级取出任务并执行"""
+        executor = self.executors[index]
+        while True:
+            with self.cond:
+                while not self.stopping and not self.queue:
+                    self.cond.wait()
+                if self.stopping:
+                    return
+                task = self.queue.pop()
+                job = self.jobs[task.id]
+                task.status = TaskStatus.IN_PROGRESS
+                job.started_at = time.time()
+                job.worker = index
+
+            self._notify(f"[bold blue]▶[/bold blue] \\[{task.id}] 开始执行: {escape(task.title)}")
+
+            with log_context(task_id=task.id):
+                result = executor.run_task(task)
+
+            with self.cond:
+                job.result = result
+                job.finished_at = time.time()
+                if job.cancelled:
+                    task.status = TaskStatus.SKIPPED
+                elif result.success:
+                    task.status = TaskStatus.COMPLETED
+                else:
+                    task.status = TaskStatus.FAILED
+                self.results.append(result)
+                self.cond.notify_all()
 
-        # 执行
-        result = self.executor.run_task(task)
-        self.results.append(result)
+            if self.stopping:
+                return
 
-        # 显示结果
-        if result.success:
-            console.print(f"[bold green]✅[/bold green] 完成，耗时 {result.duration:.1f}s")
-            if result.output:
-                show_output(result.output, title="Claude 输出")
+            if job.cancelled:
+                self._notify(f"[dim]⏹️ \\[{task.id}] 已取消[/dim]")
+            elif result.success:
+                self._notify(
+                    f"[bold green]✅[/bold green] \\[{task.id}] 完成，耗时 {result.duration:.1f}s "
+                    f"[dim](show {task.id} 查看输出)[/dim]"
+                )
+            else:
+                lines = (result.error or "").strip().splitlines()
+                error = escape(lines[0][:100]) if lines else "未知错误"
+                self._notify(f"[bold red]❌[/bold red] \\[{task.id}] 失败: {error}")
+
+    def _stop(self) -> None:
+        """取消排队的任务并终止执行中的会话"""
+        with self.cond:
+            self.stopping = True
+            for job in self.jobs.values():
+                if job.task.status == TaskStatus.TODO:
+                    self.queue.remove(job.task.id)
+                    job.task.status = TaskStatus.SKIPPED
+                    job.cancelled = True
+            self.cond.notify_all()
+        for executor in self.executors:
+            executor.cancel_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self.executor.close()
+
+    # ------------------------------------------------------------------
+    # 命令
+    # ------------------------------------------------------------------
+
+    def _handle_command(self, line: str) -> bool:
+        """处理命令，返回 False 表示输入应作为任务执行
+
+        带参数的命令只有在参数是已有的任务 ID 时才生效，
+        避免把以 show、cancel 开头的任务描述误认为命令。
+        """
+        parts = line.split()
+        command, args = parts[0].lower(), parts[1:]
+
+        if command == "status" and not args:
+            self._show_status()
+        elif command == "help" and not args:
+            self._show_help()
+        elif command in ("jobs", "ls") and not args:
+            self._show_jobs()
+        elif command == "wait" and not args:
+            self._wait_all()
+        elif command == "show" and len(args) == 1 and args[0] in self.jobs:
+            self._show_job(args[0])
+        elif command == "cancel" and len(args) == 1 and args[0] in self.jobs:
+            self._cancel(args[0])
+        elif command in ("priority", "prio") and len(args) == 2 and args[0] in self.jobs:
+            try:
+                priority = int(args[1])
+            except ValueError:
+                return False
+            self._reprioritize(args[0], priority)
         else:
-            console.print(f"[bold red]❌[/bold red] 失败: {result.error or '未知错误'}")
-            if result.output:
-                show_output(result.output, title="输出")
+            return False
+        return True
+
+    def _cancel(self, job_id: str) -> None:
+        with self.cond:
+            job = self.jobs[job_id]
+            status = job.task.status
+            if status == TaskStatus.TODO:
+                self.queue.remove(job_id)
+                job.task.status = TaskStatus.SKIPPED
+                job.cancelled = True
+                self._notify(f"[dim]⏹️ \\[{job_id}] 已从队列移除[/dim]")
+                return
+            if status != TaskStatus.IN_PROGRESS:
+                self._notify(f"[dim]\\[{job_id}] 已结束[/dim]")
+                return
+            job.cancelled = True
+
+        # 终止会话需要等待宽限期，放到后台避免阻塞输入
+        threading.Thread(target=self._kill_job, args=(job,), daemon=True).start()
+        self._notify(f"[dim]⏹️ \\[{job_id}] 正在终止...[/dim]")
+
+    def _kill_job(self, job: Job) -> None:
+        """终止任务的会话
+
+        worker 在锁内记录结果之后才会取下一个任务，因此在锁内取得的会话一定属于该任务，
+        不会误杀同一 worker 随后执行的任务。会话尚未启动时等待其启动。
+        """
+        executor = self.executors[job.worker]
+        while True:
+            with self.cond:
+                if job.result is not None:
+                    return
+                children = executor.active_children()
+            if children:
+                break
+            time.sleep(0.1)
+        for child in children:
+            child.kill_tree()
+
+    def _reprioritize(self, job_id: str, priority: int) -> None:
+        with self.cond:
+            job = self.jobs[job_id]
+            if job.task.status != TaskStatus.TODO:
+                self._notify(f"[dim]\\[{job_id}] 不在队列中[/dim]")
+                return
+            job.task.priority = priority
+            # 重新入队即可按新优先级排序
+            self.queue.push(job.task)
+        self._notify(f"[dim]\\[{job_id}] 优先级调整为 {priority}[/dim]")
+
+    def _wait_all(self) -> None:
+        """等待所有任务结束 (Ctrl+C 返回输入)"""
+        try:
+            with self.cond:
+                while any(
+                    job.task.status in (TaskStatus.TODO, TaskStatus.IN_PROGRESS)
+                    for job in self.jobs.values()
+                ):
+                    self.cond.wait(timeout=0.5)
+        except KeyboardInterrupt:
+            self._notify("")
+
+    def _show_job(self, job_id: str) -> None:
+        job = self.jobs[job_id]
+        if job.result is None:
+            self._notify(f"\\[{job_id}] {STATUS_LABELS[job.task.status]} {escape(job.task.title)}")
+            return
+        with self._output_lock:
+            title = "Claude 输出" if job.result.success else "输出"
+            if job.result.output:
+                show_output(job.result.output, title=f"\\[{job_id}] {title}")
+            elif job.result.error:
+                show_output(job.result.error, title=f"\\[{job_id}] 错误")
+            else:
+                self._notify(f"[dim]\\[{job_id}] 没有输出[/dim]")
+
+    def _show_jobs(self) -> None:
+        with self.cond:
+            jobs = list(self.jobs.values())
+        if not jobs:
+            self._notify("[dim]没有任务[/dim]")
+            return
+
+        table = Table(show_header=True, header_style="bold")
+        table.add_column("ID", width=6)
+        table.add_column("状态", width=10)
+        table.add_column("优先级", width=6)
+        table.add_column("耗时", width=8)
+        table.add_column("任务", width=40)
+        for job in jobs:
+            elapsed = job.elapsed
+            table.add_row(
+                job.task.id,
+                STATUS_LABELS[job.task.status],
+                str(job.task.priority),
+                f"{elapsed:.0f}s" if elapsed is not None else "-",
+                escape(job.task.title),
+            )
+        self._notify(table)
 
     def _show_status(self) -> None:
         """显示状态"""
-        console.print("\n[bold]📊 执行状态[/bold]")
-        console.print(f"  迭代次数: {self.iteration}/{self.config.max_iterations}")
-        console.print(f"  成功任务: {sum(1 for r in self.results if r.success)}")
-        console.print(f"  失败任务: {sum(1 for r in self.results if not r.success)}")
+        with self.cond:
+            statuses = [job.task.status for job in self.jobs.values()]
+            results = list(self.results)
 
-        if self.results:
-            total_time = sum(r.duration for r in self.results)
-            console.print(f"  总耗时: {total_time:.1f}s")
+        lines = [
+            "\n[bold]📊 执行状态[/bold]",
+            f"  迭代次数: {self.iteration}/{self.config.max_iterations}",
+            f"  排队: {statuses.count(TaskStatus.TODO)}",
+            f"  执行中: {statuses.count(TaskStatus.IN_PROGRESS)}",
+            f"  成功任务: {sum(1 for r in results if r.success)}",
+            f"  失败任务: {statuses.count(TaskStatus.FAILED)}",
+        ]
+        if results:
+            lines.append(f"  总耗时: {sum(r.duration for r in results):.1f}s")
+        self._notify("\n".join(lines))
+        if results:
+            with self._output_lock:
+                show_startup_latency(results)
 
     def _show_help(self) -> None:
         """显示帮助"""
-        console.print("\n[bold]📖 帮助[/bold]")
-        console.print("  输入任务描述，按回车执行")
-        console.print("  [dim]quit[/dim]   - 退出交互模式")
-        console.print("  [dim]status[/dim] - 查看执行状态")
-        console.print("  [dim]help[/dim]   - 显示此帮助")
+        self._notify("\n".join([
+            "\n[bold]📖 帮助[/bold]",
+            "  输入任务描述，按回车加入队列 (不等待上一个任务完成)",
+            "  [dim]jobs[/dim]               - 列出排队、执行中和已完成的任务",
+            "  [dim]show <id>[/dim]          - 查看任务输出",
+            "  [dim]cancel <id>[/dim]        - 取消排队或执行中的任务",
+            "  [dim]priority <id> <n>[/dim]  - 调整排队任务的优先级 (数字越大越优先)",
+            "  [dim]wait[/dim]               - 等待所有任务完成",
+            "  [dim]quit[/dim]               - 退出交互模式 (取消未完成的任务)",
+            "  [dim]status[/dim]             - 查看执行状态",
+            "  [dim]help[/dim]               - 显示此帮助",
+        ]))
@@ -1,6 +1,9 @@
 """任务文件模式"""
 
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Optional
 
@@ -11,20 +14,45 @@ from ..display import (
     show_task_complete,
     show_task_retry,
     show_task_skipped,
+    show_startup_latency,
+    show_task_verifying,
+    show_verify_result,
     show_summary_table,
     show_statistics,
+    show_usage_summary,
+    show_repo_summary,
     show_error,
     ask_choice,
     create_progress,
 )
+from ..budget import Budget, CostModel, aggregate_usage
+from ..checkpoint import Checkpoint, CheckpointError, GitCheckpointer
 from ..executor import ClaudeExecutor
-from ..logger import get_logger
-from ..models import ErrorHandling, RunConfig, TaskStatus
+from ..fanout import Unit, expand_units, repo_tag, resolve_repos, summarize_repos
+from ..logger import get_log_stats, get_logger, log_context
+from ..models import ErrorHandling, FailureKind, RunConfig, Task, TaskResult, TaskStatus
+from ..scheduler import DurationModel, Scheduler, make_scheduler
+from ..stats import record_run
 from ..task_manager import TaskManager
+from ..verifier import PendingVerification, VerificationPipeline, Verifier, VerifyResult
+
+# 停滞的会话重试时附加到提示中的说明
+STALL_FEEDBACK = (
+    "上一次尝试长时间没有任何输出、文件修改或 CPU 活动，已被终止。"
+    "请避免运行等待交互输入或不会自行退出的命令 (如 dev server、watch 模式)。"
+)
 
 
 class TaskFileMode:
-    """任务文件模式"""
+    """任务文件模式
+
+    主线程负责调度与状态更新，任务在 ``workers`` 个线程中并行执行。
+    新任务按调度策略出队；失败重试和验收失败的任务进入重试队列，优先执行。
+    设置预算时，预估费用超出剩余预算的任务被推迟，预算用尽后停止派发。
+    指定了 ``repos`` 的任务按仓库展开为多个执行单元，每个仓库的并发数受
+    ``repo_concurrency`` 限制。开启检查点时每次尝试前记录工作区，失败后回滚；
+    同一目录中有其他尝试同时进行时无法区分各自的改动，跳过回滚。
+    """
 
     def __init__(self, config: RunConfig):
         self.config = config
@@ -32,13 +60,44 @@ class TaskFileMode:
             task_file=config.task_file,
             results_file="ralph_results.json",
         )
-        self.executor = ClaudeExecutor(
-            working_dir=Path(config.working_dir),
-            timeout=config.timeout,
-            skip_permissions=config.skip_permissions,
-        )
+        self.executor = ClaudeExecutor.from_config(config)
+        self.verifier = self._make_verifier(Path(config.working_dir))
+        self.pipeline = VerificationPipeline(self.verifier, workers=config.verify_workers)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, config.workers), thread_name_prefix="ralphy-worker")
         self.logger = get_logger()
         self.iteration = 0
+        self.scheduler: Optional[Scheduler] = None
+        self.budget: Optional[Budget] = None
+        self.retry_queue: deque[Task] = deque()
+        self._deferred: list[Task] = []
+        self._run_results_start = 0
+        self.running: dict[Future, Task] = {}
+        self._dispatched = 0
+        self._retry_counts: dict[str, int] = {}
+        self._feedback: dict[str, str] = {}
+        self._changed: dict[str, list[str]] = {}
+        # 多仓库任务的执行单元 ID -> (任务 ID, 仓库)，以及各仓库的验收器
+        self._units: dict[str, Unit] = {}
+        self._verifiers: dict[str, Verifier] = {}
+        # 检查点：按工作目录的检查点器、尝试前的检查点、各目录中进行中的尝试
+        self._checkpointers: dict[Path, Optional[GitCheckpointer]] = {}
+        self._checkpoints: dict[str, Checkpoint] = {}
+        self._attempts: dict[Path, set[str]] = {}
+        self._overlapped: set[str] = set()
+        self._rollbacks = 0
+
+    def _make_verifier(self, working_dir: Path) -> Verifier:
+        return Verifier(
+            working_dir=working_dir,
+            tag_commands=self.config.verify_tags,
+            timeout=self.config.verify_timeout,
+            ignore=self._own_files(),
+        )
+
+    def _own_files(self) -> list[str]:
+        """ralphy 自身写入的文件，不计入验收改动和检查点"""
+        shards = [str(path) for path in self.task_manager.shard_paths()] if self.task_manager.sharded else []
+        return [self.config.task_file, *shards, "ralph_results.json", "ralph.log", self.config.trace_file]
 
     def run(self) -> None:
         """运行任务文件模式"""
@@ -51,99 +110,516 @@ class TaskFileMode:
             show_error(str(e))
             return
 
-        show_task_loaded(len(tasks), self.config.task_file)
+        shards = len(self.task_manager.shard_paths()) if self.task_manager.sharded else 0
+        show_task_loaded(len(tasks), self.config.task_file + (f"，{shards} 个分片" if shards else ""))
+        if self.config.dedup != "off":
+            self._flag_duplicates()
 
         # 获取待执行任务
         pending_tasks = self.task_manager.get_pending_tasks()
 
-        if not pending_tasks:
+        if not pending_tasks and not self.config.watch:
             self.logger.info("没有待执行的任务")
             return
 
-        self.logger.info(f"开始执行 {len(pending_tasks)} 个任务")
+        history = self.task_manager.load_results()
+        self._run_results_start = len(history)
+        if self.config.budget is not None:
+            self.budget = Budget(self.config.budget, CostModel.from_results(history, tasks))
 
-        # 执行任务
+        self.scheduler = make_scheduler(
+            self.config.schedule,
+            model=DurationModel.from_results(history, tasks),
+            tag_weights=self.config.tag_weights,
+            # 多仓库任务会按仓库追加并发上限，不修改配置本身
+            tag_caps=dict(self.config.tag_caps),
+            aging_rate=self.config.aging_rate,
+        )
+        now = time.time()
         for task in pending_tasks:
-            if self.iteration >= self.config.max_iterations:
-                self.logger.warning(f"达到最大迭代次数 {self.config.max_iterations}")
-                break
+            for unit in self._expand(task):
+                self.scheduler.push(unit, now)
+
+        self.logger.info(
+            f"开始执行 {len(self.scheduler)} 个任务 "
+            f"(调度策略 {self.config.schedule}，并行 {self.config.workers})"
+        )
+
+        if self.config.watch:
+            self.logger.info(f"监听任务文件变化: {self.config.task_file} (Ctrl+C 退出)")
+
+        self.executor.prewarm()
+        try:
+            self._loop()
+
+            # 等待剩余验收完成
+            while self.pipeline.pending:
+                self._handle_verified(self.pipeline.wait_any(), allow_retry=False)
+
+            # 重新排队但未再执行的任务恢复为待办
+            for task in list(self.retry_queue) + self._deferred:
+                if task.status == TaskStatus.IN_PROGRESS:
+                    self._set_status(task, TaskStatus.TODO)
+
+            if self.budget is not None and (self._deferred or (self.budget.exhausted and self.scheduler)):
+                self.logger.warning(
+                    f"预算不足，{len(self._deferred) + len(self.scheduler)} 个任务未执行 "
+                    f"(已花费 ${self.budget.spent:.4f} / ${self.budget.limit:.2f})"
+                )
+        except KeyboardInterrupt:
+            # 工作线程中的会话在独立进程组中，需要显式终止
+            self.executor.cancel_all()
+            raise
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pipeline.shutdown()
+            self.executor.close()
+
+        # 显示本次运行的结果
+        run_results = self.task_manager.results[self._run_results_start:]
+        show_summary_table(self.task_manager.tasks, run_results)
+        show_statistics(self.task_manager.tasks, run_results)
+        show_usage_summary(aggregate_usage(self.task_manager.tasks, run_results))
+        show_startup_latency(run_results)
+        if self._units:
+            show_repo_summary(summarize_repos(self.task_manager.tasks, run_results))
+
+        if self._rollbacks:
+            times = [r.checkpoint_time for r in run_results if r.checkpoint_time is not None]
+            self.logger.info(
+                f"检查点: 回滚 {self._rollbacks} 次，检查点与回滚平均耗时 "
+                f"{sum(times) / max(1, len(times)) * 1000:.0f}ms"
+            )
+
+        self._record_stats()
+
+        log_stats = get_log_stats()
+        self.logger.info(f"日志开销: {log_stats.enqueued} 条，平均 {log_stats.mean_enqueue_us:.1f}us/条")
+        if log_stats.dropped:
+            self.logger.warning(f"日志队列已满，丢弃 {log_stats.dropped} 条日志")
+
+    def _record_stats(self) -> None:
+        """把本次运行的结果追加到统计存储"""
+        try:
+            count = record_run(self.config.task_file, self.task_manager.results, self._run_results_start, self.task_manager.tasks)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"写入统计存储失败: {e}")
+            return
+        if count:
+            self.logger.debug(f"统计存储追加 {count} 条结果")
+
+    def _expand(self, task: Task) -> list[Task]:
+        """多仓库任务展开为各仓库的执行单元，普通任务原样返回"""
+        if not task.repos:
+            return [task]
+
+        base = Path(self.config.working_dir)
+        repos = resolve_repos(task.repos, base)
+        if not repos:
+            self.logger.warning(f"任务 {task.id} 没有匹配的仓库: {', '.join(task.repos)}")
+            return []
 
-            self._execute_task(task)
-            self.iteration += 1
+        units = expand_units(task, repos)
+        for repo, unit in units:
+            self._units[unit.id] = Unit(task_id=task.id, repo=repo)
+            self.scheduler.tag_caps.setdefault(repo_tag(repo), max(1, self.config.repo_concurrency))
+        self.task_manager.plan_repos(task.id, repos, [repo for repo, _ in units])
+        return [unit for _, unit in units]
+
+    def _repo_dir(self, task: Task) -> Optional[Path]:
+        unit = self._units.get(task.id)
+        return Path(self.config.working_dir) / unit.repo if unit else None
+
+    def _verifier_for(self, task: Task) -> Verifier:
+        """执行单元在所属仓库中验收"""
+        unit = self._units.get(task.id)
+        if unit is None:
+            return self.verifier
+        if unit.repo not in self._verifiers:
+            self._verifiers[unit.repo] = self._make_verifier(self._repo_dir(task))
+        return self._verifiers[unit.repo]
+
+    def _set_status(self, task: Task, status: TaskStatus) -> None:
+        """更新任务状态；执行单元只更新所属任务在该仓库上的状态"""
+        unit = self._units.get(task.id)
+        if unit is None:
+            self.task_manager.update_task_status(task.id, status)
+        else:
+            task.status = status
+            self.task_manager.update_repo_status(unit.task_id, unit.repo, status)
+
+    def _loop(self) -> None:
+        """调度主循环：派发任务、处理完成的执行与验收"""
+        while True:
+            self._handle_verified(self.pipeline.poll())
+
+            if self.config.watch:
+                self._apply_file_changes()
+
+            self._dispatch()
+
+            # 预算耗尽后队列中的任务不会再被派发，视为没有剩余工作
+            exhausted = self.budget is not None and self.budget.exhausted
+            has_work = bool(self.retry_queue or self.scheduler) and not exhausted
+            if not self.running and not self.pipeline.pending:
+                if has_work and self.iteration >= self.config.max_iterations:
+                    self.logger.warning(f"达到最大迭代次数 {self.config.max_iterations}")
+                    return
+                if not has_work and not self.config.watch:
+                    return
+
+            # 等待任一执行或验收完成
+            futures = list(self.running) + [f for item in self.pipeline.pending for f in item.futures]
+            if futures:
+                done, _ = wait(futures, timeout=self.config.poll_interval, return_when=FIRST_COMPLETED)
+            else:
+                # 受并发上限限制或监听模式下队列为空
+                time.sleep(self.config.poll_interval)
+                done = set()
+
+            for future in [f for f in done if f in self.running]:
+                task = self.running.pop(future)
+                result = future.result()
+                self.scheduler.on_finish(task, result.duration)
+                if self.budget is not None:
+                    self.budget.settle(task, result.cost_usd)
+                    self._requeue_deferred()
+                self._on_task_done(task, result)
+
+    def _next_task(self) -> Optional[Task]:
+        """重试队列优先 (同样受按标签并发上限限制)，其次按调度策略取新任务；预算不足的任务被推迟"""
+        while True:
+            if self.budget is not None and self.budget.exhausted:
+                return None
+
+            task = self._take_retry()
+            if task is not None:
+                is_new = False
+            elif self.iteration < self.config.max_iterations:
+                task = self.scheduler.pop(time.time())
+                if task is None:
+                    return None
+                is_new = True
+            else:
+                return None
+
+            if self.budget is not None and not self.budget.admit(task):
+                self.logger.debug(f"任务 {task.id} 预估费用超出剩余预算，推迟执行")
+                self._deferred.append(task)
+                continue
+
+            if is_new:
+                self.iteration += 1
+            return task
+
+    def _take_retry(self) -> Optional[Task]:
+        """取出第一个不受按标签并发上限限制的重试任务"""
+        for i, task in enumerate(self.retry_queue):
+            if self.scheduler.can_start(task):
+                del self.retry_queue[i]
+                return task
+        return None
+
+    def _requeue_deferred(self) -> None:
+        """结算后剩余预算可能增加，推迟的任务重新入队等待判断"""
+        if not self._deferred or self.budget.exhausted:
+            return
+        now = time.time()
+        for task in self._deferred:
+            if task.status == TaskStatus.IN_PROGRESS:
+                # 等待重试的任务
+                self.retry_queue.append(task)
+            else:
+                self.scheduler.push(task, now)
+        self._deferred = []
+
+    def _dispatch(self) -> None:
+        """在空闲 worker 上启动任务"""
+        while len(self.running) < max(1, self.config.workers):
+            # 关闭验收流水线时，等待验收完成后再启动新任务；开启检查点时也需要等待，
+            # 以便验收失败后回滚不影响下一个任务
+            if (not self.config.verify_pipeline or self.config.checkpoint) and self.pipeline.pending:
+                return
+
+            task = self._next_task()
+            if task is None:
+                return
 
             # 任务间延迟
-            if self.iteration < len(pending_tasks):
+            if self._dispatched and self.config.delay > 0:
                 time.sleep(self.config.delay)
 
-        # 显示结果
-        show_summary_table(self.task_manager.tasks, self.task_manager.results)
-        show_statistics(self.task_manager.tasks, self.task_manager.results)
+            show_task_start(task)
 
-    def _execute_task(self, task) -> None:
-        """执行单个任务"""
-        show_task_start(task)
+            # 更新状态为进行中
+            self._set_status(task, TaskStatus.IN_PROGRESS)
+            self.scheduler.on_start(task)
+            self._dispatched += 1
+            checkpointer = self._begin_attempt(task)
+            future = self.pool.submit(self._run_attempt, task, self._feedback.pop(task.id, None), checkpointer)
+            self.running[future] = task
 
-        # 更新状态为进行中
-        self.task_manager.update_task_status(task.id, TaskStatus.IN_PROGRESS)
+    def _workdir(self, task: Task) -> Path:
+        return self._repo_dir(task) or Path(self.config.working_dir)
 
-        retry_count = 0
-        max_retries = self.config.max_retries if self.config.on_error == ErrorHandling.RETRY else 0
+    def _begin_attempt(self, task: Task) -> Optional[GitCheckpointer]:
+        """记录尝试所在的工作目录，返回可用的检查点器"""
+        if not self.config.checkpoint:
+            return None
 
-        while True:
-            # 执行任务
-            result = self.executor.run_task(task)
-            result.retry_count = retry_count
+        workdir = self._workdir(task)
+        active = self._attempts.setdefault(workdir, set())
+        if active:
+            self._overlapped.update(active)
+            self._overlapped.add(task.id)
+        active.add(task.id)
 
-            if result.success:
-                # 任务成功
-                self.task_manager.update_task_status(task.id, TaskStatus.COMPLETED)
-                self.task_manager.add_result(result)
-                show_task_complete(task, result)
+        if workdir not in self._checkpointers:
+            checkpointer = GitCheckpointer(workdir, ignore=self._own_files())
+            if not checkpointer.available:
+                self.logger.warning(f"{workdir} 不是 git 仓库，不创建检查点")
+                checkpointer = None
+            self._checkpointers[workdir] = checkpointer
+        return self._checkpointers[workdir]
+
+    def _end_attempt(self, task: Task, result: TaskResult) -> None:
+        """尝试结束 (含验收)：失败时回滚到检查点"""
+        checkpoint = self._checkpoints.pop(task.id, None)
+        if not self.config.checkpoint:
+            return
+        workdir = self._workdir(task)
+        self._attempts.get(workdir, set()).discard(task.id)
+        overlapped = task.id in self._overlapped
+        self._overlapped.discard(task.id)
+        if checkpoint is None or result.success:
+            return
+
+        if overlapped:
+            self.logger.warning(f"任务 {task.id} 与同目录中的其他任务同时执行，跳过回滚")
+            return
+
+        try:
+            rollback = self._checkpointers[workdir].rollback(checkpoint)
+        except CheckpointError as e:
+            self.logger.warning(f"任务 {task.id} 回滚失败: {e}")
+            return
+
+        result.attempt_tree = rollback.tree
+        result.checkpoint_time = (result.checkpoint_time or 0.0) + rollback.duration
+        if rollback.paths:
+            self._rollbacks += 1
+            self.logger.info(
+                f"任务 {task.id} 已回滚到检查点: 恢复 {len(rollback.restored)} 个文件，"
+                f"删除 {len(rollback.removed)} 个新文件 ({rollback.duration * 1000:.0f}ms，"
+                f"改动保存在 tree {rollback.tree[:12]})"
+            )
+
+    def _run_attempt(self, task: Task, feedback: Optional[str], checkpointer: Optional[GitCheckpointer] = None) -> TaskResult:
+        """在工作线程中执行一次尝试，需要验收时同时计算修改的文件"""
+        verifier = self._verifier_for(task)
+        unit = self._units.get(task.id)
+        context = {"task_id": task.id, "worker": threading.current_thread().name}
+        if unit is not None:
+            context["repo"] = unit.repo
+        with log_context(**context):
+            needs_verify = bool(verifier.commands_for(task))
+            snapshot = verifier.snapshot() if needs_verify else None
+
+            checkpoint = None
+            if checkpointer is not None:
+                try:
+                    checkpoint = checkpointer.create()
+                    self._checkpoints[task.id] = checkpoint
+                    self.logger.debug(f"检查点 {checkpoint.tree[:12]} ({checkpoint.duration * 1000:.0f}ms)")
+                except CheckpointError as e:
+                    self.logger.warning(f"创建检查点失败: {e}")
+
+            result = self.executor.run_task(task, feedback=feedback, working_dir=self._repo_dir(task))
+            result.retry_count = self._retry_counts.get(task.id, 0)
+            if checkpoint is not None:
+                result.checkpoint_time = checkpoint.duration
+            if unit is not None:
+                # 结果归属原任务，按仓库区分
+                result.task_id = unit.task_id
+                result.repo = unit.repo
+
+            if needs_verify and result.success:
+                self._changed[task.id] = verifier.changed_files(snapshot)
+            return result
+
+    def _on_task_done(self, task: Task, result: TaskResult) -> None:
+        """处理一次执行尝试的结果"""
+        changed = self._changed.pop(task.id, None)
+
+        if result.success:
+            if changed is not None:
+                # 提交验收，与后续任务重叠执行
+                show_task_verifying(task, len(changed))
+                self.pipeline.submit(task, result, changed, verifier=self._verifier_for(task))
                 return
 
-            # 任务失败，根据错误处理策略处理
-            if self.config.on_error == ErrorHandling.SKIP:
-                # 跳过
-                self.task_manager.update_task_status(task.id, TaskStatus.FAILED)
+            # 任务成功
+            self._end_attempt(task, result)
+            self._complete(task, result)
+            return
+
+        # 失败时先回滚，重试从干净的工作区开始
+        self._end_attempt(task, result)
+        if self._handle_failure(task, result):
+            if result.failure == FailureKind.STALLED:
+                self._feedback[task.id] = STALL_FEEDBACK
+            self.retry_queue.append(task)
+
+    def _apply_file_changes(self) -> None:
+        """合并任务文件的外部修改到调度器"""
+        self.task_manager.sync()
+        changes = self.task_manager.take_changes()
+        if not changes:
+            return
+
+        if self.config.dedup != "off" and changes.added:
+            self._flag_duplicates(changes.added)
+
+        now = time.time()
+        for task_id in changes.removed:
+            self._unqueue(task_id)
+
+        for task in changes.added + changes.updated:
+            if task.status == TaskStatus.TODO or (task.repos and task.status == TaskStatus.IN_PROGRESS):
+                # 新增或重新排序 (push 会先移除旧条目)；多仓库任务部分执行中时重新展开其余仓库
+                self._unqueue(task.id)
+                for unit in self._expand(task):
+                    self.scheduler.push(unit, now)
+            else:
+                # 被外部改为非待办
+                self._unqueue(task.id)
+
+        self.logger.info(
+            f"任务文件已更新: 新增 {len(changes.added)}，修改 {len(changes.updated)}，"
+            f"删除 {len(changes.removed)}，队列 {len(self.scheduler)}"
+        )
+
+    def _flag_duplicates(self, tasks: Optional[list[Task]] = None) -> None:
+        """跳过与已有任务重复的待办任务，近似重复按配置跳过或只提示"""
+        found = self.task_manager.flag_duplicates(
+            tasks, threshold=self.config.dedup_threshold, near=self.config.dedup == "near"
+        )
+        skipped = 0
+        for task, match in found:
+            kind = "完全重复" if match.exact else f"相似度 {match.similarity:.2f}"
+            if task.duplicate_of:
+                skipped += 1
+                self.logger.info(f"任务 {task.id} 与任务 {match.task_id} 重复 ({kind})，已跳过")
+            else:
+                self.logger.warning(f"任务 {task.id} 可能与任务 {match.task_id} 重复 ({kind})")
+        if skipped:
+            self.logger.warning(f"跳过 {skipped} 个重复任务 (ralphy task dedup 查看，--dedup off 关闭)")
+
+    def _unqueue(self, task_id: str) -> None:
+        """从调度器中移除任务及其尚未执行的仓库单元"""
+        self.scheduler.remove(task_id)
+        running = {task.id for task in self.running.values()}
+        for unit_id, unit in list(self._units.items()):
+            if unit.task_id == task_id and unit_id not in running:
+                self.scheduler.remove(unit_id)
+
+    def _complete(self, task: Task, result: TaskResult) -> None:
+        """标记任务完成"""
+        self._set_status(task, TaskStatus.COMPLETED)
+        self.task_manager.add_result(result)
+        show_task_complete(task, result)
+
+    def _handle_verified(
+        self,
+        finished: list[tuple[PendingVerification, VerifyResult]],
+        allow_retry: bool = True,
+    ) -> None:
+        """处理已完成的验收，失败时交给错误处理策略"""
+        for item, verify_result in finished:
+            task, result = item.task, item.result
+            show_verify_result(task, verify_result)
+            result.verified = verify_result.success
+
+            if verify_result.success:
+                self._end_attempt(task, result)
+                self._complete(task, result)
+                continue
+
+            result.success = False
+            result.error = "验收失败"
+            result.failure = FailureKind.VERIFY
+            result.verify_output = verify_result.output
+            self._end_attempt(task, result)
+
+            if allow_retry and self._handle_failure(task, result):
+                # 带上验收输出重新排队，优先于其他任务执行
+                self._feedback[task.id] = verify_result.output
+                self.retry_queue.append(task)
+            elif not allow_retry:
+                self._set_status(task, TaskStatus.FAILED)
                 self.task_manager.add_result(result)
-                show_task_complete(task, result)
-                return
 
-            elif self.config.on_error == ErrorHandling.RETRY:
-                # 重试
-                retry_count += 1
-                if retry_count <= max_retries:
-                    show_task_retry(task, retry_count, max_retries)
-                    time.sleep(1)  # 重试前等待
-                    continue
-                else:
-                    # 重试次数用尽
-                    self.task_manager.update_task_status(task.id, TaskStatus.FAILED)
-                    self.task_manager.add_result(result)
-                    show_task_complete(task, result)
-                    return
+    def _handle_failure(self, task: Task, result: TaskResult) -> bool:
+        """根据错误处理策略处理失败，返回是否需要重试"""
+        retry_count = self._retry_counts.get(task.id, 0)
+        max_retries = self.config.max_retries if self.config.on_error == ErrorHandling.RETRY else 0
+
+        if result.failure == FailureKind.STALLED and self.config.stall_retries is not None:
+            # 停滞的会话按单独的重试次数处理，不受错误处理策略影响
+            retry_count += 1
+            if retry_count <= self.config.stall_retries:
+                self._retry_counts[task.id] = retry_count
+                show_task_retry(task, retry_count, self.config.stall_retries)
+                return True
+            self._set_status(task, TaskStatus.FAILED)
+            self.task_manager.add_result(result)
+            show_task_complete(task, result)
+            return False
 
-            elif self.config.on_error == ErrorHandling.PAUSE:
-                # 暂停询问
+        # 任务失败，根据错误处理策略处理
+        if self.config.on_error == ErrorHandling.SKIP:
+            # 跳过
+            self._set_status(task, TaskStatus.FAILED)
+            self.task_manager.add_result(result)
+            show_task_complete(task, result)
+            return False
+
+        elif self.config.on_error == ErrorHandling.RETRY:
+            # 重试
+            retry_count += 1
+            if retry_count <= max_retries:
+                self._retry_counts[task.id] = retry_count
+                show_task_retry(task, retry_count, max_retries)
+                time.sleep(1)  # 重试前等待
+                return True
+            else:
+                # 重试次数用尽
+                self._set_status(task, TaskStatus.FAILED)
+                self.task_manager.add_result(result)
                 show_task_complete(task, result)
-                choice = ask_choice(
-                    "选择操作",
-                    choices=["r", "s", "q"],
-                )
+                return False
 
-                if choice == "r":
-                    # 重试
-                    retry_count += 1
-                    continue
-                elif choice == "s":
-                    # 跳过
-                    self.task_manager.update_task_status(task.id, TaskStatus.SKIPPED)
-                    result.retry_count = retry_count
-                    self.task_manager.add_result(result)
-                    show_task_skipped(task)
-                    return
-                else:
-                    # 退出
-                    self.task_manager.update_task_status(task.id, TaskStatus.FAILED)
-                    self.task_manager.add_result(result)
-                    raise KeyboardInterrupt("用户选择退出")
+        else:
+            # 暂停询问
+            show_task_complete(task, result)
+            choice = ask_choice(
+                "选择操作",
+                choices=["r", "s", "q"],
+            )
+
+            if choice == "r":
+                # 重试
+                self._retry_counts[task.id] = retry_count + 1
+                return True
+            elif choice == "s":
+                # 跳过
+                self._set_status(task, TaskStatus.SKIPPED)
+                result.retry_count = retry_count
+                self.task_manager.add_result(result)
+                show_task_skipped(task)
+                return False
+            else:
+                # 退出
+                self._set_status(task, TaskStatus.FAILED)
+                self.task_manager.add_result(result)
+                raise KeyboardInterrupt("用户选择退出")
@@ -0,0 +1,455 @@
+"""子进程管理模块
+
+每个 claude 会话运行在独立的会话 (进程组) 中，超时或中断时整组终止，
+避免 Claude 启动的测试、构建、dev server 等子进程成为孤儿进程。
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import resource
+except ImportError:  # 非 POSIX 平台
+    resource = None
+
+from .logger import get_logger
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# 发送 SIGTERM 后等待进程组退出的宽限时间
+KILL_GRACE_SECONDS = 3.0
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+@dataclass
+class ResourceLimits:
+    """子进程资源限制，None 表示不限制"""
+    cpu_seconds: Optional[int] = None
+    memory_mb: Optional[int] = None
+    max_open_files: Optional[int] = None
+    use_cgroup: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return any(v is not None for v in (self.cpu_seconds, self.memory_mb, self.max_open_files))
+
+
+@dataclass
+class ProcessUsage:
+    """子进程树资源使用情况"""
+    peak_rss_mb: Optional[float] = None
+    cpu_time: Optional[float] = None
+
+
+class CgroupV2:
+    """cgroup v2 子组，用于限制并统计整个进程树
+
+    仅在当前进程所在 cgroup 可写且启用了 memory/cpu 控制器时可用。
+    """
+
+    _counter = 0
+    _lock = threading.Lock()
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @classmethod
+    def create(cls, limits: ResourceLimits) -> Optional["CgroupV2"]:
+        """在当前 cgroup 下创建子组，失败返回 None"""
+        if not (CGROUP_ROOT / "cgroup.controllers").exists():
+            return None
+
+        try:
+            with open("/proc/self/cgroup", "r", encoding="utf-8") as f:
+                line = next((l for l in f if l.startswith("0::")), None)
+            if line is None:
+                return None
+
+            parent = CGROUP_ROOT / line.strip()[3:].lstrip("/")
+            with cls._lock:
+                cls._counter += 1
+                name = f"ralphy-{os.getpid()}-{cls._counter}"
+            path = parent / name
+            path.mkdir()
+        except (OSError, StopIteration):
+            return None
+
+        cgroup = cls(path)
+        try:
+            # cgroup 没有 CPU 总时长限制，CPU 时间仍由 rlimit 控制
+            if limits.memory_mb is not None:
+                cgroup._write("memory.max", str(limits.memory_mb * 1024 * 1024))
+        except OSError:
+            cgroup.remove()
+            return None
+
+        return cgroup
+
+    def _write(self, name: str, value: str) -> None:
+        (self.path / name).write_text(value, encoding="utf-8")
+
+    def _read(self, name: str) -> Optional[str]:
+        try:
+            return (self.path / name).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def attach(self, pid: int) -> None:
+        """将进程加入该 cgroup"""
+        self._write("cgroup.procs", str(pid))
+
+    def usage(self) -> ProcessUsage:
+        """读取整个进程树的峰值内存和 CPU 时间"""
+        usage = ProcessUsage()
+
+        peak = self._read("memory.peak")
+        if peak and peak.strip().isdigit():
+            usage.peak_rss_mb = int(peak) / (1024 * 1024)
+
+        stat = self._read("cpu.stat")
+        if stat:
+            for line in stat.splitlines():
+                key, _, value = line.partition(" ")
+                if key == "usage_usec":
+                    usage.cpu_time = int(value) / 1_000_000
+                    break
+
+        return usage
+
+    def kill(self) -> None:
+        """终止 cgroup 内所有进程"""
+        try:
+            self._write("cgroup.kill", "1")
+        except OSError:
+            pass
+
+    def remove(self) -> None:
+        try:
+            self.path.rmdir()
+        except OSError:
+            pass
+
+
+def _session_stats(sid: int) -> Optional[list[tuple[int, list[bytes]]]]:
+    """从 /proc 扫描会话内的进程，返回 (pid, stat 字段)，非 Linux 返回 None"""
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+
+    procs = []
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 进程名可能包含空格和括号，从最后一个 ")" 之后解析
+        fields = stat[stat.rfind(b")") + 2:].split()
+        if len(fields) < 15 or int(fields[3]) != sid:
+            continue
+        procs.append((int(pid), fields))
+    return procs
+
+
+def _session_cpu(sid: int) -> Optional[float]:
+    """汇总会话内进程的 CPU 时间 (秒)，非 Linux 返回 None"""
+    procs = _session_stats(sid)
+    if procs is None:
+        return None
+    # utime, stime, cutime, cstime
+    ticks = sum(int(v) for _, fields in procs for v in fields[11:15])
+    return ticks / _CLOCK_TICKS
+
+
+def _rlimits(limits: ResourceLimits) -> list[tuple[int, int, int]]:
+    """需要设置的 (资源, 软限制, 硬限制)"""
+    if resource is None or not limits.enabled:
+        return []
+    rlimits = []
+    if limits.cpu_seconds is not None:
+        rlimits.append((resource.RLIMIT_CPU, limits.cpu_seconds, limits.cpu_seconds + 5))
+    if limits.memory_mb is not None and not limits.use_cgroup:
+        # Linux 不强制 RLIMIT_RSS，用地址空间上限近似
+        size = limits.memory_mb * 1024 * 1024
+        rlimits.append((resource.RLIMIT_AS, size, size))
+    if limits.max_open_files is not None:
+        rlimits.append((resource.RLIMIT_NOFILE, limits.max_open_files, limits.max_open_files))
+    return rlimits
+
+
+def _wrap_ulimit(cmd: list[str], limits: ResourceLimits) -> list[str]:
+    """没有 prlimit 的平台上，用 shell 的 ulimit 在 exec 前设置限制"""
+    options = []
+    if limits.cpu_seconds is not None:
+        options.append(f"ulimit -t {limits.cpu_seconds}")
+    if limits.memory_mb is not None and not limits.use_cgroup:
+        options.append(f"ulimit -v {limits.memory_mb * 1024}")
+    if limits.max_open_files is not None:
+        options.append(f"ulimit -n {limits.max_open_files}")
+    if not options:
+        return cmd
+    return ["/bin/sh", "-c", " && ".join(options) + ' && exec "$@"', "sh", *cmd]
+
+
+class ChildProcess:
+    """运行在独立进程组中的子进程
+
+    stdout/stderr 由后台线程持续读取，退出状态通过 wait4 获取，
+    以便记录整个进程树的资源使用。stdout 交给 ``on_stdout`` 逐行处理时，
+    可以设置 ``capture_stdout=False`` 不再保留原始输出。
+
+    ``stdin_pipe=True`` 时输入通过 ``send_input`` 写入；``hold_output=True`` 时
+    输出先暂存，``attach`` 设置回调后再交付 (供预热池提前启动进程)。
+    """
+
+    def __init__(
+        self,
+        cmd: list[str],
+        cwd: Optional[Path] = None,
+        limits: Optional[ResourceLimits] = None,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        capture_stdout: bool = True,
+        on_stderr: Optional[Callable[[str], None]] = None,
+        stdin_pipe: bool = False,
+        hold_output: bool = False,
+    ):
+        self.cmd = cmd
+        self.limits = limits or ResourceLimits()
+        self.logger = get_logger()
+        self.on_stdout = on_stdout
+        self.on_stderr = on_stderr
+        self.capture_stdout = capture_stdout
+
+        self.cgroup: Optional[CgroupV2] = None
+        if self.limits.use_cgroup:
+            self.cgroup = CgroupV2.create(self.limits)
+            if self.cgroup is None:
+                self.logger.debug("cgroup v2 不可用，回退到 rlimit")
+                self.limits = ResourceLimits(
+                    cpu_seconds=self.limits.cpu_seconds,
+                    memory_mb=self.limits.memory_mb,
+                    max_open_files=self.limits.max_open_files,
+                )
+
+        self._stdout: list[str] = []
+        self._stderr: list[str] = []
+        self._status: Optional[int] = None
+        self._rusage = None
+        self.killed = False
+
+        self._output_lock = threading.Lock()
+        self._held: Optional[list[tuple[bool, str]]] = [] if hold_output else None
+        # 写入输入的时间与第一行 stdout 的时间 (time.time())
+        self.input_time: Optional[float] = None
+        self.first_output: Optional[float] = None
+
+        # 主进程中有工作线程、日志线程等多个线程，不能使用 preexec_fn
+        # (fork 后执行 Python 代码可能死锁)：Linux 上启动后用 prlimit 设置，
+        # 其他平台由 shell 包装在 exec 前设置
+        rlimits = _rlimits(self.limits)
+        use_prlimit = hasattr(resource, "prlimit")
+        if rlimits and not use_prlimit:
+            cmd = _wrap_ulimit(cmd, self.limits)
+
+        self.proc = subprocess.Popen(
+            cmd,
+            cwd=cwd,
+            stdin=subprocess.PIPE if stdin_pipe else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            start_new_session=True,
+        )
+        self.pid = self.proc.pid
+        self.start_time = time.time()
+
+        if rlimits and use_prlimit:
+            # 子进程此时通常还没有创建自己的子进程，之后的子进程会继承这些限制
+            for which, soft, hard in rlimits:
+                try:
+                    resource.prlimit(self.pid, which, (soft, hard))
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"设置资源限制失败: {e}")
+
+        if self.cgroup is not None:
+            try:
+                self.cgroup.attach(self.pid)
+            except OSError:
+                self.logger.debug("加入 cgroup 失败")
+
+        self._readers = [
+            threading.Thread(target=self._read_stream, args=(self.proc.stdout, True), daemon=True),
+            threading.Thread(target=self._read_stream, args=(self.proc.stderr, False), daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+        self._waiter = threading.Thread(target=self._wait4, daemon=True)
+        self._waiter.start()
+
+    def _read_stream(self, stream, is_stdout: bool) -> None:
+        for line in stream:
+            if is_stdout and self.first_output is None:
+                self.first_output = time.time()
+            with self._output_lock:
+                if self._held is not None:
+                    self._held.append((is_stdout, line))
+                else:
+                    self._deliver(is_stdout, line)
+        stream.close()
+
+    def _deliver(self, is_stdout: bool, line: str) -> None:
+        if is_stdout:
+            if self.capture_stdout:
+                self._stdout.append(line)
+            if self.on_stdout is not None:
+                self.on_stdout(line)
+        else:
+            self._stderr.append(line)
+            if self.on_stderr is not None:
+                self.on_stderr(line)
+
+    def attach(
+        self,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        on_stderr: Optional[Callable[[str], None]] = None,
+        capture_stdout: bool = True,
+    ) -> None:
+        """设置输出回调并交付暂存的输出"""
+        with self._output_lock:
+            self.on_stdout = on_stdout
+            self.on_stderr = on_stderr
+            self.capture_stdout = capture_stdout
+            held, self._held = self._held or [], None
+            for is_stdout, line in held:
+                self._deliver(is_stdout, line)
+
+    def send_input(self, text: str) -> None:
+        """写入全部输入并关闭 stdin"""
+        self.input_time = time.time()
+        # 启动阶段的输出不计入首个输出时间
+        self.first_output = None
+        try:
+            self.proc.stdin.write(text)
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            # 进程已退出，由返回码反映
+            pass
+
+    @property
+    def time_to_first_output(self) -> Optional[float]:
+        """从写入输入 (或启动) 到第一行 stdout 的秒数"""
+        if self.first_output is None:
+            return None
+        return max(0.0, self.first_output - (self.input_time or self.start_time))
+
+    def _wait4(self) -> None:
+        _, status, rusage = os.wait4(self.pid, 0)
+        self._rusage = rusage
+        self._status = status
+        # 已由 wait4 回收，避免 Popen 再次 waitpid
+        self.proc.returncode = os.waitstatus_to_exitcode(status)
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.proc.returncode if self._status is not None else None
+
+    @property
+    def stdout(self) -> str:
+        return "".join(self._stdout)
+
+    @property
+    def stderr(self) -> str:
+        return "".join(self._stderr)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待进程退出，返回是否已退出"""
+        self._waiter.join(timeout)
+        if self._waiter.is_alive():
+            return False
+        for reader in self._readers:
+            reader.join(timeout=1.0)
+        return True
+
+    def kill_tree(self) -> None:
+        """终止整个进程树：先 SIGTERM，宽限期后 SIGKILL"""
+        self.killed = True
+        self._signal_tree(signal.SIGTERM)
+
+        if not self.wait(KILL_GRACE_SECONDS):
+            self._signal_tree(signal.SIGKILL)
+            self.wait()
+        else:
+            # 主进程已退出，清理残留的后代进程
+            self._signal_tree(signal.SIGKILL)
+
+    def _signal_tree(self, sig: int) -> None:
+        """向进程组及会话内的所有进程发送信号 (后代可能创建了自己的进程组)"""
+        try:
+            os.killpg(self.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+        for pid, _ in _session_stats(self.pid) or []:
+            try:
+                os.kill(pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+        if sig == signal.SIGKILL and self.cgroup is not None:
+            self.cgroup.kill()
+
+    def usage(self) -> ProcessUsage:
+        """获取进程树资源使用，优先使用 cgroup 统计"""
+        if self.cgroup is not None:
+            usage = self.cgroup.usage()
+            if usage.peak_rss_mb is not None or usage.cpu_time is not None:
+                return usage
+
+        if self._rusage is None:
+            return ProcessUsage()
+
+        # wait4 的统计包含子进程已回收的后代；Linux 下 ru_maxrss 单位为 KB
+        return ProcessUsage(
+            peak_rss_mb=self._rusage.ru_maxrss / 1024,
+            cpu_time=self._rusage.ru_utime + self._rusage.ru_stime,
+        )
+
+    def cpu_time_live(self) -> Optional[float]:
+        """运行中进程树已使用的 CPU 时间，无法统计时返回 None
+
+        优先读取 cgroup；否则汇总 /proc 中同一会话的进程 (含其已回收子进程)
+        的用户态和内核态时间。按会话而非进程组统计，以包含 timeout 等自建进程组
+        的后代；已退出且未被会话内进程回收的进程不计入。
+        """
+        if self.cgroup is not None:
+            cpu = self.cgroup.usage().cpu_time
+            if cpu is not None:
+                return cpu
+        return _session_cpu(self.pid)
+
+    def close(self) -> None:
+        """回收资源，确保进程组内不留残余进程"""
+        if self._status is None:
+            self.kill_tree()
+        else:
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        if self.cgroup is not None:
+            self.cgroup.kill()
+            self.cgroup.remove()
+        if self.proc.stdin is not None and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
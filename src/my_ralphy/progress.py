@@ -0,0 +1,100 @@
+"""会话进展监控
+
+挂起的会话 (等待交互输入、死锁的测试、不退出的 dev server) 会一直占用 worker
+直到超时。``ProgressMonitor`` 在会话运行期间定期检查三类进展信号：
+
+- 输出：stdout/stderr 有新行 (开启检测时 claude 以 stream-json 逐事件输出)
+- 工作区：工作目录中有文件或目录的 mtime 晚于上次检查
+- CPU：进程树的 CPU 时间在检查间隔内的增长超过 ``CPU_ACTIVE_RATIO``
+
+连续 ``window`` 秒没有任何进展的会话被判定为停滞。工作区扫描只在其他信号
+都没有进展时进行，找到第一个新修改的文件即停止。
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from .verifier import SKIP_DIRS
+
+# 检查间隔内 CPU 时间占墙钟时间的比例超过该值视为有进展 (空闲的 claude 进程远低于此)
+CPU_ACTIVE_RATIO = 0.05
+
+# 检查间隔的上下限 (秒)
+MIN_INTERVAL = 1.0
+MAX_INTERVAL = 15.0
+
+
+def tree_modified_since(root: Path, since: float, ignore: Iterable[str] = ()) -> bool:
+    """工作目录中是否有文件或目录在 since (时间戳) 之后被修改"""
+    # 遍历路径与忽略列表都使用绝对路径，否则 "-d ." 时 "./ralph.log" 与 "ralph.log" 不匹配
+    root = Path(root).resolve()
+    ignored = {str((root / name).resolve()) for name in ignore}
+    for current, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        # 新建或删除文件会更新所在目录的 mtime
+        for path in [current] + [os.path.join(current, name) for name in files]:
+            if path in ignored:
+                continue
+            try:
+                if os.stat(path).st_mtime >= since:
+                    return True
+            except OSError:
+                continue
+    return False
+
+
+class ProgressMonitor:
+    """单个会话的进展监控"""
+
+    def __init__(
+        self,
+        working_dir: Path,
+        window: float,
+        cpu_reader: Optional[Callable[[], Optional[float]]] = None,
+        ignore: Iterable[str] = (),
+    ):
+        self.working_dir = Path(working_dir)
+        self.window = window
+        self.interval = min(max(window / 4, MIN_INTERVAL), MAX_INTERVAL)
+        self.cpu_reader = cpu_reader
+        self.ignore = list(ignore)
+
+        now = time.monotonic()
+        self.last_progress = now
+        self.last_signal = "启动"
+        self._last_check = now
+        self._cpu = cpu_reader() if cpu_reader else None
+
+    def touch(self, _line: str = "") -> None:
+        """记录一次输出 (供 ChildProcess 的输出回调使用)"""
+        self.last_progress = time.monotonic()
+        self.last_signal = "输出"
+
+    @property
+    def idle(self) -> float:
+        """距上次进展的秒数"""
+        return time.monotonic() - self.last_progress
+
+    def check(self) -> bool:
+        """检查一次进展，返回会话是否已停滞"""
+        now = time.monotonic()
+        elapsed = now - self._last_check
+        self._last_check = now
+
+        if self.cpu_reader is not None:
+            cpu = self.cpu_reader()
+            if cpu is not None and self._cpu is not None and cpu - self._cpu >= CPU_ACTIVE_RATIO * elapsed:
+                self.last_progress = now
+                self.last_signal = "CPU"
+            self._cpu = cpu
+
+        if now - self.last_progress >= self.interval:
+            # 查找上次进展之后的修改
+            since = time.time() - (now - self.last_progress)
+            if tree_modified_since(self.working_dir, since, self.ignore):
+                self.last_progress = now
+                self.last_signal = "文件修改"
+
+        return now - self.last_progress >= self.window
@@ -0,0 +1,348 @@
+"""任务调度策略
+
+所有策略共享同一接口，供 ``TaskFileMode`` 和离线模拟器使用：
+
+- ``priority``: 严格按优先级 (默认，与 ``get_pending_tasks`` 一致)
+- ``aging``: 优先级随等待时间增长，避免低优先级任务饿死
+- ``fair``: 按标签加权公平排队，单个标签无法占满所有 worker
+- ``sjf``: 按历史耗时估计的最短任务优先
+
+任一策略都可叠加按标签的并发上限 (``tag_caps``)。
+"""
+
+import heapq
+import itertools
+import statistics
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict, deque
+from typing import Iterable, Optional
+
+from .models import Task, TaskResult
+
+# 没有历史数据时的默认耗时估计 (秒)
+DEFAULT_DURATION = 60.0
+
+# 没有标签的任务归入的分组
+UNTAGGED = "_untagged"
+
+
+class DurationModel:
+    """基于历史结果的任务耗时估计
+
+    优先使用同一任务的历史耗时，其次是同标签任务的中位数，最后是全局中位数。
+    中位数在样本数增长超过 10% 后才重新计算，大批量观测时开销保持平摊。
+    """
+
+    def __init__(self, default: float = DEFAULT_DURATION):
+        self.default = default
+        self._by_task: dict[str, list[float]] = defaultdict(list)
+        self._by_tag: dict[str, list[float]] = defaultdict(list)
+        self._all: list[float] = []
+        # 缓存的中位数及计算时的样本数
+        self._medians: dict[Optional[str], tuple[float, int]] = {}
+
+    @classmethod
+    def from_results(cls, results: Iterable[TaskResult], tasks: Iterable[Task]) -> "DurationModel":
+        """从历史执行结果构建"""
+        model = cls()
+        tags = {task.id: task.tags for task in tasks}
+        for result in results:
+            model.observe(result.task_id, tags.get(result.task_id, []), result.duration)
+        return model
+
+    def copy(self) -> "DurationModel":
+        """复制一份独立的模型 (调度器会在任务结束时更新模型)"""
+        model = DurationModel(self.default)
+        for task_id, samples in self._by_task.items():
+            model._by_task[task_id] = list(samples)
+        for tag, samples in self._by_tag.items():
+            model._by_tag[tag] = list(samples)
+        model._all = list(self._all)
+        return model
+
+    def observe(self, task_id: str, tags: list[str], duration: float) -> None:
+        """记录一次执行耗时"""
+        self._by_task[task_id].append(duration)
+        for tag in tags or [UNTAGGED]:
+            self._by_tag[tag].append(duration)
+        self._all.append(duration)
+
+    def _median(self, key: Optional[str], samples: list[float]) -> float:
+        cached = self._medians.get(key)
+        if cached is None or len(samples) > cached[1] * 1.1:
+            cached = (statistics.median(samples), len(samples))
+            self._medians[key] = cached
+        return cached[0]
+
+    def estimate(self, task: Task) -> float:
+        """估计任务耗时"""
+        history = self._by_task.get(task.id)
+        if history:
+            return sum(history) / len(history)
+
+        estimates = [
+            self._median(tag, self._by_tag[tag])
+            for tag in task.tags or [UNTAGGED]
+            if tag in self._by_tag
+        ]
+        if estimates:
+            return max(estimates)
+
+        if self._all:
+            return self._median(None, self._all)
+        return self.default
+
+
+class Scheduler(ABC):
+    """调度器基类
+
+    子类实现 ``_push`` / ``_pop_candidate`` / ``_restore``；基类负责惰性删除、
+    按标签并发上限和运行中计数。条目携带入队序号，任务被重新入队后旧条目失效。
+    受并发上限限制的条目按标签暂存，该标签每结束一个任务放回一个，
+    避免每次出队都重复扫描被挡住的任务。
+    """
+
+    name = ""
+
+    def __init__(self, tag_caps: Optional[dict[str, int]] = None):
+        self.tag_caps = tag_caps or {}
+        self.running: Counter = Counter()
+        self._queued: dict[str, int] = {}
+        self._parked: dict[str, deque] = defaultdict(deque)
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._queued
+
+    def push(self, task: Task, now: float = 0.0) -> None:
+        """任务入队 (已在队列中的任务会先移除，用于重新排序)"""
+        seq = next(self._seq)
+        self._queued[task.id] = seq
+        self._push(task, now, seq)
+
+    def remove(self, task_id: str) -> None:
+        """任务出队 (惰性删除)"""
+        self._queued.pop(task_id, None)
+
+    def _live(self, task: Task, seq: int) -> bool:
+        return self._queued.get(task.id) == seq
+
+    def _blocking_tag(self, task: Task) -> Optional[str]:
+        for tag in task.tags:
+            cap = self.tag_caps.get(tag)
+            if cap is not None and self.running[tag] >= cap:
+                return tag
+        return None
+
+    def can_start(self, task: Task) -> bool:
+        """任务当前是否不受按标签并发上限限制 (用于不经过队列的重试)"""
+        return self._blocking_tag(task) is None
+
+    def pop(self, now: float = 0.0) -> Optional[Task]:
+        """取出下一个可执行任务，受并发上限限制时返回 None"""
+        while True:
+            item = self._pop_candidate(now)
+            if item is None:
+                return None
+            task, entry = item
+            tag = self._blocking_tag(task)
+            if tag is None:
+                del self._queued[task.id]
+                self._on_pop(task, entry)
+                return task
+            self._parked[tag].append((task, self._queued[task.id], entry))
+
+    def on_start(self, task: Task) -> None:
+        """任务开始执行"""
+        for tag in task.tags:
+            self.running[tag] += 1
+
+    def on_finish(self, task: Task, duration: float) -> None:
+        """任务执行结束，每个标签空出一个名额，放回一个暂存的条目"""
+        for tag in task.tags:
+            self.running[tag] -= 1
+            parked = self._parked.get(tag)
+            while parked:
+                # 暂存后被移除或重新入队的条目已失效，继续放回下一个
+                parked_task, seq, entry = parked.popleft()
+                if self._live(parked_task, seq):
+                    self._restore(entry)
+                    break
+
+    def _on_pop(self, task: Task, entry: object) -> None:
+        """任务被选中执行 (子类可用于记账)"""
+
+    @abstractmethod
+    def _push(self, task: Task, now: float, seq: int) -> None:
+        """按策略入队"""
+
+    @abstractmethod
+    def _pop_candidate(self, now: float) -> Optional[tuple[Task, object]]:
+        """取出下一个候选 (已跳过惰性删除的任务)，返回任务及其内部条目"""
+
+    @abstractmethod
+    def _restore(self, entry: object) -> None:
+        """放回 _pop_candidate 取出但未执行的条目"""
+
+
+class _HeapScheduler(Scheduler):
+    """基于单个堆的调度器，子类提供排序键"""
+
+    def __init__(self, tag_caps: Optional[dict[str, int]] = None):
+        super().__init__(tag_caps)
+        self._heap: list = []
+
+    def _key(self, task: Task, now: float) -> tuple:
+        raise NotImplementedError
+
+    def _push(self, task: Task, now: float, seq: int) -> None:
+        heapq.heappush(self._heap, (self._key(task, now), seq, task))
+
+    def _pop_candidate(self, now: float) -> Optional[tuple[Task, object]]:
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._live(entry[2], entry[1]):
+                return entry[2], entry
+        return None
+
+    def _restore(self, entry: object) -> None:
+        heapq.heappush(self._heap, entry)
+
+
+class PriorityScheduler(_HeapScheduler):
+    """严格优先级，同优先级按入队顺序"""
+
+    name = "priority"
+
+    def _key(self, task: Task, now: float) -> tuple:
+        return (-task.priority,)
+
+
+class AgingScheduler(_HeapScheduler):
+    """带老化的优先级
+
+    有效优先级 = priority + rate * 等待时间。所有任务以相同速率老化，
+    因此等价于按 ``priority - rate * 入队时间`` 排序，可以使用静态堆。
+    """
+
+    name = "aging"
+
+    def __init__(self, rate: float = 1 / 60, tag_caps: Optional[dict[str, int]] = None):
+        super().__init__(tag_caps)
+        self.rate = rate
+
+    def _key(self, task: Task, now: float) -> tuple:
+        return (-(task.priority - self.rate * now),)
+
+
+class ShortestJobFirstScheduler(_HeapScheduler):
+    """最短预期任务优先，预期耗时来自历史数据"""
+
+    name = "sjf"
+
+    def __init__(self, model: Optional[DurationModel] = None, tag_caps: Optional[dict[str, int]] = None):
+        super().__init__(tag_caps)
+        self.model = model or DurationModel()
+
+    def _key(self, task: Task, now: float) -> tuple:
+        return (self.model.estimate(task), -task.priority)
+
+    def on_finish(self, task: Task, duration: float) -> None:
+        super().on_finish(task, duration)
+        self.model.observe(task.id, task.tags, duration)
+
+
+class FairShareScheduler(Scheduler):
+    """按标签加权公平排队
+
+    每个任务归入其第一个标签的分组。每次选择「已获得服务量 / 权重」最小的
+    非空分组，服务量按预期耗时累计；分组内按优先级排序。分组重新变为
+    非空时，服务量提升到当前活跃分组的最小值，防止空闲期积攒额度。
+    """
+
+    name = "fair"
+
+    def __init__(
+        self,
+        weights: Optional[dict[str, float]] = None,
+        model: Optional[DurationModel] = None,
+        tag_caps: Optional[dict[str, int]] = None,
+    ):
+        super().__init__(tag_caps)
+        self.weights = weights or {}
+        self.model = model or DurationModel()
+        self._queues: dict[str, list] = defaultdict(list)
+        self._served: dict[str, float] = defaultdict(float)
+
+    @staticmethod
+    def _group(task: Task) -> str:
+        return task.tags[0] if task.tags else UNTAGGED
+
+    def _push(self, task: Task, now: float, seq: int) -> None:
+        group = self._group(task)
+        queue = self._queues[group]
+        if not queue:
+            active = [self._served[g] for g, q in self._queues.items() if q and g != group]
+            if active:
+                self._served[group] = max(self._served[group], min(active))
+        heapq.heappush(queue, (-task.priority, seq, task))
+
+    def _pop_candidate(self, now: float) -> Optional[tuple[Task, object]]:
+        best = None
+        for group, queue in self._queues.items():
+            while queue and not self._live(queue[0][2], queue[0][1]):
+                heapq.heappop(queue)
+            if not queue:
+                continue
+            share = self._served[group] / self.weights.get(group, 1.0)
+            key = (share, queue[0][0], queue[0][1])
+            if best is None or key < best[0]:
+                best = (key, group)
+        if best is None:
+            return None
+
+        group = best[1]
+        entry = heapq.heappop(self._queues[group])
+        return entry[2], (group, entry)
+
+    def _on_pop(self, task: Task, entry: object) -> None:
+        # 按预期耗时累计服务量
+        self._served[entry[0]] += self.model.estimate(task)
+
+    def _restore(self, entry: object) -> None:
+        group, item = entry
+        heapq.heappush(self._queues[group], item)
+
+    def on_finish(self, task: Task, duration: float) -> None:
+        super().on_finish(task, duration)
+        self.model.observe(task.id, task.tags, duration)
+
+
+SCHEDULERS = {
+    PriorityScheduler.name: PriorityScheduler,
+    AgingScheduler.name: AgingScheduler,
+    FairShareScheduler.name: FairShareScheduler,
+    ShortestJobFirstScheduler.name: ShortestJobFirstScheduler,
+}
+
+
+def make_scheduler(
+    name: str,
+    model: Optional[DurationModel] = None,
+    tag_weights: Optional[dict[str, float]] = None,
+    tag_caps: Optional[dict[str, int]] = None,
+    aging_rate: float = 1 / 60,
+) -> Scheduler:
+    """按名称创建调度器"""
+    if name == PriorityScheduler.name:
+        return PriorityScheduler(tag_caps=tag_caps)
+    if name == AgingScheduler.name:
+        return AgingScheduler(rate=aging_rate, tag_caps=tag_caps)
+    if name == FairShareScheduler.name:
+        return FairShareScheduler(weights=tag_weights, model=model, tag_caps=tag_caps)
+    if name == ShortestJobFirstScheduler.name:
+        return ShortestJobFirstScheduler(model=model, tag_caps=tag_caps)
+    raise ValueError(f"未知的调度策略: {name} (可选: {', '.join(SCHEDULERS)})")
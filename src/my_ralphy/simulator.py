@@ -0,0 +1,358 @@
+"""离线调度模拟器
+
+用离散事件模拟代替真实的 claude 调用，回放历史 (``ralph_results.json``) 或
+合成的耗时/失败分布，经由与 ``TaskFileMode`` 相同的调度器选择任务，
+评估不同 worker 数、超时、重试和延迟配置下的完工时间、利用率和尾延迟。
+
+模拟遵循 ``TaskFileMode`` 的派发语义：
+
+- 重试队列优先于调度器中的新任务，同样受按标签并发上限限制
+- 相邻两次派发至少间隔 ``delay`` 秒
+- 失败后重试前主循环等待 ``RETRY_WAIT`` 秒
+- pause 策略按 skip 处理 (模拟中无人应答)
+
+每个任务的耗时和成败从以任务 ID 派生的独立随机流中抽取，与派发顺序无关，
+不同调度策略面对的是同一组任务。任务默认在开始时全部到达，也可以按泊松过程
+陆续到达；延迟从到达开始计算，并按标签和优先级分组统计，便于比较公平性和饥饿。
+
+任务验收不在模拟范围内。
+"""
+
+import heapq
+import itertools
+import math
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional
+
+from .models import ErrorHandling, FailureKind, Task, TaskResult, TaskStatus
+from .scheduler import UNTAGGED, DurationModel, make_scheduler
+
+# 与 TaskFileMode 中失败重试前的等待一致
+RETRY_WAIT = 1.0
+
+# 超时的历史记录视为在任何超时内都无法完成
+NEVER_FINISHES = math.inf
+
+
+@dataclass
+class Attempt:
+    """一次模拟执行的结果"""
+    duration: float
+    success: bool
+
+
+class Workload:
+    """任务耗时与失败分布
+
+    经验分布按任务的第一个标签分组，从同组历史记录中有放回抽样；
+    合成分布为对数正态耗时加固定失败率。
+    """
+
+    def __init__(
+        self,
+        samples: Optional[dict[str, list[tuple[float, bool]]]] = None,
+        median: float = 60.0,
+        sigma: float = 0.8,
+        fail_rate: float = 0.0,
+    ):
+        self.samples = samples or {}
+        self._all = [s for group in self.samples.values() for s in group]
+        self.median = median
+        self.sigma = sigma
+        self.fail_rate = fail_rate
+
+    @classmethod
+    def from_results(cls, results: Iterable[TaskResult], tasks: Iterable[Task]) -> Optional["Workload"]:
+        """从历史执行结果构建经验分布，没有记录时返回 None"""
+        tags = {task.id: task.tags for task in tasks}
+        samples: dict[str, list[tuple[float, bool]]] = {}
+        for result in results:
+            group = (tags.get(result.task_id) or [UNTAGGED])[0]
+            if result.failure == FailureKind.TIMEOUT or (
+                result.failure is None and result.error and result.error.startswith("执行超时")
+            ):
+                sample = (NEVER_FINISHES, False)
+            else:
+                sample = (result.duration, result.success)
+            samples.setdefault(group, []).append(sample)
+        if not samples:
+            return None
+        return cls(samples=samples)
+
+    @property
+    def empirical(self) -> bool:
+        return bool(self._all)
+
+    def sample(self, task: Task, rng: random.Random) -> tuple[float, bool]:
+        """抽样一次执行的 (耗时, 是否成功)"""
+        if self._all:
+            group = self.samples.get(task.tags[0] if task.tags else UNTAGGED) or self._all
+            return group[rng.randrange(len(group))]
+        duration = self.median * math.exp(self.sigma * rng.gauss(0.0, 1.0))
+        return duration, rng.random() >= self.fail_rate
+
+    def describe(self) -> str:
+        if self._all:
+            return f"历史记录 {len(self._all)} 条，{len(self.samples)} 个标签分组"
+        return f"对数正态 (中位数 {self.median:.0f}s，σ={self.sigma})，失败率 {self.fail_rate:.0%}"
+
+
+@dataclass
+class SimConfig:
+    """一组待评估的运行配置"""
+    workers: int = 1
+    timeout: float = 300
+    max_retries: int = 3
+    delay: float = 1.0
+    schedule: str = "priority"
+    on_error: ErrorHandling = ErrorHandling.RETRY
+
+
+def percentile(values: list[float], p: float) -> float:
+    """p 分位数 (最近秩)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class SimResult:
+    """一次模拟的汇总指标"""
+    config: SimConfig
+    tasks: int = 0
+    completed: int = 0
+    failed: int = 0
+    attempts: int = 0
+    timeouts: int = 0
+    makespan: float = 0.0
+    busy: float = 0.0
+    latencies: list[float] = field(default_factory=list, repr=False)
+    # 按标签 (第一个标签) 和优先级分组的延迟
+    by_tag: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list), repr=False)
+    by_priority: dict[int, list[float]] = field(default_factory=lambda: defaultdict(list), repr=False)
+    wall_time: float = 0.0
+
+    @property
+    def utilization(self) -> float:
+        """worker 忙碌时间占比"""
+        capacity = self.config.workers * self.makespan
+        return self.busy / capacity if capacity else 0.0
+
+    def percentile(self, p: float) -> float:
+        """任务完成延迟 (从到达到最终完成或失败) 的 p 分位数"""
+        return percentile(self.latencies, p)
+
+    def record(self, task: Task, latency: float) -> None:
+        """记录任务最终完成或失败的延迟"""
+        self.latencies.append(latency)
+        self.by_tag[task.tags[0] if task.tags else UNTAGGED].append(latency)
+        self.by_priority[task.priority].append(latency)
+
+    def groups(self, by: str) -> dict[str, list[float]]:
+        """按 ``tag`` 或 ``priority`` 分组的延迟"""
+        if by == "tag":
+            return dict(sorted(self.by_tag.items()))
+        if by == "priority":
+            return {str(p): v for p, v in sorted(self.by_priority.items(), reverse=True)}
+        raise ValueError(f"不支持的分组: {by} (可选: tag、priority)")
+
+
+class Simulator:
+    """离散事件调度模拟器"""
+
+    def __init__(
+        self,
+        tasks: list[Task],
+        workload: Workload,
+        model: Optional[DurationModel] = None,
+        tag_weights: Optional[dict[str, float]] = None,
+        tag_caps: Optional[dict[str, int]] = None,
+        aging_rate: float = 1 / 60,
+        seed: int = 0,
+        arrival_rate: float = 0.0,
+    ):
+        """
+        Args:
+            arrival_rate: 任务按泊松过程到达的速率 (个/秒)，0 表示开始时全部到达
+        """
+        self.tasks = tasks
+        self.workload = workload
+        self.model = model
+        self.tag_weights = tag_weights or {}
+        self.tag_caps = tag_caps or {}
+        self.aging_rate = aging_rate
+        self.seed = seed
+        self.arrival_rate = arrival_rate
+
+    def arrivals(self) -> list[float]:
+        """各任务的到达时间 (按任务顺序)"""
+        if self.arrival_rate <= 0:
+            return [0.0] * len(self.tasks)
+        rng = random.Random(f"{self.seed}:arrivals")
+        times, now = [], 0.0
+        for _ in self.tasks:
+            times.append(now)
+            now += rng.expovariate(self.arrival_rate)
+        return times
+
+    def _attempt(self, task: Task, timeout: float, streams: dict[str, random.Random]) -> Attempt:
+        # 每个任务使用独立的随机流，抽样结果不受派发顺序影响
+        rng = streams.get(task.id)
+        if rng is None:
+            rng = streams[task.id] = random.Random(f"{self.seed}:{task.id}")
+        duration, success = self.workload.sample(task, rng)
+        if duration > timeout:
+            return Attempt(duration=timeout, success=False)
+        return Attempt(duration=duration, success=success)
+
+    def run(self, config: SimConfig) -> SimResult:
+        """模拟一组配置下的完整运行"""
+        started = time.perf_counter()
+        # 每组配置使用相同的随机种子，便于横向比较
+        streams: dict[str, random.Random] = {}
+        # 调度器会在 on_finish 中更新耗时模型，每次模拟使用独立副本
+        model = self.model.copy() if self.model else DurationModel()
+
+        scheduler = make_scheduler(
+            config.schedule,
+            model=model,
+            tag_weights=self.tag_weights,
+            tag_caps=self.tag_caps,
+            aging_rate=self.aging_rate,
+        )
+
+        result = SimResult(config=config, tasks=len(self.tasks))
+        workers = max(1, config.workers)
+        max_retries = config.max_retries if config.on_error == ErrorHandling.RETRY else 0
+        retry_queue: deque[Task] = deque()
+        retries: dict[str, int] = {}
+
+        # 事件: (时间, 序号, 任务, 本次尝试)；任务为 None 表示派发唤醒，
+        # 尝试为 None 表示任务到达
+        events: list = []
+        seq = itertools.count()
+        arrived: dict[str, float] = {}
+        for task, at in zip(self.tasks, self.arrivals()):
+            if at > 0:
+                heapq.heappush(events, (at, next(seq), task, None))
+            else:
+                arrived[task.id] = 0.0
+                scheduler.push(task, 0.0)
+        now = 0.0
+        running = 0
+        next_dispatch = 0.0
+        wake_pending = False
+
+        while True:
+            # 在空闲 worker 上派发任务
+            while running < workers and (retry_queue or scheduler):
+                if next_dispatch > now:
+                    if not wake_pending:
+                        heapq.heappush(events, (next_dispatch, next(seq), None, None))
+                        wake_pending = True
+                    break
+                task = next((t for t in retry_queue if scheduler.can_start(t)), None)
+                if task is not None:
+                    retry_queue.remove(task)
+                else:
+                    task = scheduler.pop(now)
+                if task is None:
+                    # 受按标签并发上限限制
+                    break
+                attempt = self._attempt(task, config.timeout, streams)
+                scheduler.on_start(task)
+                heapq.heappush(events, (now + attempt.duration, next(seq), task, attempt))
+                running += 1
+                result.attempts += 1
+                result.busy += attempt.duration
+                if config.delay > 0:
+                    next_dispatch = now + config.delay
+
+            if not events:
+                break
+
+            now, _, task, attempt = heapq.heappop(events)
+            if task is None:
+                wake_pending = False
+                continue
+            if attempt is None:
+                arrived[task.id] = now
+                scheduler.push(task, now)
+                continue
+
+            running -= 1
+            scheduler.on_finish(task, attempt.duration)
+
+            if attempt.success:
+                result.completed += 1
+                result.record(task, now - arrived[task.id])
+                continue
+
+            if attempt.duration >= config.timeout:
+                result.timeouts += 1
+
+            count = retries.get(task.id, 0)
+            if count < max_retries:
+                retries[task.id] = count + 1
+                retry_queue.append(task)
+                next_dispatch = max(next_dispatch, now + RETRY_WAIT)
+            else:
+                result.failed += 1
+                result.record(task, now - arrived[task.id])
+
+        result.makespan = now
+        result.wall_time = time.perf_counter() - started
+        return result
+
+    def grid(self, configs: Iterable[SimConfig]) -> list[SimResult]:
+        """依次模拟多组配置"""
+        return [self.run(config) for config in configs]
+
+
+def synthetic_tasks(count: int, tags: Optional[list[str]] = None, seed: int = 0) -> list[Task]:
+    """生成合成任务
+
+    跳过 pydantic 校验并显式给出所有字段 (默认值工厂在 model_construct
+    中开销很大)，十万级任务也能快速构建。
+    """
+    rng = random.Random(seed)
+    tags = tags or []
+    created_at = datetime.now()
+    return [
+        Task.model_construct(
+            id=f"sim-{i:06d}",
+            title=f"模拟任务 {i}",
+            status=TaskStatus.TODO,
+            description="",
+            acceptance="",
+            priority=rng.randrange(10),
+            tags=[tags[i % len(tags)]] if tags else [],
+            verify=[],
+            repos=[],
+            repo_status={},
+            created_at=created_at,
+            completed_at=None,
+        )
+        for i in range(count)
+    ]
+
+
+def expand_grid(
+    workers: list[int],
+    timeouts: list[float],
+    retries: list[int],
+    delays: list[float],
+    schedules: list[str],
+    on_error: ErrorHandling = ErrorHandling.RETRY,
+) -> list[SimConfig]:
+    """参数网格的笛卡尔积"""
+    return [
+        SimConfig(workers=w, timeout=t, max_retries=r, delay=d, schedule=s, on_error=on_error)
+        for s, w, t, r, d in itertools.product(schedules, workers, timeouts, retries, delays)
+    ]
@@ -0,0 +1,382 @@
+"""执行结果的列式统计存储
+
+``ralph_results.json`` 保存每次执行的完整输出，只适合渲染当前运行的汇总。
+``ResultStore`` 只保留结果的元数据，按列存放在 ``.ralphy/<任务文件名>.stats/``：
+
+- 每列一个文件，内容是 ``array`` 的原始字节 (本机字节序)，读取时用
+  ``array.fromfile`` 一次读入，不逐条解析
+- 任务 ID、标签组合、仓库和失败类型按字典编码为整数 (``-1`` 表示空)，
+  字典保存在 ``dicts.json``
+- 每次运行结束时把本次的结果追加到各列末尾，最后写入 ``meta.json`` 中的行数；
+  中途中断时多写的部分在下次读写时截掉
+- 执行时间列按追加顺序有序时 (通常如此)，时间窗口用二分查找定位
+
+查询按标签、任务、失败类型、仓库、天或周分组，计算成功率、耗时分位数、
+重试效率和费用，几十万条结果在一秒内完成。
+"""
+
+import bisect
+import json
+import math
+import os
+import time
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .models import Task, TaskResult
+from .scheduler import UNTAGGED
+
+VERSION = 1
+
+# 列名 -> array 类型码
+COLUMNS = {
+    "executed_at": "d",   # Unix 时间戳
+    "duration": "d",
+    "cost": "d",          # NaN 表示未记录
+    "tokens": "q",        # 输入 + 输出 token，-1 表示未记录
+    "retries": "i",
+    "success": "b",
+    "task": "i",
+    "tags": "i",
+    "repo": "i",
+    "failure": "i",
+}
+# 字典编码的列
+DICT_COLUMNS = ("task", "tags", "repo", "failure")
+
+GROUP_BY = ("tag", "task", "failure", "repo", "day", "week", "all")
+SORT_BY = ("runs", "failures", "fail-rate", "p95", "cost")
+
+_DAY = 86400
+
+
+def stats_dir_for(task_file: str) -> Path:
+    """任务文件对应的统计存储目录"""
+    path = Path(task_file).absolute()
+    return path.parent / ".ralphy" / f"{path.name}.stats"
+
+
+def parse_time(text: str, now: Optional[float] = None) -> float:
+    """解析时间：相对时长 (``30m`` / ``12h`` / ``7d`` / ``2w``，表示多久以前) 或日期
+    (``2026-10-01``、``2026-10-01T12:00``)，返回 Unix 时间戳"""
+    text = text.strip()
+    units = {"m": 60, "h": 3600, "d": _DAY, "w": 7 * _DAY}
+    if text[-1:] in units:
+        try:
+            amount = float(text[:-1])
+        except ValueError:
+            pass
+        else:
+            return (now if now is not None else time.time()) - amount * units[text[-1]]
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"无法解析的时间: {text} (例如 7d、12h、2026-10-01)")
+
+
+class _Dictionary:
+    """字符串 (或标签组合) 与整数编码的双向映射"""
+
+    def __init__(self, values: Iterable = ()):
+        self.values = list(values)
+        self._codes = {value: code for code, value in enumerate(self.values)}
+        self.changed = False
+
+    def encode(self, value) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._codes[value] = code
+            self.changed = True
+        return code
+
+    def decode(self, code: int):
+        return self.values[code] if code >= 0 else None
+
+
+@dataclass
+class ResultColumns:
+    """从存储中读出的全部列"""
+    rows: int
+    columns: dict[str, array]
+    dicts: dict[str, _Dictionary]
+    # 执行时间列是否有序
+    ordered: bool = True
+
+    def __getitem__(self, name: str) -> array:
+        return self.columns[name]
+
+
+class ResultStore:
+    """按列追加的结果元数据存储"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @classmethod
+    def for_task_file(cls, task_file: str) -> "ResultStore":
+        return cls(stats_dir_for(task_file))
+
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return {"version": VERSION, "rows": 0, "ordered": True, "last": None}
+        if meta.get("version") != VERSION:
+            raise ValueError(f"统计存储版本不兼容: {self.path} (使用 ralphy stats --rebuild 重建)")
+        return meta
+
+    def _read_dicts(self) -> dict[str, _Dictionary]:
+        try:
+            with open(self.path / "dicts.json", "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        # 标签组合以元组作为字典键
+        return {
+            name: _Dictionary(tuple(value) for value in data.get(name, ())) if name == "tags" else _Dictionary(data.get(name, ()))
+            for name in DICT_COLUMNS
+        }
+
+    def _write_json(self, name: str, data) -> None:
+        tmp = self.path / f"{name}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path / name)
+
+    def append(self, results: Iterable[TaskResult], tasks: Iterable[Task]) -> int:
+        """追加结果，返回追加的条数"""
+        tags = {task.id: tuple(sorted(task.tags)) for task in tasks}
+        meta = self._read_meta()
+        dicts = self._read_dicts()
+        new = {name: array(code) for name, code in COLUMNS.items()}
+        ordered, last = meta["ordered"], meta["last"]
+
+        for result in results:
+            executed_at = result.executed_at.timestamp()
+            if last is not None and executed_at < last:
+                ordered = False
+            last = executed_at if last is None else max(last, executed_at)
+            tokens = None
+            if result.input_tokens is not None or result.output_tokens is not None:
+                tokens = (result.input_tokens or 0) + (result.output_tokens or 0)
+
+            new["executed_at"].append(executed_at)
+            new["duration"].append(result.duration)
+            new["cost"].append(result.cost_usd if result.cost_usd is not None else math.nan)
+            new["tokens"].append(tokens if tokens is not None else -1)
+            new["retries"].append(result.retry_count)
+            new["success"].append(1 if result.success else 0)
+            new["task"].append(dicts["task"].encode(result.task_id))
+            new["tags"].append(dicts["tags"].encode(tags.get(result.task_id, ())))
+            new["repo"].append(dicts["repo"].encode(result.repo))
+            failure = result.failure
+            new["failure"].append(dicts["failure"].encode(getattr(failure, "value", failure)))
+
+        count = len(new["executed_at"])
+        if not count:
+            return 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        rows = meta["rows"]
+        for name, values in new.items():
+            with open(self.path / f"{name}.col", "ab") as f:
+                # 截掉上次中断时多写的部分
+                if f.tell() != rows * values.itemsize:
+                    f.truncate(rows * values.itemsize)
+                    f.seek(0, os.SEEK_END)
+                values.tofile(f)
+
+        if any(d.changed for d in dicts.values()):
+            self._write_json("dicts.json", {name: d.values for name, d in dicts.items()})
+        # 行数最后写入，作为提交点
+        self._write_json("meta.json", {"version": VERSION, "rows": rows + count, "ordered": ordered, "last": last})
+        return count
+
+    def clear(self) -> None:
+        """删除存储 (先删除行数，中断时剩下的列不会被读取)"""
+        for name in ["meta.json", "dicts.json", *(f"{c}.col" for c in COLUMNS)]:
+            try:
+                (self.path / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    def rebuild(self, results: Iterable[TaskResult], tasks: Iterable[Task]) -> int:
+        """清空后重新导入"""
+        self.clear()
+        return self.append(results, tasks)
+
+    def load(self) -> ResultColumns:
+        """读取全部列"""
+        meta = self._read_meta()
+        rows = meta["rows"]
+        columns = {}
+        for name, code in COLUMNS.items():
+            values = array(code)
+            if rows:
+                with open(self.path / f"{name}.col", "rb") as f:
+                    values.fromfile(f, rows)
+            columns[name] = values
+        return ResultColumns(rows=rows, columns=columns, dicts=self._read_dicts(), ordered=meta["ordered"])
+
+
+def record_run(task_file: str, results: list[TaskResult], start: int, tasks: Iterable[Task]) -> int:
+    """运行结束时追加本次运行的结果 (``results[start:]``)
+
+    存储尚不存在时导入全部结果，之前运行的历史也纳入统计。
+    """
+    store = ResultStore.for_task_file(task_file)
+    return store.append(results[start:] if store.exists() else results, tasks)
+
+
+@dataclass
+class GroupStats:
+    """一组结果的统计"""
+    key: str
+    runs: int = 0
+    successes: int = 0
+    # 重试过的结果数、其中最终成功的数量、重试总次数
+    retried: int = 0
+    retried_successes: int = 0
+    retries: int = 0
+    cost: float = 0.0
+    tokens: int = 0
+    durations: list[float] = field(default_factory=list, repr=False)
+
+    @property
+    def failures(self) -> int:
+        return self.runs - self.successes
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.runs if self.runs else 0.0
+
+    @property
+    def retry_success_rate(self) -> Optional[float]:
+        """重试过的任务最终成功的比例"""
+        return self.retried_successes / self.retried if self.retried else None
+
+    def percentile(self, p: float) -> float:
+        """耗时的 p 分位数 (durations 已排序)"""
+        if not self.durations:
+            return 0.0
+        index = min(len(self.durations) - 1, max(0, math.ceil(p / 100 * len(self.durations)) - 1))
+        return self.durations[index]
+
+
+def _rows(data: ResultColumns, since: Optional[float], until: Optional[float]) -> Iterable[int]:
+    """时间窗口内的行号"""
+    times = data["executed_at"]
+    if since is None and until is None:
+        return range(data.rows)
+    lo = since if since is not None else -math.inf
+    hi = until if until is not None else math.inf
+    if data.ordered:
+        return range(bisect.bisect_left(times, lo), bisect.bisect_left(times, hi))
+    return [i for i, t in enumerate(times) if lo <= t < hi]
+
+
+def _day_label(day: int, offset: float) -> str:
+    return datetime.fromtimestamp(day * _DAY - offset).strftime("%Y-%m-%d")
+
+
+def _group(data: ResultColumns, rows: Iterable[int], by: str) -> dict[str, list[int]]:
+    """按分组键收集行号"""
+    if by == "all":
+        return {"全部": list(rows)}
+
+    if by in ("day", "week"):
+        # 按本地时区分天，周从周一开始 (1970-01-01 是周四)
+        offset = datetime.now().astimezone().utcoffset().total_seconds()
+        times = data["executed_at"]
+        days: dict[int, list[int]] = defaultdict(list)
+        for i in rows:
+            day = int((times[i] + offset) // _DAY)
+            days[day if by == "day" else day - (day + 3) % 7].append(i)
+        return {_day_label(day, offset): days[day] for day in sorted(days)}
+
+    column = "tags" if by == "tag" else by
+    codes = data[column]
+    by_code: dict[int, list[int]] = defaultdict(list)
+    for i in rows:
+        by_code[codes[i]].append(i)
+
+    dictionary = data.dicts[column]
+    groups: dict[str, list[int]] = {}
+    for code, indices in by_code.items():
+        value = dictionary.decode(code)
+        if by == "tag":
+            # 多标签任务计入每个标签
+            for tag in value or (UNTAGGED,):
+                groups.setdefault(tag, []).extend(indices)
+        else:
+            groups[value if value is not None else "-"] = indices
+    return groups
+
+
+def query(
+    data: ResultColumns,
+    by: str = "tag",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> list[GroupStats]:
+    """分组统计时间窗口 [since, until) 内的结果"""
+    if by not in GROUP_BY:
+        raise ValueError(f"不支持的分组: {by} (可选: {', '.join(GROUP_BY)})")
+
+    success, duration, retries = data["success"], data["duration"], data["retries"]
+    cost, tokens = data["cost"], data["tokens"]
+    stats = []
+    for key, indices in _group(data, _rows(data, since, until), by).items():
+        if not indices:
+            continue
+        group = GroupStats(key=key, runs=len(indices))
+        group.successes = sum([success[i] for i in indices])
+        group.durations = sorted([duration[i] for i in indices])
+        retried = [i for i in indices if retries[i]]
+        group.retried = len(retried)
+        group.retried_successes = sum([success[i] for i in retried])
+        group.retries = sum([retries[i] for i in retried])
+        group.cost = sum([c for c in (cost[i] for i in indices) if c == c])
+        group.tokens = sum([t for t in (tokens[i] for i in indices) if t > 0])
+        stats.append(group)
+    return stats
+
+
+def sort_groups(groups: list[GroupStats], key: str) -> list[GroupStats]:
+    """按指定指标降序排列"""
+    if key not in SORT_BY:
+        raise ValueError(f"不支持的排序: {key} (可选: {', '.join(SORT_BY)})")
+    metric = {
+        "runs": lambda g: g.runs,
+        "failures": lambda g: g.failures,
+        "fail-rate": lambda g: (g.failure_rate, g.runs),
+        "p95": lambda g: g.percentile(95),
+        "cost": lambda g: g.cost,
+    }[key]
+    return sorted(groups, key=metric, reverse=True)
+
+
+def window_label(since: Optional[float], until: Optional[float]) -> str:
+    """时间窗口的显示文本"""
+    def fmt(ts: float) -> str:
+        return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+    if since is None and until is None:
+        return "全部时间"
+    if until is None:
+        return f"{fmt(since)} 起"
+    if since is None:
+        return f"{fmt(until)} 之前"
+    return f"{fmt(since)} ~ {fmt(until)}"
@@ -1,38 +1,428 @@
 """任务管理模块"""
 
+import glob
+import hashlib
+import itertools
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
+from .dedup import DEFAULT_THRESHOLD, DedupIndex, DuplicateMatch
+from .fanout import overall_status
 from .models import Task, TaskResult, TaskStatus
+from .task_query import iter_json_array, query_items
+
+
+# 目录形式的计划中没有分片时，新任务写入的文件
+DEFAULT_SHARD = "tasks.json"
+# 并行读取分片的线程数上限
+MAX_READERS = 8
+
+_GLOB_CHARS = "*?["
+
+
+# 执行过程中由 ralphy 维护的状态字段
+_STATUS_FIELDS = ("status", "repo_status", "completed_at")
+
+
+def _item_hash(item: dict) -> str:
+    """任务条目的内容哈希，用于增量比对"""
+    return hashlib.sha1(json.dumps(item, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class TaskChanges:
+    """任务文件重新加载后的变化"""
+    added: list[Task] = field(default_factory=list)
+    updated: list[Task] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def merge(self, other: "TaskChanges") -> None:
+        self.added.extend(other.added)
+        self.updated.extend(other.updated)
+        self.removed.extend(other.removed)
+
+
+def is_sharded(task_file: str) -> bool:
+    """任务文件参数是否表示多个分片 (目录或 glob)"""
+    return any(ch in task_file for ch in _GLOB_CHARS) or Path(task_file).is_dir()
+
+
+def _signature(path: Path) -> Optional[tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_shard(path: Path) -> tuple[Optional[tuple[int, int]], list]:
+    """读取一个分片，返回读取前的签名和条目"""
+    signature = _signature(path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"任务文件不是 JSON 数组: {path}")
+    return signature, data
+
+
+@dataclass
+class _Shard:
+    """一个任务文件 (分片) 的读写状态"""
+    path: Path
+    signature: Optional[tuple[int, int]] = None
+    # 任务 ID -> 条目内容哈希，按文件中的顺序
+    hashes: dict[str, str] = field(default_factory=dict)
 
 
 class TaskManager:
-    """任务管理器"""
+    """任务管理器
+
+    ``task_file`` 可以是单个 JSON 文件，也可以是目录 (其中的 ``*.json``) 或 glob
+    (``plans/*.json``)。多个分片合并为一个任务列表，任务 ID 必须全局唯一；
+    状态更新只写回任务所在的分片，内容未变的分片不重写。新任务写入最后一个
+    分片 (按路径排序)。
+    """
 
     def __init__(self, task_file: str = "prd.json", results_file: str = "ralph_results.json"):
         self.task_file = Path(task_file)
         self.results_file = Path(results_file)
         self.tasks: list[Task] = []
         self.results: list[TaskResult] = []
+        self.sharded = is_sharded(task_file)
+        self._pattern = task_file
+        # 已加载的分片及每个任务所在的分片，用于检测外部修改和定向写回
+        self._shards: dict[Path, _Shard] = {}
+        self._owner: dict[str, Path] = {}
+        self._changes = TaskChanges()
+        # 状态已在内存中修改、尚未写入文件的任务，重新加载时保留其状态
+        self._unsaved: set[str] = set()
+        # 重复检测索引，首次使用时建立，任务列表重新加载后失效
+        self._dedup: Optional[DedupIndex] = None
+
+    # ------------------------------------------------------------------
+    # 分片
+    # ------------------------------------------------------------------
+
+    def shard_paths(self) -> list[Path]:
+        """当前匹配的分片 (按路径排序)；单个任务文件时即该文件"""
+        if not self.sharded:
+            return [self.task_file]
+        if self.task_file.is_dir():
+            return sorted(path for path in self.task_file.glob("*.json") if path.is_file())
+        return sorted(Path(path) for path in glob.glob(self._pattern) if os.path.isfile(path))
+
+    def _default_shard(self) -> Path:
+        """新任务写入的分片"""
+        if self._shards:
+            return max(self._shards)
+        if not self.sharded:
+            return self.task_file
+        if self.task_file.is_dir():
+            return self.task_file / DEFAULT_SHARD
+        raise FileNotFoundError(f"没有匹配的任务分片: {self._pattern}")
+
+    def _read_shards(self, paths: list[Path]) -> list[tuple[Path, Optional[tuple[int, int]], object]]:
+        """并行读取分片，读取失败的分片返回异常对象"""
+        def read(path: Path):
+            try:
+                return (path, *_read_shard(path))
+            except (OSError, ValueError) as e:
+                return (path, None, e)
+
+        if len(paths) <= 1:
+            return [read(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=min(MAX_READERS, len(paths)), thread_name_prefix="ralphy-shard") as pool:
+            return list(pool.map(read, paths))
+
+    def _state_dir(self) -> Path:
+        """分片清单所在目录：任务文件参数中第一个 glob 之前的目录"""
+        parts = Path(self._pattern).absolute().parts
+        fixed = [part for part in itertools.takewhile(lambda p: not any(ch in p for ch in _GLOB_CHARS), parts)]
+        base = Path(*fixed)
+        if not self.task_file.is_dir() and len(fixed) == len(parts):
+            base = base.parent
+        return base / ".ralphy"
+
+    def _manifest_path(self) -> Path:
+        name = "".join("_" if ch in _GLOB_CHARS else ch for ch in self.task_file.name) or "plan"
+        return self._state_dir() / f"{name}.manifest.json"
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f).get("shards", {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_manifest(self, shards: dict) -> None:
+        path = self._manifest_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "shards": shards}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            # 清单只是缓存，写入失败不影响任务文件
+            pass
+
+    @staticmethod
+    def _summary(items: Iterable[dict]) -> dict:
+        """一个分片的状态计数 (清单中缓存的内容)"""
+        counts = {status.value: 0 for status in TaskStatus}
+        fanout = 0
+        for item in items:
+            status = item.get("status") or TaskStatus.TODO.value
+            counts[status] = counts.get(status, 0) + 1
+            fanout += 1 if item.get("repo_status") else 0
+        return {"status": counts, "fanout": fanout}
+
+    def _update_manifest(self, paths: Iterable[Path]) -> None:
+        """用内存中的任务刷新这些分片的清单条目"""
+        if not self.sharded:
+            return
+        paths = set(paths)
+        owned: dict[Path, list[Task]] = {path: [] for path in paths}
+        for task in self.tasks:
+            path = self._owner.get(task.id)
+            if path in owned:
+                owned[path].append(task)
+        manifest = self._load_manifest()
+        current = {str(path.absolute()) for path in self._shards}
+        manifest = {key: entry for key, entry in manifest.items() if key in current}
+        for path in paths:
+            shard = self._shards.get(path)
+            if shard is not None and shard.signature is not None:
+                items = ({"status": task.status, "repo_status": task.repo_status} for task in owned[path])
+                manifest[str(path.absolute())] = {"signature": list(shard.signature), **self._summary(items)}
+        self._save_manifest(manifest)
+
+    def summarize(self) -> dict:
+        """任务状态统计，不加载任务
+
+        分片模式下未修改的分片 (修改时间和大小与清单一致) 直接使用清单中的计数，
+        只流式扫描修改过的分片；单个任务文件时流式扫描整个文件。
+        """
+        paths = self.shard_paths()
+        if not paths or not all(path.exists() for path in paths):
+            raise FileNotFoundError(f"任务文件不存在: {self._pattern}")
+
+        manifest = self._load_manifest() if self.sharded else {}
+        fresh: dict[str, dict] = {}
+        for path in paths:
+            key = str(path.absolute())
+            signature = _signature(path)
+            entry = manifest.get(key)
+            if entry is None or signature is None or tuple(entry["signature"]) != signature:
+                entry = {"signature": list(signature or (0, 0)), **self._summary(iter_json_array(path))}
+            fresh[key] = entry
+        if self.sharded and fresh != manifest:
+            self._save_manifest(fresh)
+
+        totals = {status.value: 0 for status in TaskStatus}
+        fanout = 0
+        for entry in fresh.values():
+            for status, count in entry["status"].items():
+                totals[status] = totals.get(status, 0) + count
+            fanout += entry["fanout"]
+        stats = {"total": sum(totals.values()), "fanout": fanout, "shards": len(paths)}
+        stats.update(totals)
+        return stats
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
 
     def load_tasks(self) -> list[Task]:
-        """从 JSON 文件加载任务列表"""
-        if not self.task_file.exists():
-            raise FileNotFoundError(f"任务文件不存在: {self.task_file}")
+        """从 JSON 文件 (或全部分片) 加载任务列表，多个分片并行读取"""
+        paths = self.shard_paths()
+        if not paths or not all(path.exists() for path in paths):
+            raise FileNotFoundError(f"任务文件不存在: {self._pattern}")
 
-        with open(self.task_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        tasks: list[Task] = []
+        shards: dict[Path, _Shard] = {}
+        owner: dict[str, Path] = {}
+        for path, signature, data in self._read_shards(paths):
+            if isinstance(data, Exception):
+                raise data
+            shard = shards[path] = _Shard(path=path, signature=signature)
+            for item in data:
+                task = Task(**item)
+                other = owner.setdefault(task.id, path)
+                if other != path:
+                    raise ValueError(f"任务 ID 重复: {task.id} 同时出现在 {other} 和 {path}")
+                shard.hashes[task.id] = _item_hash(item)
+                tasks.append(task)
 
-        self.tasks = [Task(**item) for item in data]
+        self.tasks = tasks
+        self._shards = shards
+        self._owner = owner
+        self._dedup = None
+        self._update_manifest(shards)
         return self.tasks
 
-    def save_tasks(self) -> None:
-        """保存任务列表到 JSON 文件"""
-        data = [task.model_dump(mode="json") for task in self.tasks]
-        with open(self.task_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    def query(
+        self,
+        status: Optional[str] = None,
+        tags: Optional[list[str]] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """流式读取任务文件并筛选，返回原始条目 (不校验、不加载到 ``tasks``)
+
+        多个分片依次流式读取，不排序时凑够条数后不再打开后面的分片。
+        """
+        paths = self.shard_paths()
+        if not paths or not all(path.exists() for path in paths):
+            raise FileNotFoundError(f"任务文件不存在: {self._pattern}")
+        items = itertools.chain.from_iterable(iter_json_array(path) for path in paths)
+        return query_items(items, status=status, tags=tags, sort=sort, offset=offset, limit=limit)
+
+    def save_tasks(self, changed: Optional[Iterable[str]] = None) -> None:
+        """保存任务列表到 JSON 文件
+
+        若文件在上次读写后被外部修改，先合并外部修改再写入，避免覆盖。只重写
+        内容有变化的分片；指定 ``changed`` 时只检查这些任务所在的分片。
+        """
+        self.sync()
+        default = self._default_shard()
+        targets = None
+        if changed is not None:
+            targets = {self._owner.get(task_id, default) for task_id in changed}
+
+        by_shard: dict[Path, list[dict]] = {}
+        for task in self.tasks:
+            path = self._owner.setdefault(task.id, default)
+            if targets is None or path in targets:
+                by_shard.setdefault(path, []).append(task.model_dump(mode="json"))
+        if targets is None:
+            # 任务全部移除的分片写为空数组
+            for path in self._shards:
+                by_shard.setdefault(path, [])
+
+        written = []
+        for path, data in by_shard.items():
+            hashes = {item["id"]: _item_hash(item) for item in data}
+            shard = self._shards.get(path)
+            if shard is not None and list(shard.hashes.items()) == list(hashes.items()) and shard.signature == _signature(path):
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+            self._shards[path] = _Shard(path=path, signature=_signature(path), hashes=hashes)
+            written.append(path)
+        self._update_manifest(written)
+        if changed is None:
+            self._unsaved.clear()
+        else:
+            self._unsaved.difference_update(changed)
+
+    def file_changed(self) -> bool:
+        """任务文件 (任一分片) 自上次读写后是否被外部修改，或分片有增减"""
+        if not self._shards:
+            return False
+        if self.sharded and set(self.shard_paths()) != set(self._shards):
+            return True
+        return any(_signature(path) != shard.signature for path, shard in self._shards.items())
+
+    def sync(self) -> TaskChanges:
+        """检测到外部修改时增量合并，变化同时累积供 take_changes 取出"""
+        if not self.file_changed():
+            return TaskChanges()
+        changes = self.reload_tasks()
+        self._changes.merge(changes)
+        return changes
+
+    def take_changes(self) -> TaskChanges:
+        """取出自上次调用以来累积的外部修改"""
+        changes, self._changes = self._changes, TaskChanges()
+        return changes
+
+    def reload_tasks(self) -> TaskChanges:
+        """重新读取修改过的分片，按 id 和内容哈希增量合并
+
+        未修改的分片不重新读取；内容未变的条目不重新解析；已有任务原地更新，
+        保持对象引用不变；进行中的任务以及状态尚未写入文件的任务合并其他字段，
+        保留内存中的状态。
+        """
+        paths = self.shard_paths()
+        stale = [path for path in paths if path not in self._shards or _signature(path) != self._shards[path].signature]
+        loaded = {path: (signature, data) for path, signature, data in self._read_shards(stale)}
+
+        changes = TaskChanges()
+        by_id = {task.id: task for task in self.tasks}
+        shards: dict[Path, _Shard] = {}
+        owner: dict[str, Path] = {}
+        order: list[Task] = []
+
+        for path in paths:
+            old = self._shards.get(path)
+            signature, data = loaded.get(path, (None, None))
+            if path not in loaded or isinstance(data, Exception):
+                if old is None:
+                    # 新分片正在被写入或暂时不合法，下次再试
+                    continue
+                # 未修改或暂时无法读取的分片保持原状
+                shards[path] = old
+                for task_id in old.hashes:
+                    if task_id in by_id and owner.setdefault(task_id, path) == path:
+                        order.append(by_id[task_id])
+                continue
+
+            shard = shards[path] = _Shard(path=path, signature=signature)
+            for item in data:
+                task_id = str(item.get("id"))
+                if owner.setdefault(task_id, path) != path:
+                    # 与前面分片的任务 ID 重复，保留先出现的任务
+                    continue
+                digest = _item_hash(item)
+                shard.hashes[task_id] = digest
+                existing = by_id.get(task_id)
+
+                if existing is not None and old is not None and old.hashes.get(task_id) == digest:
+                    order.append(existing)
+                    continue
+
+                try:
+                    task = Task(**item)
+                except ValueError:
+                    del shard.hashes[task_id]
+                    del owner[task_id]
+                    continue
+
+                if existing is None:
+                    changes.added.append(task)
+                    order.append(task)
+                else:
+                    keep = existing.status == TaskStatus.IN_PROGRESS or task_id in self._unsaved
+                    for name in Task.model_fields:
+                        if not (keep and name in _STATUS_FIELDS):
+                            setattr(existing, name, getattr(task, name))
+                    changes.updated.append(existing)
+                    order.append(existing)
+
+        # 尚未写入任何分片的新任务保留
+        for task in self.tasks:
+            if task.id not in self._owner and task.id not in owner:
+                order.append(task)
+        changes.removed = [task.id for task in self.tasks if task.id not in owner and task.id in self._owner]
+
+        self.tasks = order
+        self._shards = shards
+        self._owner = owner
+        if changes:
+            self._dedup = None
+        self._update_manifest(path for path in loaded if path in shards)
+        return changes
 
     def load_results(self) -> list[TaskResult]:
         """加载执行结果"""
@@ -75,7 +465,108 @@ class TaskManager:
             task.status = status
             if status == TaskStatus.COMPLETED:
                 task.completed_at = datetime.now()
+            self._unsaved.add(task_id)
+            self.save_tasks([task_id])
+
+    def update_repo_status(self, task_id: str, repo: str, status: TaskStatus) -> None:
+        """更新多仓库任务在某个仓库上的状态，并据此重新汇总任务状态"""
+        task = self.get_task_by_id(task_id)
+        if task:
+            task.repo_status[repo] = status
+            task.status = overall_status(task.repo_status.values())
+            if task.status == TaskStatus.COMPLETED:
+                task.completed_at = datetime.now()
+            self._unsaved.add(task_id)
+            self.save_tasks([task_id])
+
+    def plan_repos(self, task_id: str, repos: list[str], pending: list[str]) -> None:
+        """记录多仓库任务本次匹配到的仓库：待执行的仓库重置为待办，不再匹配的仓库移除"""
+        task = self.get_task_by_id(task_id)
+        if task:
+            task.repo_status = {
+                repo: TaskStatus.TODO if repo in pending else task.repo_status.get(repo, TaskStatus.TODO)
+                for repo in repos
+            }
+            task.status = overall_status(task.repo_status.values())
+            self._unsaved.add(task_id)
+            self.save_tasks([task_id])
+
+    @staticmethod
+    def _dedup_candidate(task: Task) -> bool:
+        """可以作为重复对象的任务：未失败、未跳过且本身不是重复任务"""
+        return task.duplicate_of is None and task.status not in (TaskStatus.FAILED, TaskStatus.SKIPPED)
+
+    def _dedup_index(self, threshold: float) -> DedupIndex:
+        if self._dedup is None or self._dedup.threshold != threshold:
+            self._dedup = DedupIndex(threshold)
+            for task in self.tasks:
+                if self._dedup_candidate(task):
+                    self._dedup.add(task)
+        return self._dedup
+
+    def find_duplicate(
+        self,
+        title: str,
+        description: str = "",
+        acceptance: str = "",
+        repos: Optional[list[str]] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+    ) -> Optional[DuplicateMatch]:
+        """查找与给定内容重复的已有任务"""
+        probe = Task(id="", title=title, description=description, acceptance=acceptance, repos=repos or [])
+        return self._dedup_index(threshold).find(probe)
+
+    def merge_duplicate(self, task_id: str, priority: int = 0, tags: Optional[list[str]] = None) -> Optional[Task]:
+        """把重复任务的优先级 (取较大者) 和标签合并到已有任务"""
+        task = self.get_task_by_id(task_id)
+        if task:
+            task.priority = max(task.priority, priority)
+            task.tags = task.tags + [tag for tag in tags or [] if tag not in task.tags]
+            self.save_tasks([task_id])
+        return task
+
+    def flag_duplicates(
+        self,
+        tasks: Optional[list[Task]] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+        near: bool = False,
+    ) -> list[tuple[Task, DuplicateMatch]]:
+        """检查与前面任务重复的待办任务
+
+        完全重复 (``near=True`` 时包括近似重复) 的任务标记为跳过，优先级和标签
+        合并到保留的任务；返回所有发现的重复，未跳过的近似重复由调用方提示。
+
+        Args:
+            tasks: 只检查这些任务 (例如监听时新增的任务)，默认检查全部待办任务
+            threshold: 近似重复的相似度阈值
+            near: 是否同时跳过近似重复
+        """
+        targets = None if tasks is None else {task.id for task in tasks}
+        index = DedupIndex(threshold)
+        found: list[tuple[Task, DuplicateMatch]] = []
+        skipped = False
+        for task in self.tasks:
+            match = None
+            if task.status == TaskStatus.TODO and task.duplicate_of is None and (targets is None or task.id in targets):
+                match = index.find(task)
+            if match is not None:
+                found.append((task, match))
+                if match.exact or near:
+                    canonical = self.get_task_by_id(match.task_id)
+                    canonical.priority = max(canonical.priority, task.priority)
+                    canonical.tags = canonical.tags + [tag for tag in task.tags if tag not in canonical.tags]
+                    task.status = TaskStatus.SKIPPED
+                    task.duplicate_of = match.task_id
+                    self._unsaved.add(task.id)
+                    skipped = True
+                    continue
+            if self._dedup_candidate(task):
+                index.add(task)
+
+        self._dedup = index
+        if skipped:
             self.save_tasks()
+        return found
 
     def add_task(
         self,
@@ -101,7 +592,9 @@ class TaskManager:
         )
 
         self.tasks.append(task)
-        self.save_tasks()
+        self.save_tasks([task.id])
+        if self._dedup is not None:
+            self._dedup.add(task)
         return task
 
     def create_example_file(self) -> None:
@@ -0,0 +1,146 @@
+"""任务列表的流式读取与查询
+
+``ralphy task list`` 原先把整个任务文件解析成 ``Task`` 对象、在内存中筛选，再
+渲染成一张完整的表格，几万个任务的计划要等几秒才能看到第一行。本模块只依赖
+标准库 (客户端快速入口也会使用)：
+
+- ``iter_json_array`` 按块读取任务文件，逐条解码数组元素，不需要一次读入整个文件
+- ``query_items`` 在原始条目上按状态和标签筛选，被筛掉的条目不做模型校验；
+  不排序时边读边输出，凑够 ``offset + limit`` 条即停止读取；排序且指定
+  ``limit`` 时用堆只保留前 ``offset + limit`` 条
+- ``write_jsonl`` / ``write_csv`` 直接输出原始条目，供脚本使用
+"""
+
+import csv
+import heapq
+import itertools
+import json
+import re
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, TextIO
+
+CHUNK_SIZE = 1 << 16
+
+SORT_FIELDS = ("id", "title", "status", "priority", "created_at")
+CSV_FIELDS = ("id", "title", "status", "priority", "tags", "duplicate_of", "created_at", "completed_at")
+
+_DIGITS = re.compile(r"(\d+)")
+_SEPARATORS = " \t\r\n,"
+
+
+def iter_json_array(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """逐条读取 JSON 数组文件中的元素"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos = "", 0
+        started = eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in _SEPARATORS:
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError(f"任务文件不完整: {path}")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = chunk, 0
+                continue
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"任务文件不是 JSON 数组: {path}")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+
+            try:
+                item, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # 元素跨越了块边界，读入下一块后重试
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield item
+
+
+def _natural(value: object) -> tuple:
+    """自然排序键："2" 排在 "10" 之前"""
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in _DIGITS.split(str(value)) if part)
+
+
+def sort_key(field: str) -> Callable[[dict], object]:
+    """排序字段对应的键函数"""
+    if field not in SORT_FIELDS:
+        raise ValueError(f"不支持的排序字段: {field} (可选: {', '.join(SORT_FIELDS)})")
+    if field == "id":
+        return lambda item: _natural(item.get("id", ""))
+    if field == "priority":
+        return lambda item: item.get("priority") or 0
+    if field == "status":
+        return lambda item: item.get("status") or "todo"
+    return lambda item: str(item.get(field) or "")
+
+
+def query_items(
+    items: Iterable[dict],
+    status: Optional[str] = None,
+    tags: Optional[list[str]] = None,
+    sort: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Iterator[dict]:
+    """筛选、排序并分页任务条目
+
+    Args:
+        items: 原始任务条目 (任务文件中的 dict)
+        status: 只保留该状态的任务
+        tags: 只保留带有其中任一标签的任务
+        sort: 排序字段，前缀 ``-`` 表示降序；为空时保持文件顺序
+        offset: 跳过的条数
+        limit: 最多返回的条数
+    """
+    wanted = set(tags or ())
+    matched: Iterable[dict] = (
+        item for item in items
+        if (status is None or (item.get("status") or "todo") == status)
+        and (not wanted or not wanted.isdisjoint(item.get("tags") or ()))
+    )
+    if sort:
+        field = sort.lstrip("-")
+        reverse = sort.startswith("-")
+        key = sort_key(field)
+        if limit is not None:
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            matched = select(offset + limit, matched, key=key)
+        else:
+            matched = sorted(matched, key=key, reverse=reverse)
+    return itertools.islice(matched, offset, None if limit is None else offset + limit)
+
+
+def write_jsonl(items: Iterable[dict], out: TextIO) -> int:
+    """每行一个 JSON 对象，返回输出条数"""
+    count = 0
+    for item in items:
+        out.write(json.dumps(item, ensure_ascii=False, default=str))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(items: Iterable[dict], out: TextIO) -> int:
+    """CSV 输出 (标签以分号分隔)，返回输出条数"""
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    count = 0
+    for item in items:
+        row = {name: item.get(name) for name in CSV_FIELDS}
+        row["status"] = row["status"] or "todo"
+        row["priority"] = row["priority"] or 0
+        row["tags"] = ";".join(item.get("tags") or ())
+        writer.writerow(row)
+        count += 1
+    return count
@@ -0,0 +1,274 @@
+"""会话事件追踪
+
+开启追踪时 claude 以 ``--output-format stream-json`` 运行，每行一个事件。
+``TracingParser`` 在读取线程中逐行解析事件并按到达时间记录：
+
+- 工具调用：从 assistant 消息中的 ``tool_use`` 到对应 ``tool_result`` 的时间、
+  输入/输出大小和简要参数
+- 模型时间：没有未完成的工具调用时，从会话开始或最后一个工具结果到下一条
+  assistant 消息的时间
+
+每次执行的追踪以紧凑的数组形式追加到 ``ralph_traces.jsonl``，与
+``ralph_results.json`` 中的结果通过 task_id 和执行时间对应。
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .claude_output import OutputParser
+from .scheduler import UNTAGGED
+
+# 工具参数中用于显示的字段 (按顺序取第一个存在的)
+DETAIL_KEYS = ("command", "file_path", "pattern", "path", "url", "query", "description", "prompt")
+DETAIL_MAX_CHARS = 80
+
+# 紧凑存储中每个工具调用的字段顺序
+SPAN_FIELDS = ("name", "start", "duration", "in_bytes", "out_bytes", "error", "detail")
+
+
+@dataclass
+class ToolSpan:
+    """一次工具调用"""
+    name: str
+    start: float
+    duration: float = 0.0
+    in_bytes: int = 0
+    out_bytes: int = 0
+    error: bool = False
+    detail: str = ""
+
+    def to_row(self) -> list:
+        return [self.name, round(self.start, 3), round(self.duration, 3),
+                self.in_bytes, self.out_bytes, int(self.error), self.detail]
+
+    @classmethod
+    def from_row(cls, row: list) -> "ToolSpan":
+        return cls(*row[:len(SPAN_FIELDS)])
+
+
+@dataclass
+class Trace:
+    """一次执行的事件追踪"""
+    duration: float = 0.0
+    model_time: float = 0.0
+    spans: list[ToolSpan] = field(default_factory=list)
+
+    @property
+    def tool_time(self) -> float:
+        """工具调用占用的墙钟时间 (并行调用的重叠部分只计一次)"""
+        total = 0.0
+        end = None
+        for span in sorted(self.spans, key=lambda span: span.start):
+            span_end = span.start + span.duration
+            if end is None or span.start >= end:
+                total += span.duration
+                end = span_end
+            elif span_end > end:
+                total += span_end - end
+                end = span_end
+        return total
+
+
+def _detail(data: dict) -> str:
+    for key in DETAIL_KEYS:
+        value = data.get(key)
+        if value:
+            text = " ".join(str(value).split())
+            return text[:DETAIL_MAX_CHARS]
+    return ""
+
+
+def _content_size(content) -> int:
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(len(item.get("text", "")) if isinstance(item, dict) else len(str(item)) for item in content)
+    return len(json.dumps(content, ensure_ascii=False)) if content is not None else 0
+
+
+class TracingParser(OutputParser):
+    """解析 stream-json 事件流并记录时间线"""
+
+    def __init__(self):
+        super().__init__()
+        self._start = time.monotonic()
+        self._mark = self._start
+        self._open_tools: dict[str, ToolSpan] = {}
+        self.trace = Trace()
+
+    def _handle(self, data: dict) -> None:
+        super()._handle(data)
+        now = time.monotonic()
+        kind = data.get("type")
+
+        if kind == "assistant":
+            if not self._open_tools:
+                self.trace.model_time += now - self._mark
+                self._mark = now
+            for block in (data.get("message") or {}).get("content") or []:
+                if isinstance(block, dict) and block.get("type") == "tool_use":
+                    tool_input = block.get("input") or {}
+                    span = ToolSpan(
+                        name=str(block.get("name", "?")),
+                        start=now - self._start,
+                        in_bytes=len(json.dumps(tool_input, ensure_ascii=False)),
+                        detail=_detail(tool_input) if isinstance(tool_input, dict) else "",
+                    )
+                    self._open_tools[str(block.get("id"))] = span
+                    self.trace.spans.append(span)
+
+        elif kind == "user":
+            for block in (data.get("message") or {}).get("content") or []:
+                if isinstance(block, dict) and block.get("type") == "tool_result":
+                    span = self._open_tools.pop(str(block.get("tool_use_id")), None)
+                    if span is None:
+                        continue
+                    span.duration = now - self._start - span.start
+                    span.out_bytes = _content_size(block.get("content"))
+                    span.error = bool(block.get("is_error"))
+            if not self._open_tools:
+                # 所有工具返回，模型重新开始计时
+                self._mark = now
+
+        elif kind == "result" and not self._open_tools:
+            self.trace.model_time += now - self._mark
+            self._mark = now
+
+    def finish(self) -> None:
+        super().finish()
+        now = time.monotonic()
+        # 未返回的工具调用 (如超时) 计到结束为止并标记为错误
+        for span in self._open_tools.values():
+            span.duration = now - self._start - span.start
+            span.error = True
+        self._open_tools = {}
+        self.trace.duration = now - self._start
+
+
+class TraceStore:
+    """追加写入的追踪文件"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, task_id: str, tags: list[str], executed_at: str, run_id: str, trace: Trace) -> None:
+        record = {
+            "run_id": run_id,
+            "task_id": task_id,
+            "tags": tags,
+            "executed_at": executed_at,
+            "duration": round(trace.duration, 3),
+            "model": round(trace.model_time, 3),
+            "spans": [span.to_row() for span in trace.spans],
+        }
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+@dataclass
+class TraceRecord:
+    """追踪文件中的一条记录"""
+    run_id: str
+    task_id: str
+    tags: list[str]
+    executed_at: str
+    trace: Trace
+
+
+def load_traces(path: Path, run_id: Optional[str] = None) -> list[TraceRecord]:
+    """读取追踪记录；run_id 为 "last" 时只返回最后一次运行的记录"""
+    if not path.exists():
+        return []
+
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            records.append(TraceRecord(
+                run_id=data.get("run_id", ""),
+                task_id=data.get("task_id", ""),
+                tags=data.get("tags") or [],
+                executed_at=data.get("executed_at", ""),
+                trace=Trace(
+                    duration=data.get("duration", 0.0),
+                    model_time=data.get("model", 0.0),
+                    spans=[ToolSpan.from_row(row) for row in data.get("spans", [])],
+                ),
+            ))
+
+    if run_id == "last" and records:
+        run_id = records[-1].run_id
+    if run_id:
+        records = [r for r in records if r.run_id == run_id]
+    return records
+
+
+@dataclass
+class ToolStats:
+    """按工具汇总的耗时"""
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    errors: int = 0
+    in_bytes: int = 0
+    out_bytes: int = 0
+
+    def add(self, span: ToolSpan) -> None:
+        self.count += 1
+        self.total += span.duration
+        self.max = max(self.max, span.duration)
+        self.errors += int(bool(span.error))
+        self.in_bytes += span.in_bytes
+        self.out_bytes += span.out_bytes
+
+
+@dataclass
+class TraceReport:
+    """一组追踪的时间分布"""
+    sessions: int = 0
+    duration: float = 0.0
+    model_time: float = 0.0
+    tool_time: float = 0.0
+    tools: dict[str, ToolStats] = field(default_factory=dict)
+    by_tag: dict[str, dict[str, float]] = field(default_factory=dict)
+    slowest: list[tuple[TraceRecord, ToolSpan]] = field(default_factory=list)
+
+
+def build_report(records: Iterable[TraceRecord], top: int = 10) -> TraceReport:
+    """汇总追踪：按工具、按标签 (模型时间记为 "model") 以及最慢的工具调用
+
+    按工具的耗时为调用耗时之和，并行调用会重复计入；总体的工具时间按墙钟计算。
+    """
+    report = TraceReport()
+    tools: dict[str, ToolStats] = defaultdict(ToolStats)
+    by_tag: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    spans: list[tuple[TraceRecord, ToolSpan]] = []
+
+    for record in records:
+        trace = record.trace
+        report.sessions += 1
+        report.duration += trace.duration
+        report.model_time += trace.model_time
+        report.tool_time += trace.tool_time
+        for tag in record.tags or [UNTAGGED]:
+            by_tag[tag]["model"] += trace.model_time
+        for span in trace.spans:
+            tools[span.name].add(span)
+            for tag in record.tags or [UNTAGGED]:
+                by_tag[tag][span.name] += span.duration
+            spans.append((record, span))
+
+    report.tools = dict(tools)
+    report.by_tag = {tag: dict(times) for tag, times in by_tag.items()}
+    report.slowest = sorted(spans, key=lambda item: item[1].duration, reverse=True)[:top]
+    return report
@@ -0,0 +1,344 @@
+"""任务验收模块
+
+任务执行成功后在本地运行验收命令 (测试、lint 等)。命令中可使用占位符：
+
+- ``{changed}``: 本次任务修改过的文件
+- ``{tests}``: 根据修改文件增量选出的测试文件
+
+含占位符的命令在替换结果为空时跳过。验收在后台线程池中运行，
+与下一个任务的执行重叠。
+"""
+
+import os
+import shlex
+import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .logger import get_logger
+from .models import Task, TaskResult
+from .process import ChildProcess
+
+# 遍历工作目录时跳过的目录
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache", ".ralphy"}
+
+# 验收输出保留的最大字符数
+MAX_OUTPUT_CHARS = 4000
+
+
+@dataclass
+class CheckResult:
+    """单条验收命令结果"""
+    command: str
+    success: bool
+    output: str = ""
+    duration: float = 0.0
+    skipped: bool = False
+
+
+@dataclass
+class VerifyResult:
+    """任务验收结果"""
+    success: bool
+    checks: list[CheckResult] = field(default_factory=list)
+
+    @property
+    def output(self) -> str:
+        """失败命令的输出汇总"""
+        parts = []
+        for check in self.checks:
+            if not check.success:
+                parts.append(f"$ {check.command}\n{check.output[-MAX_OUTPUT_CHARS:]}")
+        return "\n\n".join(parts)
+
+
+@dataclass
+class WorkspaceSnapshot:
+    """任务开始前的工作区状态，用于计算任务修改的文件"""
+    start_time: float
+    dirty: dict[str, tuple[float, int]] = field(default_factory=dict)
+    is_git: bool = False
+
+
+class Verifier:
+    """验收命令解析与执行"""
+
+    def __init__(
+        self,
+        working_dir: Path,
+        tag_commands: Optional[dict[str, list[str]]] = None,
+        timeout: int = 600,
+        ignore: Optional[list[str]] = None,
+    ):
+        self.working_dir = working_dir
+        self.tag_commands = tag_commands or {}
+        self.timeout = timeout
+        # ralphy 自身写入的文件 (任务文件、结果、日志) 不计入任务修改
+        self.ignore = {Path(p).resolve() for p in ignore or []}
+        self.logger = get_logger()
+        self._test_files: Optional[list[str]] = None
+        # 工作目录相对 git 仓库根目录的前缀 (如 "pkg/")
+        self._git_prefix: Optional[str] = None
+
+    def commands_for(self, task: Task) -> list[str]:
+        """获取任务的验收命令：任务自身的 verify 加上标签对应的命令"""
+        commands = list(task.verify)
+        for tag in task.tags:
+            for command in self.tag_commands.get(tag, []):
+                if command not in commands:
+                    commands.append(command)
+        return commands
+
+    # ------------------------------------------------------------------
+    # 修改文件检测
+    # ------------------------------------------------------------------
+
+    def _git(self, *args: str) -> Optional[str]:
+        try:
+            result = subprocess.run(
+                ["git", *args],
+                cwd=self.working_dir,
+                capture_output=True,
+                text=True,
+                timeout=30,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        return result.stdout if result.returncode == 0 else None
+
+    def _git_dirty(self) -> Optional[list[str]]:
+        """git 工作区中相对 HEAD 有改动的文件 (含未跟踪文件)，路径相对工作目录"""
+        if self._git_prefix is None:
+            prefix = self._git("rev-parse", "--show-prefix")
+            if prefix is None:
+                return None
+            self._git_prefix = prefix.strip()
+        # porcelain 输出的路径总是相对仓库根目录，只列出工作目录下的文件并去掉前缀
+        out = self._git("status", "--porcelain", "-z", "--untracked-files=all", "--", ".")
+        if out is None:
+            return None
+
+        paths = []
+        entries = out.split("\0")
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if len(entry) < 4:
+                continue
+            path = entry[3:]
+            if path.startswith(self._git_prefix):
+                paths.append(path[len(self._git_prefix):])
+            # 重命名条目后跟原路径
+            if entry[0] in "RC":
+                i += 1
+        return paths
+
+    def _stat(self, path: str) -> tuple[float, int]:
+        try:
+            st = (self.working_dir / path).stat()
+            return (st.st_mtime, st.st_size)
+        except OSError:
+            return (0.0, -1)
+
+    def snapshot(self) -> WorkspaceSnapshot:
+        """记录任务开始前的工作区状态"""
+        dirty = self._git_dirty()
+        if dirty is None:
+            return WorkspaceSnapshot(start_time=time.time())
+        return WorkspaceSnapshot(
+            start_time=time.time(),
+            dirty={path: self._stat(path) for path in dirty},
+            is_git=True,
+        )
+
+    def changed_files(self, snapshot: WorkspaceSnapshot) -> list[str]:
+        """计算自快照以来修改过的文件"""
+        if snapshot.is_git:
+            dirty = self._git_dirty() or []
+            changed = [p for p in dirty if snapshot.dirty.get(p) != self._stat(p)]
+            # 任务开始前有改动、之后被还原的文件
+            changed.extend(p for p in snapshot.dirty if p not in dirty)
+            return sorted(p for p in set(changed) if not self._ignored(p))
+
+        changed = []
+        for root, dirs, files in os.walk(self.working_dir):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for name in files:
+                path = Path(root) / name
+                try:
+                    if path.stat().st_mtime >= snapshot.start_time:
+                        changed.append(str(path.relative_to(self.working_dir)))
+                except OSError:
+                    continue
+        return sorted(p for p in changed if not self._ignored(p))
+
+    def _ignored(self, path: str) -> bool:
+        if path.startswith(".ralphy/"):
+            return True
+        return (self.working_dir / path).resolve() in self.ignore
+
+    # ------------------------------------------------------------------
+    # 增量测试选择
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _is_test_file(path: str) -> bool:
+        name = Path(path).name
+        return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+    def _all_test_files(self) -> list[str]:
+        if self._test_files is None:
+            found = []
+            for root, dirs, files in os.walk(self.working_dir):
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+                for name in files:
+                    if self._is_test_file(name):
+                        found.append(str((Path(root) / name).relative_to(self.working_dir)))
+            self._test_files = sorted(found)
+        return self._test_files
+
+    def select_tests(self, changed: list[str]) -> list[str]:
+        """根据修改的文件选出相关测试
+
+        修改的测试文件直接选中；源文件按 ``test_<模块名>.py`` 命名约定
+        以及测试文件中的 import 语句匹配。
+        """
+        selected = set()
+        modules = set()
+
+        for path in changed:
+            if not path.endswith(".py"):
+                continue
+            if self._is_test_file(path):
+                # 测试文件有增删改时刷新测试文件缓存
+                self._test_files = None
+                if (self.working_dir / path).exists():
+                    selected.add(path)
+            else:
+                modules.add(Path(path).stem)
+
+        if modules:
+            for test_file in self._all_test_files():
+                stem = Path(test_file).stem
+                if stem.removeprefix("test_").removesuffix("_test") in modules:
+                    selected.add(test_file)
+                    continue
+                try:
+                    content = (self.working_dir / test_file).read_text(encoding="utf-8", errors="ignore")
+                except OSError:
+                    continue
+                for module in modules:
+                    if f"import {module}" in content or f".{module} import" in content or f"from {module} " in content:
+                        selected.add(test_file)
+                        break
+
+        return sorted(selected)
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    def expand(self, command: str, changed: list[str]) -> Optional[str]:
+        """替换命令占位符，替换结果为空时返回 None 表示跳过"""
+        if "{changed}" in command:
+            if not changed:
+                return None
+            command = command.replace("{changed}", " ".join(shlex.quote(p) for p in changed))
+        if "{tests}" in command:
+            tests = self.select_tests(changed)
+            if not tests:
+                return None
+            command = command.replace("{tests}", " ".join(shlex.quote(p) for p in tests))
+        return command
+
+    def run_check(self, command: str, changed: list[str]) -> CheckResult:
+        """运行单条验收命令"""
+        expanded = self.expand(command, changed)
+        if expanded is None:
+            return CheckResult(command=command, success=True, skipped=True)
+
+        start_time = time.time()
+        try:
+            child = ChildProcess(["/bin/sh", "-c", expanded], cwd=self.working_dir)
+        except OSError as e:
+            return CheckResult(command=expanded, success=False, output=str(e))
+
+        try:
+            if not child.wait(self.timeout):
+                child.kill_tree()
+                return CheckResult(
+                    command=expanded,
+                    success=False,
+                    output=f"验收超时 ({self.timeout}s)\n{child.stdout}",
+                    duration=time.time() - start_time,
+                )
+            return CheckResult(
+                command=expanded,
+                success=child.returncode == 0,
+                output=(child.stdout + child.stderr)[-MAX_OUTPUT_CHARS:],
+                duration=time.time() - start_time,
+            )
+        finally:
+            child.close()
+
+
+@dataclass(eq=False)
+class PendingVerification:
+    """进行中的验收"""
+    task: Task
+    result: TaskResult
+    futures: list[Future]
+
+    def done(self) -> bool:
+        return all(f.done() for f in self.futures)
+
+    def collect(self) -> VerifyResult:
+        checks = [f.result() for f in self.futures]
+        return VerifyResult(success=all(c.success for c in checks), checks=checks)
+
+
+class VerificationPipeline:
+    """验收流水线：验收命令在后台并行执行，与后续任务重叠"""
+
+    def __init__(self, verifier: Verifier, workers: int = 2):
+        self.verifier = verifier
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ralphy-verify")
+        self.pending: list[PendingVerification] = []
+
+    def submit(
+        self,
+        task: Task,
+        result: TaskResult,
+        changed: list[str],
+        verifier: Optional[Verifier] = None,
+    ) -> PendingVerification:
+        """提交任务验收，每条命令并行执行 (verifier 用于在其他工作目录中验收)"""
+        verifier = verifier or self.verifier
+        futures = [
+            self.pool.submit(verifier.run_check, command, changed)
+            for command in verifier.commands_for(task)
+        ]
+        item = PendingVerification(task=task, result=result, futures=futures)
+        self.pending.append(item)
+        return item
+
+    def poll(self) -> list[tuple[PendingVerification, VerifyResult]]:
+        """取出已完成的验收"""
+        # 只检查一次 done()：两次检查之间完成的验收不能两边都漏掉
+        finished = [item for item in self.pending if item.done()]
+        self.pending = [item for item in self.pending if item not in finished]
+        return [(item, item.collect()) for item in finished]
+
+    def wait_any(self, timeout: Optional[float] = None) -> list[tuple[PendingVerification, VerifyResult]]:
+        """阻塞直到至少一个验收完成"""
+        futures = [f for item in self.pending for f in item.futures if not f.done()]
+        if futures:
+            wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        return self.poll()
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
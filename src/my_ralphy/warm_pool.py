@@ -0,0 +1,203 @@
+"""预热进程池
+
+每次执行都新启动一个 claude 进程，要先付出 Node 运行时启动、加载配置和认证的
+开销，短任务和交互模式下尤其明显。``claude --print`` 在命令行没有提示时从 stdin
+读取提示，``WarmPool`` 据此提前启动若干个不带提示的会话，让它们停在读取 stdin
+之前；执行时取出一个空闲会话写入提示即可，用掉的会话在后台补充。
+
+- 会话按 (工作目录, 命令行) 区分，只有完全相同的命令才能复用
+- 空闲会话总数不超过 ``size``，在最近使用的命令之间轮流补充
+- 空闲超过 ``ttl`` 秒的会话被回收；命令仍在使用 (有运行中的会话或 ``ttl`` 秒内
+  用过) 时补充新会话，否则不再预热，池会缩小到零，下次使用时重新预热
+- 空闲会话自行退出 (例如 CLI 不支持等待 stdin) 时关闭预热池，之后全部冷启动
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .logger import get_logger
+from .process import ChildProcess, ResourceLimits
+
+# 回收线程的检查间隔上限 (秒)
+REAP_INTERVAL = 5.0
+
+
+@dataclass
+class _Idle:
+    child: ChildProcess
+    key: tuple
+    spawned: float
+
+
+@dataclass
+class _Command:
+    cmd: list[str]
+    cwd: Path
+    last_used: float
+    active: int = 0
+
+
+@dataclass
+class PoolStats:
+    """预热池命中统计"""
+    hits: int = 0
+    misses: int = 0
+    spawned: int = 0
+    reaped: int = 0
+
+
+class WarmPool:
+    """预先启动、等待提示的 claude 会话池"""
+
+    def __init__(self, size: int, ttl: float = 300.0, limits: Optional[ResourceLimits] = None):
+        self.size = size
+        self.ttl = ttl
+        self.limits = limits or ResourceLimits()
+        self.logger = get_logger()
+        self.stats = PoolStats()
+        self.disabled = False
+
+        self._lock = threading.Lock()
+        self._idle: list[_Idle] = []
+        self._keys: dict[tuple, _Command] = {}
+        self._refilling = False
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name="ralphy-warm-reaper", daemon=True)
+        self._reaper.start()
+
+    @staticmethod
+    def _key(cmd: list[str], cwd: Path) -> tuple:
+        return (str(Path(cwd).resolve()), tuple(cmd))
+
+    def prewarm(self, cmd: list[str], cwd: Path) -> None:
+        """登记命令并在后台启动空闲会话"""
+        with self._lock:
+            self._command(cmd, cwd)
+        self._refill_async()
+
+    def _command(self, cmd: list[str], cwd: Path) -> _Command:
+        key = self._key(cmd, cwd)
+        if key not in self._keys:
+            self._keys[key] = _Command(cmd=cmd, cwd=Path(cwd), last_used=time.monotonic())
+        return self._keys[key]
+
+    def acquire(self, cmd: list[str], cwd: Path) -> Optional[ChildProcess]:
+        """取出一个与命令匹配的空闲会话，没有时返回 None (由调用方冷启动)
+
+        无论是否命中，执行结束后都要调用 ``release``。
+        """
+        if self.disabled:
+            return None
+        key = self._key(cmd, cwd)
+        child = None
+        with self._lock:
+            command = self._command(cmd, cwd)
+            command.last_used = time.monotonic()
+            command.active += 1
+            for index, idle in enumerate(self._idle):
+                if idle.key == key and idle.child.returncode is None:
+                    child = self._idle.pop(index).child
+                    break
+            if child is not None:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+        self._refill_async()
+        return child
+
+    def release(self, cmd: list[str], cwd: Path) -> None:
+        """一次执行结束"""
+        with self._lock:
+            command = self._keys.get(self._key(cmd, cwd))
+            if command is not None:
+                command.active = max(0, command.active - 1)
+                command.last_used = time.monotonic()
+
+    def _refill_async(self) -> None:
+        with self._lock:
+            if self._refilling or self.disabled or self._stop.is_set():
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, name="ralphy-warm-refill", daemon=True).start()
+
+    def _next_key(self) -> Optional[tuple]:
+        """空闲会话最少的命令 (相同时取最近使用的)，池已满时返回 None"""
+        if len(self._idle) >= self.size or not self._keys:
+            return None
+        counts = {key: 0 for key in self._keys}
+        for idle in self._idle:
+            if idle.key in counts:
+                counts[idle.key] += 1
+        return min(counts, key=lambda k: (counts[k], -self._keys[k].last_used))
+
+    def _refill(self) -> None:
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    key = None if self.disabled else self._next_key()
+                    if key is None:
+                        return
+                    command = self._keys[key]
+                try:
+                    child = ChildProcess(command.cmd, cwd=command.cwd, limits=self.limits, stdin_pipe=True, hold_output=True)
+                except OSError as e:
+                    self.logger.warning(f"预热会话启动失败，关闭预热池: {e}")
+                    self.disabled = True
+                    return
+                with self._lock:
+                    self.stats.spawned += 1
+                    if self._stop.is_set():
+                        child.close()
+                        return
+                    self._idle.append(_Idle(child=child, key=key, spawned=time.monotonic()))
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def _reap_loop(self) -> None:
+        interval = min(REAP_INTERVAL, max(self.ttl / 4, 0.5))
+        while not self._stop.wait(interval):
+            self.reap()
+
+    def reap(self) -> None:
+        """回收过期或已退出的空闲会话"""
+        now = time.monotonic()
+        expired: list[_Idle] = []
+        died = False
+        with self._lock:
+            keep = []
+            for idle in self._idle:
+                if idle.child.returncode is not None:
+                    died = True
+                    expired.append(idle)
+                elif now - idle.spawned >= self.ttl:
+                    expired.append(idle)
+                    self.stats.reaped += 1
+                else:
+                    keep.append(idle)
+            self._idle = keep
+            for key, command in list(self._keys.items()):
+                if not command.active and now - command.last_used >= self.ttl:
+                    del self._keys[key]
+
+        for idle in expired:
+            idle.child.close()
+
+        if died and not self.disabled:
+            self.disabled = True
+            self.logger.warning("预热会话在收到提示前退出 (claude 可能不支持从 stdin 读取提示)，关闭预热池")
+            self.close()
+        elif expired:
+            # 仍在使用的命令补充新会话
+            self._refill_async()
+
+    def close(self) -> None:
+        """停止补充并终止所有空闲会话"""
+        self._stop.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            entry.child.close()
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from my_ralphy.distributed import AuthError, Coordinator, RemoteWorker, is_loopback
+from my_ralphy.models import RunConfig
+
+
+class IdleExecutor:
+    """不会被调用的执行器 (测试只覆盖握手)"""
+
+    def cancel_all(self) -> None:
+        pass
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    # 没有待办任务，worker 连接后只完成握手
+    (tmp_path / "prd.json").write_text('[{"id": "1", "title": "t", "status": "completed"}]', encoding="utf-8")
+    coord = Coordinator(RunConfig(task_file=str(tmp_path / "prd.json")), port=0, heartbeat=0.2, token="secret")
+    coord.start()
+    yield coord
+    coord.stop()
+
+
+def test_non_loopback_bind_requires_token():
+    with pytest.raises(ValueError):
+        Coordinator(RunConfig(), host="0.0.0.0", port=0)
+    Coordinator(RunConfig(), host="0.0.0.0", port=0, token="secret")
+    Coordinator(RunConfig(), host="127.0.0.1", port=0)
+
+
+def test_is_loopback():
+    assert is_loopback("127.0.0.1")
+    assert is_loopback("::1")
+    assert is_loopback("localhost")
+    assert not is_loopback("0.0.0.0")
+    assert not is_loopback("")
+
+
+@pytest.mark.parametrize("token", [None, "wrong"])
+def test_worker_with_bad_token_is_rejected(coordinator, token):
+    worker = RemoteWorker(coordinator.address, IdleExecutor(), token=token, reconnect=0)
+    with pytest.raises(AuthError):
+        worker.run()
+    assert not coordinator.workers
+
+
+def test_worker_with_token_is_accepted(coordinator):
+    worker = RemoteWorker(coordinator.address, IdleExecutor(), token="secret", reconnect=0)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not coordinator.workers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(coordinator.workers) == 1
+
+    coordinator.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
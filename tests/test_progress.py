@@ -0,0 +1,29 @@
+import os
+import time
+
+from my_ralphy.progress import tree_modified_since
+
+
+def test_ignored_files_do_not_count_as_progress(tmp_path, monkeypatch):
+    (tmp_path / "src.py").write_text("x = 1\n", encoding="utf-8")
+    (tmp_path / "ralph.log").write_text("", encoding="utf-8")
+    since = time.time() + 1
+    os.utime(tmp_path, (since - 10, since - 10))
+    os.utime(tmp_path / "src.py", (since - 10, since - 10))
+    os.utime(tmp_path / "ralph.log", (since + 5, since + 5))
+
+    # 默认 "-d ." 时根目录是相对路径
+    monkeypatch.chdir(tmp_path)
+    for root in [tmp_path, tmp_path.relative_to(tmp_path), "."]:
+        assert not tree_modified_since(root, since, ignore=["ralph.log"])
+        assert not tree_modified_since(root, since, ignore=[str(tmp_path / "ralph.log")])
+        assert tree_modified_since(root, since)
+
+
+def test_new_file_counts_as_progress(tmp_path):
+    since = time.time() - 1
+    assert tree_modified_since(tmp_path, since)
+    os.utime(tmp_path, (since - 10, since - 10))
+    assert not tree_modified_since(tmp_path, since)
+    (tmp_path / "new.txt").write_text("", encoding="utf-8")
+    assert tree_modified_since(tmp_path, since)
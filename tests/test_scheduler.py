@@ -0,0 +1,168 @@
+from collections import Counter
+
+from my_ralphy.models import Task
+from my_ralphy.scheduler import (
+    AgingScheduler,
+    DurationModel,
+    FairShareScheduler,
+    PriorityScheduler,
+    ShortestJobFirstScheduler,
+)
+
+
+def make_task(task_id: str, priority: int = 0, tags: list[str] | None = None) -> Task:
+    return Task(id=task_id, title=task_id, priority=priority, tags=tags or [])
+
+
+def drain(scheduler, now: float = 0.0) -> list[str]:
+    order = []
+    while (task := scheduler.pop(now)) is not None:
+        order.append(task.id)
+    return order
+
+
+def test_priority_orders_by_priority_then_fifo():
+    scheduler = PriorityScheduler()
+    for task in [make_task("a", 1), make_task("b", 5), make_task("c", 1), make_task("d", 5)]:
+        scheduler.push(task)
+    assert drain(scheduler) == ["b", "d", "a", "c"]
+
+
+def test_repush_replaces_queued_entry():
+    scheduler = PriorityScheduler()
+    low = make_task("low", 0)
+    scheduler.push(low)
+    scheduler.push(make_task("mid", 5))
+    low.priority = 9
+    scheduler.push(low)
+    assert len(scheduler) == 2
+    assert drain(scheduler) == ["low", "mid"]
+
+
+def run_stream(scheduler, arrivals: int = 50) -> tuple[list[str], int]:
+    """每个时间步到达一个高优先级任务并执行一个任务，返回执行顺序"""
+    scheduler.push(make_task("old", 0), 0.0)
+    order = []
+    for step in range(arrivals):
+        now = float(step * 60)
+        scheduler.push(make_task(f"new-{step}", 5), now)
+        order.append(scheduler.pop(now).id)
+    return order
+
+
+def test_priority_starves_low_priority_under_load():
+    order = run_stream(PriorityScheduler())
+    assert "old" not in order
+
+
+def test_aging_prevents_starvation():
+    # 每分钟老化 1 个优先级：等待约 5 分钟后超过新到的高优先级任务
+    order = run_stream(AgingScheduler(rate=1 / 60))
+    assert "old" in order
+    assert order.index("old") <= 6
+
+
+def test_sjf_orders_by_estimated_duration():
+    model = DurationModel()
+    for task_id, duration in [("slow", 300.0), ("mid", 60.0), ("fast", 5.0)]:
+        model.observe(task_id, [], duration)
+    scheduler = ShortestJobFirstScheduler(model=model)
+    for task_id in ["slow", "mid", "fast"]:
+        scheduler.push(make_task(task_id))
+    assert drain(scheduler) == ["fast", "mid", "slow"]
+
+
+def test_sjf_falls_back_to_tag_median():
+    model = DurationModel()
+    for i, duration in enumerate([10.0, 12.0, 14.0]):
+        model.observe(f"lint-{i}", ["lint"], duration)
+    for i, duration in enumerate([200.0, 220.0]):
+        model.observe(f"e2e-{i}", ["e2e"], duration)
+    scheduler = ShortestJobFirstScheduler(model=model)
+    scheduler.push(make_task("new-e2e", tags=["e2e"]))
+    scheduler.push(make_task("new-lint", tags=["lint"]))
+    assert drain(scheduler) == ["new-lint", "new-e2e"]
+
+
+def test_fair_share_respects_weights():
+    scheduler = FairShareScheduler(weights={"a": 3.0, "b": 1.0})
+    for i in range(100):
+        scheduler.push(make_task(f"a-{i}", tags=["a"]))
+        scheduler.push(make_task(f"b-{i}", tags=["b"]))
+    served = Counter(scheduler.pop().id.split("-")[0] for _ in range(40))
+    assert served == {"a": 30, "b": 10}
+
+
+def test_fair_share_does_not_bank_idle_credit():
+    scheduler = FairShareScheduler()
+    for i in range(10):
+        scheduler.push(make_task(f"a-{i}", tags=["a"]))
+    for _ in range(10):
+        scheduler.pop()
+    # b 在 a 独占期间没有任务，重新加入后不能连续占用
+    for i in range(10):
+        scheduler.push(make_task(f"a-late-{i}", tags=["a"]))
+        scheduler.push(make_task(f"b-{i}", tags=["b"]))
+    groups = [scheduler.pop().id.split("-")[0] for _ in range(6)]
+    assert groups.count("a") == 3 and groups.count("b") == 3
+
+
+def test_tag_cap_limits_concurrency():
+    scheduler = PriorityScheduler(tag_caps={"db": 1})
+    for i in range(3):
+        scheduler.push(make_task(f"db-{i}", tags=["db"]))
+    scheduler.push(make_task("other"))
+
+    first = scheduler.pop()
+    scheduler.on_start(first)
+    assert first.id == "db-0"
+    # db 已满，跳过受限任务继续选择其他任务
+    assert scheduler.pop().id == "other"
+    assert scheduler.pop() is None
+    assert not scheduler.can_start(make_task("retry", tags=["db"]))
+
+    scheduler.on_finish(first, 1.0)
+    assert scheduler.can_start(make_task("retry", tags=["db"]))
+    assert scheduler.pop().id == "db-1"
+
+
+def test_tag_cap_applies_to_every_policy():
+    for scheduler in [
+        PriorityScheduler(tag_caps={"db": 2}),
+        AgingScheduler(tag_caps={"db": 2}),
+        FairShareScheduler(tag_caps={"db": 2}),
+        ShortestJobFirstScheduler(tag_caps={"db": 2}),
+    ]:
+        for i in range(5):
+            scheduler.push(make_task(f"db-{i}", tags=["db"]))
+        running = []
+        while (task := scheduler.pop()) is not None:
+            scheduler.on_start(task)
+            running.append(task)
+        assert len(running) == 2, scheduler.name
+        scheduler.on_finish(running.pop(), 1.0)
+        assert scheduler.pop() is not None, scheduler.name
+
+
+def test_repushed_parked_task_does_not_strand_others():
+    scheduler = PriorityScheduler(tag_caps={"db": 1})
+    tasks = {task_id: make_task(task_id, tags=["db"]) for task_id in "abc"}
+    for task in tasks.values():
+        scheduler.push(task)
+
+    first = scheduler.pop()
+    scheduler.on_start(first)
+    assert scheduler.pop() is None
+    # b 被暂存后重新入队 (如 --watch 检测到修改)，暂存的旧条目失效
+    scheduler.push(tasks["b"])
+    assert scheduler.pop() is None
+
+    started = [first.id]
+    while started[-1] is not None:
+        scheduler.on_finish(tasks[started[-1]], 1.0)
+        task = scheduler.pop()
+        if task is not None:
+            scheduler.on_start(task)
+        started.append(task.id if task else None)
+    assert sorted(started[:-1]) == ["a", "b", "c"]
+    assert len(scheduler) == 0
@@ -0,0 +1,113 @@
+from my_ralphy.models import Task
+from my_ralphy.scheduler import DurationModel
+from my_ralphy.simulator import SimConfig, Simulator, Workload, synthetic_tasks
+
+
+def mixed_workload() -> tuple[list[Task], Workload, DurationModel]:
+    """短任务与长任务各半，耗时按标签固定"""
+    tasks = []
+    for i in range(20):
+        tasks.append(Task(id=f"long-{i}", title="long", tags=["long"], priority=1))
+        tasks.append(Task(id=f"short-{i}", title="short", tags=["short"]))
+    workload = Workload(samples={"long": [(100.0, True)], "short": [(5.0, True)]})
+    model = DurationModel()
+    model.observe("h-long", ["long"], 100.0)
+    model.observe("h-short", ["short"], 5.0)
+    return tasks, workload, model
+
+
+def mean(values: list[float]) -> float:
+    return sum(values) / len(values)
+
+
+def test_more_workers_shorten_makespan():
+    tasks = synthetic_tasks(200, seed=1)
+    simulator = Simulator(tasks, Workload(median=30.0, sigma=0.5), seed=1)
+    makespans = [simulator.run(SimConfig(workers=w, delay=0.0)).makespan for w in (1, 2, 4, 8)]
+    assert makespans == sorted(makespans, reverse=True)
+    # 没有延迟和重试时，worker 数翻倍的完工时间接近减半
+    assert makespans[0] / makespans[3] > 6
+
+
+def test_dispatch_delay_caps_throughput():
+    tasks = synthetic_tasks(100, seed=2)
+    simulator = Simulator(tasks, Workload(median=1.0, sigma=0.1), seed=2)
+    result = simulator.run(SimConfig(workers=8, delay=10.0))
+    # 派发间隔成为瓶颈：完工时间约等于 任务数 × 延迟
+    assert result.makespan >= 99 * 10.0
+    assert result.utilization < 0.05
+
+
+def test_sjf_lowers_mean_latency_at_same_throughput():
+    tasks, workload, model = mixed_workload()
+    simulator = Simulator(tasks, workload, model=model)
+    priority = simulator.run(SimConfig(workers=2, delay=0.0, schedule="priority"))
+    sjf = simulator.run(SimConfig(workers=2, delay=0.0, schedule="sjf"))
+
+    assert sjf.completed == priority.completed == len(tasks)
+    assert sjf.makespan == priority.makespan
+    assert mean(sjf.latencies) < mean(priority.latencies) / 2
+
+
+def test_failures_add_attempts_and_tail_latency():
+    tasks = synthetic_tasks(200, seed=3)
+    clean = Simulator(tasks, Workload(median=20.0, sigma=0.3), seed=3)
+    flaky = Simulator(tasks, Workload(median=20.0, sigma=0.3, fail_rate=0.3), seed=3)
+    config = SimConfig(workers=4, delay=0.0, max_retries=3)
+    a, b = clean.run(config), flaky.run(config)
+    assert a.attempts == len(tasks)
+    assert b.attempts > len(tasks)
+    assert b.makespan > a.makespan
+
+
+def test_timeouts_count_as_failures():
+    tasks = [Task(id=f"t{i}", title="t") for i in range(10)]
+    workload = Workload(samples={"_untagged": [(1000.0, True)]})
+    result = Simulator(tasks, workload).run(SimConfig(workers=2, timeout=60, max_retries=1, delay=0.0))
+    assert result.completed == 0
+    assert result.failed == 10
+    assert result.timeouts == 20
+
+
+def test_retries_respect_tag_caps():
+    tasks = [Task(id=f"db-{i}", title="db", tags=["db"]) for i in range(30)]
+    workload = Workload(median=10.0, sigma=0.5, fail_rate=0.5)
+    simulator = Simulator(tasks, workload, tag_caps={"db": 1}, seed=4)
+    result = simulator.run(SimConfig(workers=4, delay=0.0, max_retries=3))
+    assert result.attempts > len(tasks)
+    # 同一时刻最多一个 db 任务运行：忙碌时间不超过完工时间
+    assert result.busy <= result.makespan + 1e-6
+
+
+def test_task_outcomes_do_not_depend_on_dispatch_order():
+    def duration_of_x(priority: int) -> float:
+        tasks = [Task(id=f"other-{i}", title="other", tags=["other"], priority=5) for i in range(20)]
+        tasks.append(Task(id="x", title="x", tags=["x"], priority=priority))
+        result = Simulator(tasks, Workload(median=30.0, sigma=0.8), seed=5).run(SimConfig(workers=1, delay=0.0))
+        # 单 worker 顺序执行：x 的耗时 = 完成时间 - 前一个任务的完成时间
+        before = [latency for latency in result.by_tag["other"] if latency < result.by_tag["x"][0]]
+        return result.by_tag["x"][0] - max(before, default=0.0)
+
+    # x 第一个执行与最后一个执行时抽到相同的耗时
+    assert abs(duration_of_x(9) - duration_of_x(0)) < 1e-9
+
+
+def test_latency_is_measured_from_arrival():
+    tasks = synthetic_tasks(50, seed=6)
+    # 平均每 100 分钟到达一个 1 秒左右的任务，几乎不需要排队
+    simulator = Simulator(tasks, Workload(median=1.0, sigma=0.1), seed=6, arrival_rate=1 / 6000)
+    result = simulator.run(SimConfig(workers=1, delay=0.0))
+    assert max(result.latencies) < 5.0
+    assert result.makespan > 1000 * max(result.latencies)
+
+
+def test_aging_bounds_low_priority_latency_under_load():
+    tasks = synthetic_tasks(400, seed=7)
+    # 到达速率略高于处理能力，低优先级任务在 priority 策略下持续被插队
+    simulator = Simulator(tasks, Workload(median=60.0, sigma=0.3), seed=7, aging_rate=1 / 60, arrival_rate=1.1 / 60)
+    priority = simulator.run(SimConfig(workers=1, delay=0.0, schedule="priority"))
+    aging = simulator.run(SimConfig(workers=1, delay=0.0, schedule="aging"))
+
+    lowest = min(priority.by_priority)
+    assert max(aging.groups("priority")[str(lowest)]) < max(priority.groups("priority")[str(lowest)]) / 2
+    assert aging.percentile(95) < priority.percentile(95) * 2
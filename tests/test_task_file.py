@@ -0,0 +1,49 @@
+from my_ralphy.budget import Budget, CostModel
+from my_ralphy.models import RunConfig, Task
+from my_ralphy.modes.task_file import TaskFileMode
+from my_ralphy.scheduler import PriorityScheduler
+
+
+def make_mode(tmp_path, **caps) -> TaskFileMode:
+    mode = TaskFileMode(RunConfig(task_file=str(tmp_path / "prd.json"), working_dir=str(tmp_path), workers=4))
+    mode.scheduler = PriorityScheduler(tag_caps=caps)
+    return mode
+
+
+def test_retry_waits_for_tag_cap(tmp_path):
+    mode = make_mode(tmp_path, db=1)
+    running = Task(id="running", title="running", tags=["db"])
+    mode.scheduler.on_start(running)
+
+    # 验收失败的任务进入重试队列时，同标签的名额可能已被其他任务占用
+    mode.retry_queue.append(Task(id="retry", title="retry", tags=["db"]))
+    mode.scheduler.push(Task(id="other", title="other", tags=["api"]))
+
+    assert mode._next_task().id == "other"
+    assert mode._next_task() is None
+    assert [task.id for task in mode.retry_queue] == ["retry"]
+
+    mode.scheduler.on_finish(running, 1.0)
+    assert mode._next_task().id == "retry"
+
+
+def test_retry_runs_before_new_tasks(tmp_path):
+    mode = make_mode(tmp_path)
+    mode.retry_queue.append(Task(id="retry", title="retry"))
+    mode.scheduler.push(Task(id="new", title="new", priority=9))
+    assert [mode._next_task().id, mode._next_task().id] == ["retry", "new"]
+    assert mode.iteration == 1
+
+
+def test_loop_stops_when_budget_exhausted(tmp_path):
+    mode = make_mode(tmp_path)
+    mode.config.poll_interval = 0.01
+    mode.budget = Budget(1.0, CostModel())
+    mode.budget.spent = 1.0
+    for i in range(3):
+        mode.scheduler.push(Task(id=f"t{i}", title="t"))
+
+    # 队列中仍有任务，但预算不足以派发，主循环应当返回而不是空转
+    mode._loop()
+    assert len(mode.scheduler) == 3
+    assert not mode.running